@@ -1,5 +1,253 @@
-def main():
-    print("Hello from 05boatrace!")
+import os
+import sys
+import time
+import argparse
+import importlib
+from datetime import date, timedelta
+
+# Phase modules live in src/ and import each other by bare name
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "src")
+sys.path.insert(0, SRC_DIR)
+
+# Only light modules at import time; pandas / lightgbm / sklearn load with the phase that needs them.
+import fingerprint
+import instrumentation
+
+DATA_DIR = "data"
+FILE_RACES = os.path.join(DATA_DIR, "races.csv")
+FILE_ENTRIES = os.path.join(DATA_DIR, "entries.csv")
+FILE_RESULTS = os.path.join(DATA_DIR, "results.csv")
+FILE_RETURNS = os.path.join(DATA_DIR, "returns.csv")
+FILE_BASE = os.path.join(DATA_DIR, "training_base.csv")
+FILE_FEATURED = os.path.join(DATA_DIR, "training_featured.csv")
+FILE_MODEL = os.path.join(DATA_DIR, "model.pkl")
+FILE_SCORES = os.path.join(DATA_DIR, "scores.csv")
+FILE_STADIUM_MODELS = os.path.join(DATA_DIR, "stadium_models.pkl")
+FILE_BUNDLE = os.path.join(DATA_DIR, "model_bundle.pkl")
+FILE_SELECTION = os.path.join(DATA_DIR, "feature_selection.csv")
+FILE_MATRIX_META = os.path.join(DATA_DIR, "matrix", "meta.json")
+
+RAW_TABLES = [FILE_RACES, FILE_ENTRIES, FILE_RESULTS]
+# Rest of each result page, written by the collector in the same pass
+RESULT_DETAIL_TABLES = [os.path.join(DATA_DIR, name) for name in
+                        ("result_order.csv", "result_starts.csv", "payoffs.csv", "race_conditions.csv", "returns.csv")]
+
+# name -> module, inputs, outputs (for fingerprint-based skipping)
+PHASES = {
+    "collect":   {"module": "collect_data_phase1",        "inputs": [],              "outputs": RAW_TABLES + RESULT_DETAIL_TABLES},
+    "compact":   {"module": "compact_tables",             "inputs": RAW_TABLES + RESULT_DETAIL_TABLES,
+                  "outputs": RAW_TABLES + RESULT_DETAIL_TABLES},
+    "transform": {"module": "transform_data_phase2",      "inputs": RAW_TABLES + [FILE_RETURNS], "outputs": [FILE_BASE]},
+    "features":  {"module": "feature_engineering_phase3", "inputs": [FILE_BASE],     "outputs": [FILE_FEATURED, FILE_MATRIX_META]},
+    "train":     {"module": "train_model_phase4",         "inputs": [FILE_FEATURED], "outputs": [FILE_MODEL]},
+    "train-stadiums": {"module": "train_stadium_models", "inputs": [FILE_FEATURED], "outputs": [FILE_STADIUM_MODELS]},
+    "train-multi": {"module": "train_multi_target",      "inputs": [FILE_FEATURED], "outputs": [FILE_BUNDLE]},
+    "score":     {"module": "score_batch",                "inputs": [FILE_FEATURED, FILE_MODEL], "outputs": [FILE_SCORES]},
+    "select":    {"module": "feature_selection",          "inputs": [FILE_FEATURED], "outputs": [FILE_SELECTION]},
+}
+PIPELINE = ["collect", "transform", "features", "train"]
+
+def run_phase(name, args, config, call):
+    """Run one phase unless its inputs, code and config are unchanged since the last run."""
+    spec = PHASES[name]
+    # The phase's own source counts as an input, so code changes invalidate it
+    inputs = spec["inputs"] + [os.path.join(SRC_DIR, spec["module"] + ".py")]
+    if not args.force and fingerprint.is_up_to_date(name, inputs, spec["outputs"], config):
+        print(f"[{name}] Up to date. Skipping.")
+        return
+    module = importlib.import_module(spec["module"])
+    call(module)
+    fingerprint.record_phase(name, inputs, spec["outputs"], config)
+
+def cmd_collect(args):
+    config = {"start": args.start, "end": args.end, "limit_races": args.limit_races}
+    if args.pipelined:
+        run_phase("collect", args, config,
+                  lambda m: importlib.import_module("collect_pipeline").collect_pipelined(
+                      args.start, args.end, limit_races=args.limit_races, fetchers=args.fetchers,
+                      parsers=args.parsers, interval=args.interval))
+        return
+    run_phase("collect", args, config,
+              lambda m: m.collect_data_phase1(args.start, args.end, limit_races=args.limit_races))
+
+def cmd_compact(args):
+    config = {"drop_orphans": args.drop_orphans}
+    run_phase("compact", args, config, lambda m: m.compact_tables(drop_orphans=args.drop_orphans))
+
+def cmd_index(args):
+    # Incremental and cheap: always run
+    module = importlib.import_module("race_index")
+    index = module.update_index()
+    print(f"Indexed {len(index.race_offset)} races, {len(index.racer)} racers.")
+
+def cmd_transform(args):
+    run_phase("transform", args, {}, lambda m: m.transform_phase2())
+
+def cmd_features(args):
+    run_phase("features", args, {}, lambda m: m.feature_engineering_phase3())
+
+def cmd_train(args):
+    run_phase("train", args, {}, lambda m: m.train_phase4())
+
+def cmd_train_stadiums(args):
+    config = {"min_rows": args.min_rows}
+    run_phase("train-stadiums", args, config,
+              lambda m: m.train_stadium_models(min_rows=args.min_rows, workers=args.workers))
+
+def cmd_train_multi(args):
+    config = {"targets": args.targets}
+    run_phase("train-multi", args, config,
+              lambda m: m.train_multi_target(args.targets, workers=args.workers))
+
+def cmd_score(args):
+    run_phase("score", args, {}, lambda m: m.score_batch(workers=args.workers, chunksize=args.chunksize))
+
+def cmd_select(args):
+    config = {"candidates": args.candidates, "folds": args.folds, "repeats": args.repeats, "rounds": args.rounds}
+    run_phase("select", args, config,
+              lambda m: m.select_features(args.candidates, n_folds=args.folds, n_repeats=args.repeats,
+                                          num_rounds=args.rounds, workers=args.workers))
+
+def cmd_snapshot(args):
+    module = importlib.import_module("snapshot")
+    if args.list:
+        for m in module.list_snapshots():
+            size = sum(f["size"] for f in m["files"].values())
+            print(f"{m['id']}  {m['created']}  {len(m['files'])} files  {size / 1e6:.1f} MB  {m['note']}")
+        return
+    try:
+        print(module.take_snapshot(args.paths or None, note=args.note))
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+def cmd_checkout(args):
+    module = importlib.import_module("snapshot")
+    try:
+        status = module.checkout(args.snapshot_id, args.to)
+    except (KeyError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    for path, state in status.items():
+        print(f"  {path}: {state}")
+
+def cmd_predict(args):
+    # Live data changes by the minute: never skipped
+    module = importlib.import_module("predict_phase5")
+    module.predict_phase5(args.date, limit_races=args.limit_races, per_stadium=args.per_stadium, live=args.live,
+                          bundle=args.bundle)
+
+def cmd_replay(args):
+    module = importlib.import_module("replay_day")
+    module.replay_day(args.date, budget_s=args.budget, latency=args.latency, jitter=args.jitter,
+                      failure_rate=args.failure_rate, seed=args.seed, limit_races=args.limit_races,
+                      per_stadium=args.per_stadium, bundle=args.bundle)
+
+def cmd_monitor(args):
+    # Incremental by design: always run
+    module = importlib.import_module("drift_monitor")
+    module.run_monitor()
+
+def cmd_all(args):
+    for name in PIPELINE:
+        COMMANDS[name](args)
+
+COMMANDS = {
+    "collect": cmd_collect,
+    "compact": cmd_compact,
+    "index": cmd_index,
+    "transform": cmd_transform,
+    "features": cmd_features,
+    "train": cmd_train,
+    "train-stadiums": cmd_train_stadiums,
+    "train-multi": cmd_train_multi,
+    "score": cmd_score,
+    "select": cmd_select,
+    "snapshot": cmd_snapshot,
+    "checkout": cmd_checkout,
+    "predict": cmd_predict,
+    "replay": cmd_replay,
+    "monitor": cmd_monitor,
+    "all": cmd_all,
+}
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="boatrace", description="Boatrace 2-rentai prediction pipeline")
+    parser.add_argument("--force", action="store_true", help="run phases even if their inputs are unchanged")
+    parser.add_argument("--trace", metavar="PATH", help="write a JSON-lines trace (and PATH.prom metrics)")
+    parser.add_argument("--profile", metavar="STAGE", help="run STAGE under cProfile")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    yesterday = date.today() - timedelta(days=1)
+    date_range = argparse.ArgumentParser(add_help=False)
+    date_range.add_argument("--start", type=date.fromisoformat, default=date(2024, 1, 1), help="YYYY-MM-DD")
+    date_range.add_argument("--end", type=date.fromisoformat, default=yesterday, help="YYYY-MM-DD")
+    races = argparse.ArgumentParser(add_help=False)
+    races.add_argument("--limit-races", type=int, default=12)
+
+    collect = argparse.ArgumentParser(add_help=False)
+    collect.add_argument("--pipelined", action="store_true", help="fetch, parse (process pool) and write concurrently")
+    collect.add_argument("--fetchers", type=int, default=2, help="fetch threads sharing the rate limit (--pipelined)")
+    collect.add_argument("--parsers", type=int, default=None, help="parser processes (--pipelined, default: all cores)")
+    collect.add_argument("--interval", type=float, default=1.0, help="seconds between requests (--pipelined)")
+
+    sub.add_parser("collect", parents=[date_range, races, collect], help="Phase 1: scrape races/entries/results")
+    p = sub.add_parser("compact", help="Deduplicate, sort and index races/entries/results")
+    p.add_argument("--drop-orphans", action="store_true", help="move orphan rows to data/orphans_<table>.csv")
+    sub.add_parser("index", help="Update racer/stadium/race lookup indexes")
+    sub.add_parser("transform", help="Phase 2: join raw tables into training_base.csv")
+    sub.add_parser("features", help="Phase 3: feature engineering")
+    sub.add_parser("train", help="Phase 4: train and evaluate LightGBM")
+    p = sub.add_parser("train-stadiums", help="Train one model per stadium (+ global fallback) in parallel")
+    p.add_argument("--min-rows", type=int, default=3000, help="venues below this use the global model")
+    p.add_argument("--workers", type=int, default=None, help="processes (default: all cores)")
+    p = sub.add_parser("train-multi", help="Train win / 2rentai / 3rentai / rough models on one binned dataset")
+    # train_multi_target.TARGETS, spelled out so the CLI does not import lightgbm
+    p.add_argument("--targets", nargs="+", choices=["win", "2rentai", "3rentai", "rough"], default=None,
+                   help="models to train (default: all)")
+    p.add_argument("--workers", type=int, default=None, help="models trained at once (default: all)")
+    p = sub.add_parser("score", help="Batch-score every row of the feature table")
+    p.add_argument("--workers", type=int, default=None, help="processes (default: all cores)")
+    p.add_argument("--chunksize", type=int, default=200_000)
+    p = sub.add_parser("select", help="Permutation / drop-column importance on time-ordered folds")
+    p.add_argument("--candidates", nargs="+", default=None, help="columns of training_featured.csv (default: model features)")
+    p.add_argument("--folds", type=int, default=4)
+    p.add_argument("--repeats", type=int, default=3, help="permutations per feature and fold")
+    p.add_argument("--rounds", type=int, default=100)
+    p.add_argument("--workers", type=int, default=None, help="processes (default: all cores)")
+    p = sub.add_parser("snapshot", help="Snapshot the data tables as content-addressed chunks")
+    p.add_argument("paths", nargs="*", help="tables to include (default: raw + training tables)")
+    p.add_argument("--note", default="")
+    p.add_argument("--list", action="store_true", help="list snapshots instead")
+    p = sub.add_parser("checkout", help="Materialize a snapshot (DEST/data/...)")
+    p.add_argument("snapshot_id")
+    p.add_argument("--to", default="checkout", help="destination directory (default: ./checkout)")
+    p = sub.add_parser("predict", parents=[races], help="Phase 5: predict races of a day")
+    p.add_argument("--date", type=date.fromisoformat, default=date.today(), help="YYYY-MM-DD (default: today)")
+    p.add_argument("--per-stadium", action="store_true", help="route races to per-stadium models")
+    p.add_argument("--live", action="store_true", help="follow vote deadlines and predict each race as its before-info is posted")
+    p.add_argument("--bundle", action="store_true", help="serve the multi-target bundle (win / 2rentai / 3rentai / rough)")
+    p = sub.add_parser("replay", parents=[races], help="Replay a stored day through the live path on a virtual clock")
+    p.add_argument("date", type=date.fromisoformat, help="YYYY-MM-DD")
+    p.add_argument("--budget", type=float, default=60.0, help="seconds from before-info to prediction (default: 60)")
+    p.add_argument("--latency", type=float, default=0.3, help="base site latency per call in seconds")
+    p.add_argument("--jitter", type=float, default=0.2, help="mean extra latency per call in seconds")
+    p.add_argument("--failure-rate", type=float, default=0.0, help="probability that a site call fails")
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--per-stadium", action="store_true", help="route races to per-stadium models")
+    p.add_argument("--bundle", action="store_true", help="serve the multi-target bundle")
+    sub.add_parser("monitor", help="Update live quality/drift metrics from settled races and alert")
+    sub.add_parser("all", parents=[date_range, races, collect], help="collect -> transform -> features -> train")
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.trace or args.profile:
+        instrumentation.configure(trace_path=args.trace, profile_stage=args.profile)
+
+    started = time.perf_counter()
+    COMMANDS[args.command](args)
+    print(f"Done in {time.perf_counter() - started:.2f}s")
 
 
 if __name__ == "__main__":
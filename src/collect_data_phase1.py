@@ -3,13 +3,16 @@ import os
 import pandas as pd
 from datetime import date, timedelta
 import time
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 import requests
 from selenium.common.exceptions import WebDriverException
 
-from pyjpboatrace import PyJPBoatrace
 from pyjpboatrace.const import STADIUMS_MAP
 
+import instrumentation
+import race_index
+from http_client import BoatraceClient
+
 # Reverse map: Name -> ID
 NAME_TO_ID = {name: sid for sid, name in STADIUMS_MAP}
 
@@ -18,11 +21,39 @@ DATA_DIR = "data"
 FILE_RACES = os.path.join(DATA_DIR, "races.csv")
 FILE_ENTRIES = os.path.join(DATA_DIR, "entries.csv")
 FILE_RESULTS = os.path.join(DATA_DIR, "results.csv")
+# Side tables: the rest of each result page, from the same request
+FILE_RESULT_ORDER = os.path.join(DATA_DIR, "result_order.csv")
+FILE_RESULT_STARTS = os.path.join(DATA_DIR, "result_starts.csv")
+FILE_PAYOFFS = os.path.join(DATA_DIR, "payoffs.csv")
+FILE_RACE_CONDITIONS = os.path.join(DATA_DIR, "race_conditions.csv")
+FILE_RETURNS = os.path.join(DATA_DIR, "returns.csv")
 
 # --- Column definitions (Must match CSV headers) ---
 COLS_RACES = ["race_id", "date", "stadium_id", "race_no", "title", "deadline"]
 COLS_ENTRIES = ["race_id", "boat_no", "racer_id", "name", "class", "motor_p", "st_ave", "fl"]
 COLS_RESULTS = ["race_id", "rank1_boat", "rank2_boat", "rank3_boat", "payoff_3t", "win_method"]
+# rank is empty for boats that did not finish (status keeps the mark, e.g. 転, 失, 欠, F)
+COLS_RESULT_ORDER = ["race_id", "rank", "status", "boat_no", "racer_id", "name", "time_s"]
+# st < 0 is a flying start
+COLS_RESULT_STARTS = ["race_id", "course", "boat_no", "st"]
+# seq: 1-based order of the row on the page within its bet type (dead heats pay several)
+COLS_PAYOFFS = ["race_id", "bet_type", "seq", "combination", "payoff", "popularity"]
+COLS_RACE_CONDITIONS = ["race_id", "weather", "temperature", "water_temperature",
+                        "wind_speed", "wind_direction", "wave_height", "note"]
+COLS_RETURNS = ["race_id", "boat_no"]
+
+# path -> (columns, dtypes) of the side tables built by build_result_details
+RESULT_DETAIL_TABLES = {
+    FILE_RESULT_ORDER: (COLS_RESULT_ORDER, {"rank": "Int8", "boat_no": "Int8", "racer_id": "Int32",
+                                            "time_s": "Float64"}),
+    FILE_RESULT_STARTS: (COLS_RESULT_STARTS, {"course": "Int8", "boat_no": "Int8", "st": "Float64"}),
+    FILE_PAYOFFS: (COLS_PAYOFFS, {"seq": "Int8", "payoff": "Int64", "popularity": "Int16"}),
+    FILE_RACE_CONDITIONS: (COLS_RACE_CONDITIONS, {"temperature": "Float64", "water_temperature": "Float64",
+                                                  "wind_speed": "Int16", "wind_direction": "Int8",
+                                                  "wave_height": "Int16"}),
+    FILE_RETURNS: (COLS_RETURNS, {"boat_no": "Int8"}),
+}
+BET_TYPES = ["trifecta", "trio", "exacta", "quinella", "quinella_place", "win", "place_show"]
 
 def get_race_id(d: date, stadium_id: int, race_no: int) -> str:
     """Generate unique race_id: YYYYMMDD_SS_RR"""
@@ -32,13 +63,16 @@ def ensure_data_dir():
     if not os.path.exists(DATA_DIR):
         os.makedirs(DATA_DIR)
 
-def append_to_csv(filepath: str, data: List[Dict], columns: List[str]):
+def append_to_csv(filepath: str, data: List[Dict], columns: List[str], dtypes: Optional[Dict[str, str]] = None):
     """Append list of dicts to CSV. Create header if file doesn't exist."""
     if not data:
         return
         
     # Create DataFrame with explicit columns to ensure order and avoid extras
     df = pd.DataFrame(data, columns=columns)
+    if dtypes:
+        # Nullable types: an int column with gaps is still written as 3, not 3.0
+        df = df.astype(dtypes)
     
     # Check if we need to write header (if file doesn't exist)
     file_exists = os.path.exists(filepath)
@@ -46,6 +80,175 @@ def append_to_csv(filepath: str, data: List[Dict], columns: List[str]):
     # Write to CSV
     df.to_csv(filepath, mode='a', index=False, header=not file_exists, encoding='utf-8-sig')
 
+def get_active_stadiums(stadiums: Dict[str, Any]) -> List[tuple]:
+    """Resolve get_stadiums() output to [(stadium_id, name), ...]."""
+    active_stadiums = []
+    for name, data in stadiums.items():
+        if name in ['date', 'status']: continue
+        
+        sid = NAME_TO_ID.get(name)
+        if not sid:
+            for k, v in NAME_TO_ID.items():
+                if k in name:
+                    sid = v
+                    break
+        if sid:
+            active_stadiums.append((sid, name))
+    return active_stadiums
+
+def build_entry_rows(race_id: str, info: Dict[str, Any]) -> List[Dict]:
+    """entries.csv records (boats 1-6) from a get_race_info() response."""
+    rows = []
+    for b_idx in range(1, 7):
+        boat_key = f"boat{b_idx}"
+        b_data = info.get(boat_key, {})
+        rows.append({
+            "race_id": race_id,
+            "boat_no": b_idx,
+            "racer_id": b_data.get("racerid"),
+            "name": b_data.get("name"),
+            "class": b_data.get("class"),
+            "motor_p": b_data.get("motor_in2nd"),
+            "st_ave": b_data.get("aveST"),
+            "fl": b_data.get("F"),
+        })
+    return rows
+
+def build_race_row(race_id: str, d: date, sid: int, race_no: int, info: Dict[str, Any], deadline: str) -> Dict:
+    """races.csv record from a get_race_info() response and the get_12races() vote_limit."""
+    race_title_list = info.get('race_title', [])
+    return {
+        "race_id": race_id,
+        "date": d,
+        "stadium_id": sid,
+        "race_no": race_no,
+        "title": race_title_list[0] if race_title_list else "",
+        "deadline": deadline
+    }
+
+def build_result_row(race_id: str, res: Dict[str, Any]) -> Optional[Dict]:
+    """results.csv record from a get_race_result() response (None if there is no result)."""
+    if not res or 'result' not in res:
+        return None
+    rank_data = res.get('result', [])
+    payoff_data = res.get('payoff', {}).get('trifecta', {})
+    payoff_3t = payoff_data.get('payoff')
+    if isinstance(payoff_3t, list): payoff_3t = payoff_3t[0]
+    kimarite = res.get('kimarite', '')
+
+    rank1 = next((r['boat'] for r in rank_data if r['rank'] == 1), None)
+    rank2 = next((r['boat'] for r in rank_data if r['rank'] == 2), None)
+    rank3 = next((r['boat'] for r in rank_data if r['rank'] == 3), None)
+
+    return {
+        "race_id": race_id,
+        "rank1_boat": rank1,
+        "rank2_boat": rank2,
+        "rank3_boat": rank3,
+        "payoff_3t": payoff_3t,
+        "win_method": kimarite
+    }
+
+def _value(v):
+    """pyjpboatrace marks unparsable numbers with ''; store them as empty cells."""
+    return None if v == '' else v
+
+def race_time_seconds(text: str) -> Optional[float]:
+    """Race time as shown on the result page (1'49"8) in seconds."""
+    try:
+        minutes, rest = text.split("'")
+        seconds, tenths = rest.split('"')
+        return int(minutes) * 60 + int(seconds) + int(tenths) / 10
+    except (AttributeError, ValueError):
+        return None
+
+def build_result_details(race_id: str, res: Dict[str, Any]) -> Dict[str, List[Dict]]:
+    """
+    Side table records (path -> rows) from the same get_race_result() response:
+    full finishing order, start timings, every payoff, weather and returned boats.
+    """
+    details = {path: [] for path in RESULT_DETAIL_TABLES}
+    if not res or 'result' not in res:
+        return details
+
+    for r in res.get('result', []):
+        rank = r.get('rank')
+        details[FILE_RESULT_ORDER].append({
+            "race_id": race_id,
+            "rank": rank if isinstance(rank, int) else None,
+            "status": None if isinstance(rank, int) else rank,
+            "boat_no": _value(r.get('boat')),
+            "racer_id": _value(r.get('racerid')),
+            "name": r.get('name'),
+            "time_s": race_time_seconds(r.get('time')),
+        })
+
+    for course in range(1, 7):
+        start = res.get('start_information', {}).get(f"course{course}", {})
+        if start:
+            details[FILE_RESULT_STARTS].append({
+                "race_id": race_id,
+                "course": course,
+                "boat_no": _value(start.get('boat', '')),
+                "st": _value(start.get('ST', '')),
+            })
+
+    payoff = res.get('payoff', {})
+    for bet_type in BET_TYPES:
+        for seq, p in enumerate(payoff.get(f"{bet_type}_all", []), start=1):
+            details[FILE_PAYOFFS].append({
+                "race_id": race_id,
+                "bet_type": bet_type,
+                "seq": seq,
+                "combination": p.get('result'),
+                "payoff": _value(p.get('payoff', '')),
+                "popularity": _value(p.get('popularity', '')),
+            })
+
+    weather = res.get('weather_information', {})
+    details[FILE_RACE_CONDITIONS].append({
+        "race_id": race_id,
+        "weather": weather.get('weather'),
+        "temperature": _value(weather.get('temperature', '')),
+        "water_temperature": _value(weather.get('water_temperature', '')),
+        "wind_speed": _value(weather.get('wind_speed', '')),
+        "wind_direction": _value(weather.get('wind_direction', '')),
+        "wave_height": _value(weather.get('wave_height', '')),
+        "note": " / ".join(res.get('note', [])),
+    })
+
+    details[FILE_RETURNS] = [{"race_id": race_id, "boat_no": b} for b in res.get('return', [])]
+    return details
+
+def write_batch(sp, races: List[Dict], entries: List[Dict], results: List[Dict],
+                details: Optional[Dict[str, List[Dict]]] = None):
+    """
+    Append one stadium's rows. races.csv is written last: resume treats a race
+    as collected once it is in races.csv, so a crash mid-batch leaves orphan
+    entries/results/side rows (reported by compaction) rather than a race without entries.
+    """
+    if not races:
+        return
+    paths = [FILE_RACES, FILE_ENTRIES, FILE_RESULTS] + list(RESULT_DETAIL_TABLES)
+    size_before = sum(instrumentation.file_size(p) for p in paths)
+    append_to_csv(FILE_ENTRIES, entries, COLS_ENTRIES)
+    append_to_csv(FILE_RESULTS, results, COLS_RESULTS)
+    for path, rows in (details or {}).items():
+        append_to_csv(path, rows, *RESULT_DETAIL_TABLES[path])
+    append_to_csv(FILE_RACES, races, COLS_RACES)
+    size_after = sum(instrumentation.file_size(p) for p in paths)
+    sp.add_rows(len(races))
+    sp.add_bytes_written(size_after - size_before)
+
+def index_new_rows():
+    """
+    Fold the rows appended by this run into the race index, once per run
+    (it is rewritten as a whole, so per batch would grow with the history).
+    Runs even when collection is interrupted; `main.py index` catches up too.
+    """
+    with instrumentation.span("collect.index"):
+        race_index.update_index()
+
 # --- Resume Capability ---
 def get_existing_race_ids():
     if not os.path.exists(FILE_RACES):
@@ -57,8 +260,15 @@ def get_existing_race_ids():
         return set()
 
 def collect_data_phase1(start_date: date, end_date: date, limit_races: int = 12):
+    with instrumentation.span("collect", start_date=start_date, end_date=end_date) as sp:
+        try:
+            _collect(sp, start_date, end_date, limit_races)
+        finally:
+            index_new_rows()
+
+def _collect(sp, start_date: date, end_date: date, limit_races: int):
     ensure_data_dir()
-    boatrace = PyJPBoatrace()
+    boatrace = BoatraceClient()
     
     existing_races = get_existing_race_ids()
     print(f"Found {len(existing_races)} existing races. Skipping these...")
@@ -87,19 +297,7 @@ def collect_data_phase1(start_date: date, end_date: date, limit_races: int = 12)
             current_date += timedelta(days=1)
             continue
             
-        active_stadiums = []
-        for name, data in stadiums.items():
-            if name in ['date', 'status']: continue
-            
-            sid = NAME_TO_ID.get(name)
-            if not sid:
-                for k, v in NAME_TO_ID.items():
-                    if k in name:
-                        sid = v
-                        break
-            if sid:
-                active_stadiums.append((sid, name))
-        
+        active_stadiums = get_active_stadiums(stadiums)
         print(f"  Active Stadiums: {len(active_stadiums)} venues")
         
         for sid, sname in active_stadiums:
@@ -134,6 +332,7 @@ def collect_data_phase1(start_date: date, end_date: date, limit_races: int = 12)
             races_buffer = []
             entries_buffer = []
             results_buffer = []
+            details_buffer = {path: [] for path in RESULT_DETAIL_TABLES}
 
             for race_no in range(1, limit_races + 1):
                 race_id = get_race_id(current_date, sid, race_no)
@@ -164,33 +363,9 @@ def collect_data_phase1(start_date: date, end_date: date, limit_races: int = 12)
                     print(f"      R{race_no:02d}: Failed to get info. Skipping race.")
                     continue
                 
-                # --- Build races.csv record ---
-                race_title_list = info.get('race_title', [])
-                title = race_title_list[0] if race_title_list else ""
-                
-                races_buffer.append({
-                    "race_id": race_id,
-                    "date": current_date,
-                    "stadium_id": sid,
-                    "race_no": race_no,
-                    "title": title,
-                    "deadline": deadline
-                })
-                
-                # --- Build entries.csv records ---
-                for b_idx in range(1, 7):
-                    boat_key = f"boat{b_idx}"
-                    b_data = info.get(boat_key, {})
-                    entries_buffer.append({
-                        "race_id": race_id,
-                        "boat_no": b_idx,
-                        "racer_id": b_data.get("racerid"),
-                        "name": b_data.get("name"),
-                        "class": b_data.get("class"),
-                        "motor_p": b_data.get("motor_in2nd"),
-                        "st_ave": b_data.get("aveST"),
-                        "fl": b_data.get("F"),
-                    })
+                # --- Build races.csv / entries.csv records ---
+                races_buffer.append(build_race_row(race_id, current_date, sid, race_no, info, deadline))
+                entries_buffer.extend(build_entry_rows(race_id, info))
                 
                 # 4. Get Race Result
                 res = {}
@@ -208,33 +383,17 @@ def collect_data_phase1(start_date: date, end_date: date, limit_races: int = 12)
                         print(f"      R{race_no:02d} Result Parsing Error (or Cancelled): {e}")
                         break # Do not retry on parse error
 
-                if res and 'result' in res:
-                    rank_data = res.get('result', [])
-                    payoff_data = res.get('payoff', {}).get('trifecta', {})
-                    payoff_3t = payoff_data.get('payoff')
-                    if isinstance(payoff_3t, list): payoff_3t = payoff_3t[0]
-                    kimarite = res.get('kimarite', '')
-                    
-                    rank1 = next((r['boat'] for r in rank_data if r['rank'] == 1), None)
-                    rank2 = next((r['boat'] for r in rank_data if r['rank'] == 2), None)
-                    rank3 = next((r['boat'] for r in rank_data if r['rank'] == 3), None)
-
-                    results_buffer.append({
-                        "race_id": race_id,
-                        "rank1_boat": rank1,
-                        "rank2_boat": rank2,
-                        "rank3_boat": rank3,
-                        "payoff_3t": payoff_3t,
-                        "win_method": kimarite
-                    })
+                result_row = build_result_row(race_id, res)
+                if result_row:
+                    results_buffer.append(result_row)
+                for path, rows in build_result_details(race_id, res).items():
+                    details_buffer[path].extend(rows)
                 
-                print(f"      R{race_no:02d}: OK")
+                print(f"      R{race_no:02d}: OK ({boatrace.last_backend})")
 
             # Batch write for the stadium
             if races_buffer:
-                append_to_csv(FILE_RACES, races_buffer, COLS_RACES)
-                append_to_csv(FILE_ENTRIES, entries_buffer, COLS_ENTRIES)
-                append_to_csv(FILE_RESULTS, results_buffer, COLS_RESULTS)
+                write_batch(sp, races_buffer, entries_buffer, results_buffer, details_buffer)
                 
                 # Update known existing races in memory to avoid re-checking in same run if logic changes
                 for r in races_buffer:
@@ -242,6 +401,9 @@ def collect_data_phase1(start_date: date, end_date: date, limit_races: int = 12)
         
         current_date += timedelta(days=1)
 
+    print(f"\nRequests served by backend: {boatrace.backend_counts}")
+    boatrace.close()
+
 if __name__ == "__main__":
     # Collect data for the last 2 years by default
     # Or simple fixed range for now as per PROJECT5.md roadmap (e.g. 1-2 years)
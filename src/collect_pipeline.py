@@ -0,0 +1,316 @@
+import sys
+import time
+import queue
+import argparse
+import threading
+from concurrent.futures import Future, InvalidStateError, ProcessPoolExecutor
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+import requests
+from pyjpboatrace.scraper.stadiums_scraper import StadiumsScraper
+from pyjpboatrace.scraper.races_scraper import RacesScraper
+from pyjpboatrace.scraper.race_info_scraper import RaceInfoScraper
+from pyjpboatrace.scraper.result_scraper import ResultScraper
+from pyjpboatrace.scraper._parser import (
+    parse_html_index, parse_html_raceindex, parse_html_racelist, parse_html_raceresult,
+)
+
+import instrumentation
+import http_client
+from collect_data_phase1 import (
+    ensure_data_dir, get_existing_race_ids, get_active_stadiums, get_race_id,
+    build_race_row, build_entry_rows, build_result_row, build_result_details, write_batch,
+    index_new_rows, RESULT_DETAIL_TABLES,
+)
+
+# Minimum spacing between request starts over all fetch threads
+# (the sequential collector sleeps 1s after every request)
+REQUEST_INTERVAL = 1.0
+FETCH_ATTEMPTS = 3
+FETCHERS = 2
+
+# page kind -> (URL builder, pyjpboatrace parser)
+PAGES = {
+    "stadiums": (StadiumsScraper.make_url, parse_html_index),
+    "12races": (RacesScraper.make_url, parse_html_raceindex),
+    "race_info": (RaceInfoScraper.make_url, parse_html_racelist),
+    "result": (ResultScraper.make_url, parse_html_raceresult),
+}
+
+class RateLimiter:
+    """Spaces request starts at least `interval` seconds apart, across threads."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._next = 0.0
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        time.sleep(start - now)
+
+class Cancelled(Exception):
+    """Set on the slots of pages that were still queued when the run was interrupted."""
+
+# --- Parser processes ---
+def _init_parser():
+    http_client.use_lxml_parser()
+
+def _parse(kind: str, html: str) -> Dict[str, Any]:
+    return PAGES[kind][1](html)
+
+def _settle(slot: Future, result: Optional[Future] = None, error: Optional[Exception] = None):
+    """Resolve a page slot unless it already is (cancelled while its page was being fetched)."""
+    try:
+        if error is not None:
+            slot.set_exception(error)
+        else:
+            slot.set_result(result)
+    except InvalidStateError:
+        pass
+
+class StadiumBatch:
+    """
+    The pages of one stadium-day. Each slot is resolved by a fetch thread
+    with the parse future of its page (or the fetch error); the writer
+    waits on the slots in order.
+    """
+
+    def __init__(self, d: date, sid: int, name: str, race_nos: List[int]):
+        self.d = d
+        self.sid = sid
+        self.name = name
+        self.race_nos = race_nos
+        self.slots: Dict[Tuple[str, int], Future] = {("12races", 0): Future()}
+        for race_no in race_nos:
+            self.slots[("race_info", race_no)] = Future()
+            self.slots[("result", race_no)] = Future()
+
+    def url(self, kind: str, race_no: int) -> str:
+        make_url = PAGES[kind][0]
+        return make_url(self.d, self.sid) if kind == "12races" else make_url(self.d, self.sid, race_no)
+
+    def page(self, kind: str, race_no: int = 0) -> Dict[str, Any]:
+        """Parsed page; raises the fetch or parse error."""
+        return self.slots[(kind, race_no)].result().result()
+
+class Pipeline:
+    """
+    Fetch threads -> parser processes -> one writer thread.
+
+    Fetch threads only download, under the global rate limit, and hand each
+    page to the process pool without waiting for it. The writer assembles
+    stadium batches in submission order and commits them with write_batch.
+    """
+
+    def __init__(self, sp, pool: ProcessPoolExecutor, fetchers: int, interval: float):
+        self.sp = sp
+        self.pool = pool
+        self.rate = RateLimiter(interval)
+        self.session = http_client.create_session(pool_size=max(fetchers, 1) + 1)
+        self.jobs: "queue.Queue[Optional[Tuple[StadiumBatch, Tuple[str, int]]]]" = queue.Queue(maxsize=fetchers * 50)
+        self.batches: "queue.Queue[Optional[StadiumBatch]]" = queue.Queue()
+        self.fetchers = [threading.Thread(target=self._fetch_loop, daemon=True) for _ in range(fetchers)]
+        self.writer = threading.Thread(target=self._write_loop, daemon=True)
+        self._lock = threading.Lock()
+        self.pages_fetched = 0
+        self.races_written = 0
+        self.batches_dropped = 0
+
+    def start(self):
+        for t in self.fetchers:
+            t.start()
+        self.writer.start()
+
+    def fetch(self, kind: str, url: str) -> str:
+        """Rate-limited GET with retries on network errors. Returns the HTML."""
+        for attempt in range(FETCH_ATTEMPTS):
+            self.rate.wait()
+            t0 = time.perf_counter()
+            try:
+                html = http_client.http_get(self.session, url).text
+            except requests.exceptions.RequestException as e:
+                instrumentation.observe_request(kind, time.perf_counter() - t0, backend=http_client.BACKEND_HTTP, ok=False)
+                if attempt == FETCH_ATTEMPTS - 1:
+                    raise
+                print(f"      Network Error fetching {kind} (Attempt {attempt+1}/{FETCH_ATTEMPTS}): {e}")
+                time.sleep(3)
+                continue
+            instrumentation.observe_request(kind, time.perf_counter() - t0, backend=http_client.BACKEND_HTTP)
+            with self._lock:
+                self.pages_fetched += 1
+                self.sp.add_bytes_read(len(html))
+            return html
+
+    def _fetch_loop(self):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                return
+            batch, (kind, race_no) = job
+            slot = batch.slots[(kind, race_no)]
+            try:
+                html = self.fetch(kind, batch.url(kind, race_no))
+                parsed = self.pool.submit(_parse, kind, html)
+            except Exception as e:
+                _settle(slot, error=e)
+                continue
+            _settle(slot, parsed)
+
+    def submit(self, batch: StadiumBatch):
+        self.batches.put(batch)
+        keys = list(batch.slots)
+        queued = 0
+        try:
+            for key in keys:
+                self.jobs.put((batch, key))
+                queued += 1
+        except BaseException:
+            # Interrupted while the queue was full: pages never queued are cancelled,
+            # so the writer does not wait for them
+            for key in keys[queued:]:
+                _settle(batch.slots[key], error=Cancelled())
+            raise
+
+    def _write_loop(self):
+        while True:
+            batch = self.batches.get()
+            if batch is None:
+                return
+            # Waits for every page of the batch to be fetched (parsing may still run)
+            if any(isinstance(slot.exception(), Cancelled) for slot in batch.slots.values()):
+                # Written only whole: resume then fetches the stadium-day again
+                self.batches_dropped += 1
+                continue
+            try:
+                races, entries, results, details = self._assemble(batch)
+                write_batch(self.sp, races, entries, results, details)
+                self.races_written += len(races)
+            except Exception as e:
+                print(f"    [{batch.name} {batch.d}] Failed to write batch: {e}")
+
+    def _assemble(self, batch: StadiumBatch):
+        races, entries, results = [], [], []
+        details = {path: [] for path in RESULT_DETAIL_TABLES}
+        try:
+            overview = batch.page("12races")
+        except Exception as e:
+            print(f"    [{batch.name} {batch.d}] Failed to get 12races ({e}); deadlines left empty.")
+            overview = {}
+
+        for race_no in batch.race_nos:
+            race_id = get_race_id(batch.d, batch.sid, race_no)
+            try:
+                info = batch.page("race_info", race_no)
+            except Exception as e:
+                print(f"      {race_id}: Failed to get info ({e}). Skipping race.")
+                continue
+            try:
+                res = batch.page("result", race_no)
+            except Exception as e:
+                # Cancelled races have no result page worth parsing
+                print(f"      {race_id}: No result ({e}).")
+                res = {}
+            deadline = overview.get(f"{race_no}R", {}).get('vote_limit', '')
+            races.append(build_race_row(race_id, batch.d, batch.sid, race_no, info, deadline))
+            entries.extend(build_entry_rows(race_id, info))
+            result_row = build_result_row(race_id, res)
+            if result_row:
+                results.append(result_row)
+            for path, rows in build_result_details(race_id, res).items():
+                details[path].extend(rows)
+
+        print(f"    [{batch.name} (ID:{batch.sid}) {batch.d}] {len(races)} races, {len(results)} results")
+        return races, entries, results, details
+
+    def close(self, cancel: bool = False):
+        """
+        Stop the threads once the queued work is done. With cancel=True
+        (an interrupted run) the pages still queued are not fetched: their
+        batches are dropped, and only fetches already under way finish.
+        """
+        if cancel:
+            while True:
+                try:
+                    job = self.jobs.get_nowait()
+                except queue.Empty:
+                    break
+                if job is not None:
+                    batch, key = job
+                    _settle(batch.slots[key], error=Cancelled())
+        for _ in self.fetchers:
+            self.jobs.put(None)
+        for t in self.fetchers:
+            t.join()
+        self.batches.put(None)
+        self.writer.join()
+        self.session.close()
+        if self.batches_dropped:
+            print(f"  Interrupted: {self.batches_dropped} stadium-days not written (collected again on resume).")
+
+def collect_pipelined(start_date: date, end_date: date, limit_races: int = 12, fetchers: int = FETCHERS,
+                      parsers: Optional[int] = None, interval: float = REQUEST_INTERVAL):
+    with instrumentation.span("collect", start_date=start_date, end_date=end_date, pipelined=True) as sp:
+        try:
+            _collect(sp, start_date, end_date, limit_races, fetchers, parsers, interval)
+        finally:
+            index_new_rows()
+
+def _collect(sp, start_date: date, end_date: date, limit_races: int, fetchers: int,
+             parsers: Optional[int], interval: float):
+    ensure_data_dir()
+    existing_races = get_existing_race_ids()
+    print(f"Found {len(existing_races)} existing races. Skipping these...")
+    print(f"Starting pipelined collection: {start_date} to {end_date} "
+          f"({fetchers} fetch threads, 1 request / {interval}s)")
+
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=parsers, initializer=_init_parser) as pool:
+        pipeline = Pipeline(sp, pool, fetchers, interval)
+        pipeline.start()
+        try:
+            current_date = start_date
+            while current_date <= end_date:
+                # The stadium list decides what to fetch next, so this one page is awaited
+                try:
+                    html = pipeline.fetch("stadiums", PAGES["stadiums"][0](current_date))
+                    stadiums = pool.submit(_parse, "stadiums", html).result()
+                except Exception as e:
+                    print(f"  Failed to fetch stadiums for {current_date} ({e}). Skipping date.")
+                    current_date += timedelta(days=1)
+                    continue
+
+                active_stadiums = get_active_stadiums(stadiums)
+                print(f"  {current_date}: {len(active_stadiums)} venues")
+                for sid, sname in active_stadiums:
+                    race_nos = [r for r in range(1, limit_races + 1)
+                                if get_race_id(current_date, sid, r) not in existing_races]
+                    if race_nos:
+                        pipeline.submit(StadiumBatch(current_date, sid, sname, race_nos))
+                current_date += timedelta(days=1)
+        except BaseException:
+            pipeline.close(cancel=True)
+            raise
+        pipeline.close()
+
+    elapsed = time.perf_counter() - started
+    print(f"\nPages fetched: {pipeline.pages_fetched}, races written: {pipeline.races_written} "
+          f"in {elapsed:.1f}s ({pipeline.pages_fetched / max(elapsed, 1e-9):.2f} pages/s)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Phase 1 collector with fetching, parsing and writing pipelined")
+    parser.add_argument("start", type=date.fromisoformat)
+    parser.add_argument("end", type=date.fromisoformat)
+    parser.add_argument("--limit-races", type=int, default=12)
+    parser.add_argument("--fetchers", type=int, default=FETCHERS)
+    parser.add_argument("--parsers", type=int, default=None, help="parser processes (default: all cores)")
+    parser.add_argument("--interval", type=float, default=REQUEST_INTERVAL, help="seconds between requests")
+    args = parser.parse_args()
+    if args.start > args.end:
+        print("start must not be after end")
+        sys.exit(1)
+    collect_pipelined(args.start, args.end, args.limit_races, args.fetchers, args.parsers, args.interval)
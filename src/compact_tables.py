@@ -0,0 +1,240 @@
+import os
+import io
+import sys
+import json
+import argparse
+import pandas as pd
+from typing import Dict, List, Optional
+
+import instrumentation
+
+# --- Paths ---
+DATA_DIR = "data"
+FILE_RACES = os.path.join(DATA_DIR, "races.csv")
+FILE_ENTRIES = os.path.join(DATA_DIR, "entries.csv")
+FILE_RESULTS = os.path.join(DATA_DIR, "results.csv")
+
+# table -> path, unique key. race_id (YYYYMMDD_SS_RR) sorts as (date, stadium, race).
+# Optional tables are the result page side tables; data collected before them has none.
+TABLES = {
+    "races":   {"path": FILE_RACES,   "key": ["race_id"]},
+    "entries": {"path": FILE_ENTRIES, "key": ["race_id", "boat_no"]},
+    "results": {"path": FILE_RESULTS, "key": ["race_id"]},
+    "result_order":    {"path": os.path.join(DATA_DIR, "result_order.csv"),    "key": ["race_id", "boat_no"], "optional": True},
+    "result_starts":   {"path": os.path.join(DATA_DIR, "result_starts.csv"),   "key": ["race_id", "course"], "optional": True},
+    "payoffs":         {"path": os.path.join(DATA_DIR, "payoffs.csv"),         "key": ["race_id", "bet_type", "seq"], "optional": True},
+    "race_conditions": {"path": os.path.join(DATA_DIR, "race_conditions.csv"), "key": ["race_id"], "optional": True},
+    "returns":         {"path": os.path.join(DATA_DIR, "returns.csv"),         "key": ["race_id", "boat_no"], "optional": True},
+}
+
+ENCODING = "utf-8-sig"
+
+def index_path(table_path: str) -> str:
+    return table_path + ".idx.json"
+
+def race_date(race_id_series: pd.Series) -> pd.Series:
+    """YYYYMMDD part of race_id."""
+    return race_id_series.str.slice(0, 8)
+
+def read_raw(path: str) -> pd.DataFrame:
+    # Everything as str so values are written back byte-for-byte
+    return pd.read_csv(path, dtype=str, keep_default_na=False, encoding=ENCODING)
+
+def dedupe_and_sort(df: pd.DataFrame, key: List[str]) -> pd.DataFrame:
+    """Drop duplicate keys (the last write wins) and sort by (date, stadium, race, boat)."""
+    df = df.drop_duplicates(subset=key, keep="last")
+    sort_cols = []
+    for col in key:
+        if col == "race_id":
+            sort_cols.append(df[col])
+        else:
+            sort_cols.append(pd.to_numeric(df[col], errors="coerce"))
+    order = pd.DataFrame({f"_k{i}": c.values for i, c in enumerate(sort_cols)})
+    order = order.sort_values(list(order.columns), kind="stable").index
+    return df.iloc[order].reset_index(drop=True)
+
+def find_orphans(tables: Dict[str, pd.DataFrame]) -> Dict[str, pd.Series]:
+    """
+    Boolean masks of orphan rows: rows of any other table whose race is
+    missing from races.csv, and races without any entry rows (crash between writes).
+    """
+    race_ids = set(tables["races"]["race_id"])
+    entry_race_ids = set(tables["entries"]["race_id"])
+    orphans = {name: ~df["race_id"].isin(race_ids) for name, df in tables.items() if name != "races"}
+    orphans["races"] = ~tables["races"]["race_id"].isin(entry_race_ids)
+    return orphans
+
+def write_with_index(df: pd.DataFrame, path: str) -> Dict[str, int]:
+    """
+    Write a race_id-sorted table to `path` and return the sparse index
+    {YYYYMMDD: byte offset of the first row of that date}.
+    """
+    offsets = {}
+    with open(path, "wb") as f:
+        f.write(df.iloc[:0].to_csv(index=False).encode("utf-8"))
+        if len(df):
+            dates = race_date(df["race_id"])
+            for d, group in df.groupby(dates, sort=False):
+                offsets[d] = f.tell()
+                f.write(group.to_csv(index=False, header=False).encode("utf-8"))
+        f.flush()
+        os.fsync(f.fileno())
+    return offsets
+
+def _changed(path: str, source_stat: os.stat_result) -> bool:
+    current = os.stat(path)
+    return (current.st_size, current.st_mtime_ns) != (source_stat.st_size, source_stat.st_mtime_ns)
+
+def write_index(path: str, rows: int, offsets: Dict[str, int], size: int):
+    st = os.stat(path)
+    idx = {"inode": st.st_ino, "size": size, "rows": rows, "offsets": offsets}
+    tmp_idx = index_path(path) + ".tmp"
+    with open(tmp_idx, "w", encoding="utf-8") as f:
+        json.dump(idx, f)
+    os.replace(tmp_idx, index_path(path))
+
+def compact_set(tables: Dict[str, pd.DataFrame], stats: Dict[str, os.stat_result]) -> Dict[str, int]:
+    """
+    Atomically replace every table with its compacted form, all or none:
+    races, entries and results are never left compacted against each other's
+    stale files. Returns bytes written per table.
+    """
+    paths = {name: TABLES[name]["path"] for name in tables}
+    tmp_paths = {name: path + ".compact.tmp" for name, path in paths.items()}
+    offsets, olds = {}, {}
+    try:
+        for name, df in tables.items():
+            offsets[name] = write_with_index(df, tmp_paths[name])
+        # Held open across the swap: rows appended after the check land in the old file
+        for name, path in paths.items():
+            olds[name] = open(path, "rb")
+        # Refuse to swap anything if the collector appended to any table while we were compacting
+        changed = [path for name, path in paths.items() if _changed(path, stats[name])]
+        if changed:
+            raise RuntimeError(f"{', '.join(changed)} changed during compaction; rerun when the collector is idle.")
+    except BaseException:
+        for f in olds.values():
+            f.close()
+        for tmp_path in tmp_paths.values():
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        raise
+
+    written = {}
+    try:
+        # Readers holding the old files keep reading them; new opens see the compacted ones
+        for name, path in paths.items():
+            os.replace(tmp_paths[name], path)
+        for name, path in paths.items():
+            size = os.stat(path).st_size
+            write_index(path, len(tables[name]), offsets[name], size)
+            # Rows appended between the check and the swap: carried over as an unindexed tail
+            olds[name].seek(stats[name].st_size)
+            late = olds[name].read()
+            if late:
+                with open(path, "ab") as f:
+                    f.write(late)
+                print(f"  {name}: {len(late)} bytes appended during the swap kept after the index")
+            written[name] = size
+    finally:
+        for f in olds.values():
+            f.close()
+    return written
+
+def compact_tables(drop_orphans: bool = False):
+    with instrumentation.span("compact", drop_orphans=drop_orphans) as sp:
+        _compact(sp, drop_orphans)
+
+def _compact(sp, drop_orphans: bool):
+    print("Starting Compaction...")
+    tables, stats = {}, {}
+    for name, spec in TABLES.items():
+        path = spec["path"]
+        if not os.path.exists(path):
+            if spec.get("optional"):
+                continue
+            print(f"Error: File not found {path}")
+            sys.exit(1)
+        stats[name] = os.stat(path)
+        tables[name] = read_raw(path)
+        sp.add_bytes_read(stats[name].st_size)
+
+    for name in tables:
+        spec = TABLES[name]
+        before = len(tables[name])
+        tables[name] = dedupe_and_sort(tables[name], spec["key"])
+        print(f"  {name}: {before} rows -> {len(tables[name])} ({before - len(tables[name])} duplicates)")
+
+    orphans = find_orphans(tables)
+    dropped = {}
+    for name, mask in orphans.items():
+        n = int(mask.sum())
+        if not n:
+            continue
+        print(f"  {name}: {n} orphan rows")
+        if drop_orphans:
+            dropped[name] = tables[name][mask]
+            tables[name] = tables[name][~mask].reset_index(drop=True)
+
+    written = compact_set(tables, stats)
+    for name, size in written.items():
+        sp.add_bytes_written(size)
+        sp.add_rows(len(tables[name]))
+
+    # Only after the swap, so a refused compaction does not move the same orphans twice
+    for name, df in dropped.items():
+        orphan_path = os.path.join(DATA_DIR, f"orphans_{name}.csv")
+        df.to_csv(orphan_path, mode="a", index=False, header=not os.path.exists(orphan_path), encoding=ENCODING)
+        print(f"  {name}: orphans moved to {orphan_path}")
+    print("Compaction Completed Successfully.")
+
+def load_index(path: str) -> Optional[Dict]:
+    """Sparse index of `path`, or None if missing or stale (file replaced since)."""
+    try:
+        with open(index_path(path), encoding="utf-8") as f:
+            idx = json.load(f)
+        st = os.stat(path)
+    except (OSError, ValueError):
+        return None
+    if st.st_ino != idx["inode"] or st.st_size < idx["size"]:
+        return None
+    return idx
+
+def read_date_range(path: str, start: str, end: str) -> pd.DataFrame:
+    """
+    Rows of a table whose race date is in [start, end] (YYYYMMDD, inclusive).
+    Seeks via the sparse index into the compacted region, then scans only
+    rows appended after the last compaction. Falls back to a full scan.
+    """
+    idx = load_index(path)
+    if idx is None:
+        df = read_raw(path)
+        dates = race_date(df["race_id"])
+        return df[(dates >= start) & (dates <= end)].reset_index(drop=True)
+
+    with open(path, "rb") as f:
+        header = f.readline()
+        dates = sorted(idx["offsets"])
+        first = next((d for d in dates if d >= start), None)
+        after = next((d for d in dates if d > end), None)
+        chunk = b""
+        if first is not None and first <= end:
+            begin = idx["offsets"][first]
+            stop = idx["offsets"][after] if after else idx["size"]
+            f.seek(begin)
+            chunk = f.read(stop - begin)
+        f.seek(idx["size"])
+        tail = f.read()
+
+    df = pd.read_csv(io.BytesIO(header + chunk + tail), dtype=str, keep_default_na=False, encoding=ENCODING)
+    if tail:
+        dates = race_date(df["race_id"])
+        df = df[(dates >= start) & (dates <= end)].reset_index(drop=True)
+    return df
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Deduplicate, sort and index the raw tables")
+    parser.add_argument("--drop-orphans", action="store_true",
+                        help="move orphan rows to data/orphans_<table>.csv")
+    args = parser.parse_args()
+    compact_tables(drop_orphans=args.drop_orphans)
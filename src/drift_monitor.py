@@ -0,0 +1,301 @@
+import os
+import csv
+import sys
+import json
+import math
+import time
+import argparse
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+# Phase 3 defines the feature list without importing lightgbm
+from feature_engineering_phase3 import FEATURES
+
+# --- Paths ---
+DATA_DIR = "data"
+FILE_PREDICTIONS = os.path.join(DATA_DIR, "predictions.csv")
+FILE_RESULTS = os.path.join(DATA_DIR, "results.csv")
+FILE_TRAINING = os.path.join(DATA_DIR, "training_featured.csv")
+FILE_REFERENCE = os.path.join(DATA_DIR, "monitor_reference.json")
+FILE_STATE = os.path.join(DATA_DIR, "monitor_state.json")
+FILE_ALERTS = os.path.join(DATA_DIR, "monitor_alerts.jsonl")
+
+# --- Metric settings ---
+DECAY = 0.998            # per settled race; effective window ~500 races (~3000 boats)
+SCORE_BINS = 50          # score histogram resolution for AUC
+CALIBRATION_BINS = 10
+FEATURE_BINS = 10        # quantile bins of the training distribution
+MIN_RACES = 200          # no alerts until this many (decayed) races have been seen
+PENDING_DAYS = 7         # unsettled predictions older than this are dropped
+
+THRESHOLDS = {
+    "auc_min": 0.60,
+    "top2_hit_min": 0.45,
+    "ece_max": 0.08,
+    "psi_max": 0.25,
+}
+
+# --- Streaming metrics (each is a fixed-size list: O(1) memory) ---
+def _decay(values: List[float], factor: float):
+    for i in range(len(values)):
+        values[i] *= factor
+
+def _bin(x: float, n: int) -> int:
+    return min(max(int(x * n), 0), n - 1)
+
+def auc_from_histograms(pos: List[float], neg: List[float]) -> float:
+    """P(score of a positive > score of a negative), ties count half."""
+    n_pos, n_neg = sum(pos), sum(neg)
+    if n_pos <= 0 or n_neg <= 0:
+        return float("nan")
+    below, total = 0.0, 0.0
+    for p, n in zip(pos, neg):
+        total += p * (below + 0.5 * n)
+        below += n
+    return total / (n_pos * n_neg)
+
+def expected_calibration_error(count: List[float], prob_sum: List[float], hit_sum: List[float]) -> float:
+    n = sum(count)
+    if n <= 0:
+        return float("nan")
+    return sum(abs(ps - hs) for c, ps, hs in zip(count, prob_sum, hit_sum) if c > 0) / n
+
+def psi(expected: List[float], actual: List[float], eps: float = 1e-4) -> float:
+    """Population stability index between two bin distributions."""
+    n = sum(actual)
+    if n <= 0:
+        return float("nan")
+    total = 0.0
+    for e, a in zip(expected, actual):
+        a = max(a / n, eps)
+        e = max(e, eps)
+        total += (a - e) * math.log(a / e)
+    return total
+
+def feature_bin(value: float, edges: List[float]) -> int:
+    """Index of the quantile bin `value` falls into (edges are interior cut points)."""
+    lo, hi = 0, len(edges)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if value > edges[mid]:
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+# --- Reference (training) distribution ---
+def build_reference(path: str = FILE_TRAINING, out_path: str = FILE_REFERENCE):
+    """Quantile bin edges and bin proportions of every feature in the training table."""
+    import numpy as np
+    import pandas as pd
+    df = pd.read_csv(path, usecols=FEATURES)
+    reference = {"rows": len(df), "features": {}}
+    for col in FEATURES:
+        values = pd.to_numeric(df[col], errors="coerce").fillna(0).to_numpy()
+        edges = sorted(set(np.quantile(values, np.linspace(0, 1, FEATURE_BINS + 1)[1:-1]).tolist()))
+        counts = [0] * (len(edges) + 1)
+        for i in np.searchsorted(edges, values, side="left"):
+            counts[i] += 1
+        reference["features"][col] = {"edges": edges, "expected": [c / len(values) for c in counts]}
+    with open(out_path, "w", encoding="utf-8") as f:
+        json.dump(reference, f, indent=2)
+    print(f"Saved reference distribution of {len(FEATURES)} features ({len(df)} rows) to {out_path}")
+
+# --- Incremental file reading ---
+def read_new_rows(path: str, watermark: Dict) -> List[Dict[str, str]]:
+    """
+    Rows appended to `path` since `watermark` (inode + byte offset, updated in place).
+    If the file was replaced (compaction), it is read again from the top.
+    """
+    if not os.path.exists(path):
+        return []
+    st = os.stat(path)
+    if watermark.get("inode") != st.st_ino or st.st_size < watermark.get("offset", 0):
+        watermark.clear()
+        watermark.update({"inode": st.st_ino, "offset": 0, "header": None})
+    with open(path, "rb") as f:
+        if watermark["header"] is None:
+            watermark["header"] = next(csv.reader([f.readline().decode("utf-8-sig")]))
+            watermark["offset"] = f.tell()
+        f.seek(watermark["offset"])
+        data = f.read()
+    end = data.rfind(b"\n") + 1
+    watermark["offset"] += end
+    lines = data[:end].decode("utf-8").splitlines()
+    return [dict(zip(watermark["header"], row)) for row in csv.reader(lines) if row]
+
+def _float(value, default=0.0) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+def _boat(value) -> str:
+    """Normalize a boat number ("1", "1.0", 1) to a dict key."""
+    return str(int(_float(value, -1)))
+
+class DriftMonitor:
+    """
+    Streaming quality and drift metrics over settled races.
+
+    Every metric is a fixed-size, exponentially decayed histogram, so memory
+    does not grow with history and nothing is ever re-read. Only predictions
+    whose race has not been settled yet are held (bounded by PENDING_DAYS).
+    """
+
+    def __init__(self, reference: Dict, state: Optional[Dict] = None):
+        self.reference = reference
+        self.state = state or {
+            "predictions_watermark": {},
+            "results_watermark": {},
+            "pending": {},
+            "races": 0.0,
+            "settled_total": 0,
+            "score_pos": [0.0] * SCORE_BINS,
+            "score_neg": [0.0] * SCORE_BINS,
+            "top2_hits": 0.0,
+            "cal_count": [0.0] * CALIBRATION_BINS,
+            "cal_prob": [0.0] * CALIBRATION_BINS,
+            "cal_hit": [0.0] * CALIBRATION_BINS,
+            "feature_counts": {
+                col: [0.0] * len(ref["expected"]) for col, ref in reference["features"].items()
+            },
+        }
+
+    def add_predictions(self, rows: List[Dict[str, str]]):
+        pending = self.state["pending"]
+        for row in rows:
+            boats = pending.setdefault(row["race_id"], {})
+            # A re-prediction of the same boat replaces the earlier one
+            boats[_boat(row["boat_no"])] = [_float(row["prob_2rentai"])] + [_float(row.get(c)) for c in FEATURES]
+
+    def settle(self, result: Dict[str, str]) -> bool:
+        """Fold one race outcome into the metrics. False if it was never predicted."""
+        boats = self.state["pending"].pop(result["race_id"], None)
+        if not boats:
+            return False
+        winners = {_boat(result.get("rank1_boat")), _boat(result.get("rank2_boat"))}
+        st = self.state
+
+        for key in ("score_pos", "score_neg", "cal_count", "cal_prob", "cal_hit"):
+            _decay(st[key], DECAY)
+        for counts in st["feature_counts"].values():
+            _decay(counts, DECAY)
+        st["top2_hits"] *= DECAY
+        st["races"] = st["races"] * DECAY + 1
+        st["settled_total"] += 1
+
+        ranked = sorted(boats.items(), key=lambda kv: -kv[1][0])
+        predicted_top2 = {boat for boat, _ in ranked[:2]}
+        st["top2_hits"] += len(predicted_top2 & winners) / 2
+
+        for boat, values in boats.items():
+            prob, features = values[0], values[1:]
+            hit = 1.0 if boat in winners else 0.0
+            (st["score_pos"] if hit else st["score_neg"])[_bin(prob, SCORE_BINS)] += 1
+            b = _bin(prob, CALIBRATION_BINS)
+            st["cal_count"][b] += 1
+            st["cal_prob"][b] += prob
+            st["cal_hit"][b] += hit
+            for col, value in zip(FEATURES, features):
+                ref = self.reference["features"][col]
+                st["feature_counts"][col][feature_bin(value, ref["edges"])] += 1
+        return True
+
+    def prune(self, newest_race_id: str):
+        """Drop predictions for races that never settled (cancelled, scraper gaps)."""
+        cutoff = (datetime.strptime(newest_race_id[:8], "%Y%m%d") - timedelta(days=PENDING_DAYS)).strftime("%Y%m%d")
+        for race_id in [r for r in self.state["pending"] if r[:8] < cutoff]:
+            del self.state["pending"][race_id]
+
+    def metrics(self) -> Dict[str, float]:
+        st = self.state
+        races = st["races"]
+        out = {
+            "races_window": races,
+            "settled_total": st["settled_total"],
+            "pending_races": len(st["pending"]),
+            "auc": auc_from_histograms(st["score_pos"], st["score_neg"]),
+            "top2_hit_rate": st["top2_hits"] / races if races > 0 else float("nan"),
+            "ece": expected_calibration_error(st["cal_count"], st["cal_prob"], st["cal_hit"]),
+        }
+        for col, counts in st["feature_counts"].items():
+            out[f"psi_{col}"] = psi(self.reference["features"][col]["expected"], counts)
+        return out
+
+    def check(self) -> List[Dict]:
+        """Threshold alerts on the current window (none during warm-up)."""
+        m = self.metrics()
+        if m["races_window"] < MIN_RACES:
+            return []
+        alerts = []
+
+        def alert(name, value, threshold):
+            alerts.append({"metric": name, "value": round(value, 4), "threshold": threshold})
+
+        if m["auc"] < THRESHOLDS["auc_min"]:
+            alert("auc", m["auc"], THRESHOLDS["auc_min"])
+        if m["top2_hit_rate"] < THRESHOLDS["top2_hit_min"]:
+            alert("top2_hit_rate", m["top2_hit_rate"], THRESHOLDS["top2_hit_min"])
+        if m["ece"] > THRESHOLDS["ece_max"]:
+            alert("ece", m["ece"], THRESHOLDS["ece_max"])
+        for col in FEATURES:
+            value = m[f"psi_{col}"]
+            if value > THRESHOLDS["psi_max"]:
+                alert(f"psi_{col}", value, THRESHOLDS["psi_max"])
+        return alerts
+
+def load_json(path: str) -> Optional[Dict]:
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+def save_state(state: Dict, path: str = FILE_STATE):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(tmp_path, path)
+
+def run_monitor() -> List[Dict]:
+    """Ingest new predictions and newly settled results, update metrics, raise alerts."""
+    print("Starting Drift Monitor...")
+    reference = load_json(FILE_REFERENCE)
+    if reference is None:
+        print(f"  No reference found. Building it from {FILE_TRAINING}...")
+        if not os.path.exists(FILE_TRAINING):
+            print(f"Error: {FILE_TRAINING} not found.")
+            sys.exit(1)
+        build_reference()
+        reference = load_json(FILE_REFERENCE)
+
+    monitor = DriftMonitor(reference, load_json(FILE_STATE))
+    monitor.add_predictions(read_new_rows(FILE_PREDICTIONS, monitor.state["predictions_watermark"]))
+    results = read_new_rows(FILE_RESULTS, monitor.state["results_watermark"])
+    settled = sum(monitor.settle(r) for r in results)
+    if results:
+        monitor.prune(max(r["race_id"] for r in results))
+    print(f"  New results: {len(results)}, settled predicted races: {settled}")
+
+    for name, value in monitor.metrics().items():
+        print(f"    {name}: {value:.4f}" if isinstance(value, float) else f"    {name}: {value}")
+
+    alerts = monitor.check()
+    if alerts:
+        with open(FILE_ALERTS, "a", encoding="utf-8") as f:
+            for a in alerts:
+                a["ts"] = time.strftime("%Y-%m-%d %H:%M:%S")
+                f.write(json.dumps(a) + "\n")
+                print(f"  [ALERT] {a['metric']} = {a['value']} (threshold {a['threshold']})")
+    save_state(monitor.state)
+    print("Drift Monitor Completed.")
+    return alerts
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Streaming prediction quality and drift monitor")
+    parser.add_argument("command", nargs="?", default="run", choices=["run", "reference"])
+    args = parser.parse_args()
+    if args.command == "reference":
+        build_reference()
+    else:
+        run_monitor()
@@ -3,11 +3,48 @@ import pandas as pd
 import os
 import sys
 
+import instrumentation
+import feature_matrix
+
 # Define Paths
 DATA_DIR = "data"
 FILE_INPUT = os.path.join(DATA_DIR, "training_base.csv")
 FILE_OUTPUT = os.path.join(DATA_DIR, "training_featured.csv")
 
+# --- Model Features (defined here, next to the code that produces them) ---
+FEATURES = [
+    'boat_no',
+    'class_val',    # Encoded A1..B2
+    'motor_p',      # Motor 2-ren
+    'st_ave',       # Start Timing Avg
+    'st_diff',      # Diff from race mean
+    'motor_rank',   # Rank in race
+    'fl',           # Flying count
+]
+TARGET = 'flag_2rentai' # 1 if <= 2nd place, else 0
+
+def _finished_within(df, places):
+    boat = pd.to_numeric(df['boat_no'], errors='coerce')
+    ranks = [pd.to_numeric(df[f'rank{i}_boat'], errors='coerce') for i in range(1, places + 1)]
+    return pd.concat([r == boat for r in ranks], axis=1).any(axis=1).astype(int)
+
+def _rough(df):
+    """Trifecta paid 10,000 yen or more, or a boat was refunded (accident)."""
+    rough = pd.to_numeric(df['payoff_3t'], errors='coerce') >= 10000
+    if 'returned_boats' in df:
+        # training_base.csv files written before Phase 2 merged returns.csv lack the column
+        rough |= pd.to_numeric(df['returned_boats'], errors='coerce').fillna(0) > 0
+    return rough.astype(int)
+
+# --- Training labels written to the feature matrix: name -> f(boat-level frame) ---
+LABELS = {
+    TARGET: lambda df: df[TARGET],
+    'flag_win': lambda df: _finished_within(df, 1),
+    'flag_3rentai': lambda df: _finished_within(df, 3),
+    # Race-level (same value on every boat of the race)
+    'flag_rough': lambda df: _rough(df),
+}
+
 def load_data(filepath):
     if not os.path.exists(filepath):
         print(f"Error: File not found {filepath}")
@@ -21,31 +58,24 @@ def encode_class(cls_str):
     mapping = {'A1': 4, 'A2': 3, 'B1': 2, 'B2': 1}
     return mapping.get(cls_str, 1)
 
-def feature_engineering_phase3():
-    print("Starting Phase 3: Feature Engineering...")
-    
-    # 1. Load Data
-    print(f"  Loading {FILE_INPUT}...")
-    df = load_data(FILE_INPUT)
-    print(f"    Rows: {len(df)}")
-    
-    # 2. Preprocessing / Type Conversion
+def add_features(df):
+    """
+    Add model features to a boat-level frame (one row per race_id x boat_no).
+    Shared by Phase 3 and the prediction path so both compute identical features.
+    """
+    # Preprocessing / Type Conversion
     # Ensure numeric types
     numeric_cols = ['motor_p', 'st_ave', 'fl', 'boat_no']
     for col in numeric_cols:
         df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
     
-    # 3. Feature Generation
-    print("  Generating Features...")
-
+    # Feature Generation
     # [Feature] Class Encoding
     # Convert 'A1' etc to 4,3,2,1
     df['class_val'] = df['class'].apply(encode_class)
     
     # [Feature] Relative Metrics (Group by Race)
     # Calculate Race Averages
-    print("    Calculating relative metrics (ST difference, Motor rank)...")
-    
     # Group by race_id
     grouped = df.groupby('race_id')
     
@@ -65,6 +95,27 @@ def feature_engineering_phase3():
     
     # [Feature] Stadium ID
     # Keep as is (int).
+
+    return df
+
+def feature_engineering_phase3():
+    with instrumentation.span("features") as sp:
+        _feature_engineering(sp)
+
+def _feature_engineering(sp):
+    print("Starting Phase 3: Feature Engineering...")
+    
+    # 1. Load Data
+    print(f"  Loading {FILE_INPUT}...")
+    df = load_data(FILE_INPUT)
+    print(f"    Rows: {len(df)}")
+    sp.add_bytes_read(instrumentation.file_size(FILE_INPUT))
+    
+    # 2-3. Preprocessing & Feature Generation
+    # (add_features itself stays quiet: the live path calls it once per race)
+    print("  Generating Features...")
+    print("    Calculating relative metrics (ST difference, Motor rank)...")
+    df = add_features(df)
     
     # 4. Select Columns for Training
     # We keep identifiers for reference, but define feature list.
@@ -76,6 +127,12 @@ def feature_engineering_phase3():
     # 5. Save
     print(f"  Saving to {FILE_OUTPUT}...")
     df.to_csv(FILE_OUTPUT, index=False, encoding='utf-8-sig')
+    sp.add_rows(len(df))
+    sp.add_bytes_written(instrumentation.file_size(FILE_OUTPUT))
+
+    # 6. float32 feature matrix + labels for out-of-core training (memory-mapped by Phase 4)
+    print(f"  Writing feature matrix to {feature_matrix.MATRIX_DIR}...")
+    feature_matrix.build_matrix(df, FEATURES, {name: f(df) for name, f in LABELS.items()}, source=FILE_OUTPUT)
     print("Phase 3 Completed Successfully.")
 
 if __name__ == "__main__":
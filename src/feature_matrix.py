@@ -0,0 +1,132 @@
+import os
+import json
+import numpy as np
+import pandas as pd
+from typing import Callable, Dict, List, Tuple
+
+import fingerprint
+
+# --- Paths ---
+DATA_DIR = "data"
+MATRIX_DIR = os.path.join(DATA_DIR, "matrix")
+
+# Side columns stored next to X, one .npy each: name -> dtype
+KEY_COLUMNS = {
+    "stadium_id": np.int16,
+    "date": np.int32,     # YYYYMMDD from race_id
+}
+
+# stadium_id of rows whose venue is missing or not 1-24: they only ever train the global model
+UNKNOWN_STADIUM = -1
+STADIUM_IDS = range(1, 25)
+
+# Bumped when the stored layout or encoding changes, so older matrices are rebuilt
+MATRIX_FORMAT = 2
+
+def matrix_path(name: str, out_dir: str = MATRIX_DIR) -> str:
+    return os.path.join(out_dir, f"{name}.npy")
+
+def race_dates(race_ids: pd.Series) -> np.ndarray:
+    return race_ids.astype(str).str.slice(0, 8).astype(np.int32).to_numpy()
+
+def _column(values, dtype) -> np.ndarray:
+    return pd.to_numeric(values, errors="coerce").fillna(0).to_numpy(dtype)
+
+def stadium_column(values: pd.Series) -> np.ndarray:
+    """stadium_id as int16, UNKNOWN_STADIUM where missing or invalid (never 0)."""
+    ids = pd.to_numeric(values, errors="coerce")
+    unknown = ~ids.isin(STADIUM_IDS)
+    if unknown.any():
+        print(f"    Warning: {int(unknown.sum())} rows without a valid stadium_id (global model only)")
+    return ids.where(~unknown, UNKNOWN_STADIUM).to_numpy(KEY_COLUMNS["stadium_id"])
+
+def _write_meta(n: int, features: List[str], labels: List[str], source: str, out_dir: str):
+    meta = {
+        "format": MATRIX_FORMAT,
+        "rows": n,
+        "features": features,
+        "labels": labels,
+        "source": fingerprint.file_fingerprint(source) if source else "",
+    }
+    with open(os.path.join(out_dir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+
+def build_matrix(df: pd.DataFrame, features: List[str], labels: Dict[str, pd.Series],
+                 source: str = "", out_dir: str = MATRIX_DIR):
+    """
+    Write the float32 feature matrix X (rows x features), the label vectors
+    and the key columns as .npy files that can be memory-mapped read-only.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    n = len(df)
+    X = np.lib.format.open_memmap(matrix_path("X", out_dir), mode="w+", dtype=np.float32,
+                                  shape=(n, len(features)))
+    for j, col in enumerate(features):
+        X[:, j] = _column(df[col], np.float32)
+    X.flush()
+    del X
+
+    columns = {
+        "stadium_id": stadium_column(df["stadium_id"]),
+        "date": race_dates(df["race_id"]),
+    }
+    for name, values in labels.items():
+        columns[f"y_{name}"] = _column(values, np.float32)
+    for name, values in columns.items():
+        np.save(matrix_path(name, out_dir), values)
+    _write_meta(n, features, list(labels), source, out_dir)
+
+def build_matrix_from_csv(path: str, features: List[str], labels: Dict[str, Callable[[pd.DataFrame], pd.Series]],
+                          out_dir: str = MATRIX_DIR, chunksize: int = 500_000):
+    """
+    Same files as build_matrix, streamed from a CSV in chunks: one pass to
+    count rows, one to fill the memmap. Memory stays at one chunk.
+    Each label is computed per chunk by its function.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    n = sum(len(c) for c in pd.read_csv(path, usecols=["race_id"], chunksize=chunksize))
+    X = np.lib.format.open_memmap(matrix_path("X", out_dir), mode="w+", dtype=np.float32,
+                                  shape=(n, len(features)))
+    columns = {name: np.zeros(n, dtype) for name, dtype in KEY_COLUMNS.items()}
+    columns.update({f"y_{name}": np.zeros(n, np.float32) for name in labels})
+
+    offset = 0
+    for chunk in pd.read_csv(path, chunksize=chunksize):
+        rows = slice(offset, offset + len(chunk))
+        for j, col in enumerate(features):
+            X[rows, j] = _column(chunk[col], np.float32)
+        columns["stadium_id"][rows] = stadium_column(chunk["stadium_id"])
+        columns["date"][rows] = race_dates(chunk["race_id"])
+        for name, label in labels.items():
+            columns[f"y_{name}"][rows] = _column(label(chunk), np.float32)
+        offset += len(chunk)
+    X.flush()
+    del X
+
+    for name, values in columns.items():
+        np.save(matrix_path(name, out_dir), values)
+    _write_meta(n, features, list(labels), path, out_dir)
+
+def load_meta(out_dir: str = MATRIX_DIR) -> Dict:
+    path = os.path.join(out_dir, "meta.json")
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+def is_current(source: str, features: List[str], labels: List[str], out_dir: str = MATRIX_DIR) -> bool:
+    """True if the stored matrix was built from `source` as it is now, with these columns."""
+    meta = load_meta(out_dir)
+    return (bool(meta)
+            and meta.get("format") == MATRIX_FORMAT
+            and meta["source"] == fingerprint.file_fingerprint(source)
+            and meta["features"] == features
+            and set(labels) <= set(meta["labels"]))
+
+def load_matrix(out_dir: str = MATRIX_DIR) -> Tuple[np.ndarray, Dict[str, np.ndarray], Dict]:
+    """Memory-map X and every side column read-only. Nothing is copied into RAM."""
+    meta = load_meta(out_dir)
+    X = np.load(matrix_path("X", out_dir), mmap_mode="r")
+    names = list(KEY_COLUMNS) + [f"y_{name}" for name in meta["labels"]]
+    columns = {name: np.load(matrix_path(name, out_dir), mmap_mode="r") for name in names}
+    return X, columns, meta
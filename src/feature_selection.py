@@ -0,0 +1,228 @@
+import os
+import sys
+import argparse
+import numpy as np
+import pandas as pd
+import lightgbm as lgb
+from concurrent.futures import ProcessPoolExecutor
+from scipy import stats
+from sklearn.metrics import roc_auc_score
+from typing import Dict, List, Optional
+
+import instrumentation
+import feature_matrix
+from train_model_phase4 import FEATURES, TARGET, FILE_INPUT
+
+# --- Paths ---
+DATA_DIR = "data"
+SELECTION_DIR = os.path.join(feature_matrix.MATRIX_DIR, "selection")
+FILE_BINARY = os.path.join(SELECTION_DIR, "train.bin")
+FILE_REPORT = os.path.join(DATA_DIR, "feature_selection.csv")
+
+N_FOLDS = 4
+N_REPEATS = 3
+NUM_ROUNDS = 100
+
+PARAMS = {
+    'objective': 'binary',
+    'verbosity': -1,
+    'boosting_type': 'gbdt',
+    'seed': 42,
+}
+
+def ensure_selection_data(features: List[str]):
+    """
+    Feature matrix of the candidate columns plus one LightGBM binary Dataset
+    over all rows. Bins are computed here once; every fold and every
+    drop-column model is a row subset of this Dataset.
+    """
+    if feature_matrix.is_current(FILE_INPUT, features, [TARGET], out_dir=SELECTION_DIR) \
+            and os.path.exists(FILE_BINARY):
+        return
+    if not os.path.exists(FILE_INPUT):
+        print(f"Error: {FILE_INPUT} not found.")
+        sys.exit(1)
+    print(f"  Building selection matrix from {FILE_INPUT}...")
+    df = pd.read_csv(FILE_INPUT)
+    missing = [f for f in features if f not in df.columns]
+    if missing:
+        print(f"Error: Columns not found in {FILE_INPUT}: {missing}")
+        sys.exit(1)
+    feature_matrix.build_matrix(df, features, {TARGET: df[TARGET]}, source=FILE_INPUT, out_dir=SELECTION_DIR)
+    del df
+
+    X, columns, _ = feature_matrix.load_matrix(SELECTION_DIR)
+    print("  Binning features once...")
+    dataset = lgb.Dataset(X, columns[f"y_{TARGET}"], feature_name=features,
+                          params={'verbosity': -1}, free_raw_data=True)
+    if os.path.exists(FILE_BINARY):
+        os.remove(FILE_BINARY)
+    dataset.save_binary(FILE_BINARY)
+
+def time_folds(dates: np.ndarray, n_folds: int) -> List[Dict[str, np.ndarray]]:
+    """
+    Expanding-window folds over race dates: the days are cut into
+    n_folds + 1 consecutive blocks, and fold i trains on blocks 0..i and
+    validates on block i+1. No validation day precedes a training day.
+    Needs at least n_folds + 1 distinct dates.
+    """
+    days = np.unique(dates)
+    if len(days) < n_folds + 1:
+        raise ValueError(f"{n_folds} folds need at least {n_folds + 1} race days, got {len(days)}")
+    blocks = np.array_split(days, n_folds + 1)
+    folds = []
+    for i in range(1, n_folds + 1):
+        start, end = blocks[i][0], blocks[i][-1]
+        folds.append({
+            "train": np.flatnonzero(dates < start),
+            "valid": np.flatnonzero((dates >= start) & (dates <= end)),
+            "valid_dates": (int(start), int(end)),
+        })
+    return folds
+
+# --- Worker side: each process loads the binned Dataset and maps the matrix once ---
+_dataset = None
+_X = None
+_y = None
+_folds = None
+_features = None
+
+def _init_worker(features, n_folds):
+    global _dataset, _X, _y, _folds, _features
+    _features = features
+    _dataset = lgb.Dataset(FILE_BINARY, params={'verbosity': -1}).construct()
+    _X, columns, _ = feature_matrix.load_matrix(SELECTION_DIR)
+    _y = columns[f"y_{TARGET}"]
+    _folds = time_folds(columns["date"], n_folds)
+
+def _fit(fold: int, drop: Optional[str], num_rounds: int, num_threads: int):
+    """
+    Train on a fold's rows of the shared binned Dataset. A dropped column
+    gets feature_contri 0 so it can never win a split; the bins stay shared.
+    """
+    params = dict(PARAMS, num_threads=num_threads)
+    if drop is not None:
+        params['feature_contri'] = [0.0 if f == drop else 1.0 for f in _features]
+    train = _dataset.subset(_folds[fold]["train"])
+    return lgb.train(params, train, num_boost_round=num_rounds)
+
+def _run_job(fold: int, drop: Optional[str], n_repeats: int, num_rounds: int, num_threads: int):
+    """
+    One model per job. drop=None is the fold's baseline and also computes
+    permutation importance of every feature on the validation block.
+    Returns (fold, drop, auc, {feature: [auc drop per repeat]}).
+    """
+    model = _fit(fold, drop, num_rounds, num_threads)
+    valid = _folds[fold]["valid"]
+    X_valid = np.array(_X[valid])
+    y_valid = _y[valid]
+    auc = roc_auc_score(y_valid, model.predict(X_valid, num_threads=num_threads))
+
+    permutation = {}
+    if drop is None:
+        rng = np.random.default_rng(fold)
+        for j, name in enumerate(_features):
+            original = X_valid[:, j].copy()
+            deltas = []
+            for _ in range(n_repeats):
+                X_valid[:, j] = rng.permutation(original)
+                deltas.append(auc - roc_auc_score(y_valid, model.predict(X_valid, num_threads=num_threads)))
+            X_valid[:, j] = original
+            permutation[name] = deltas
+    return fold, drop, auc, permutation
+
+def confidence_interval(values, level: float = 0.95):
+    """Mean and t-interval half-width of a small sample (folds)."""
+    values = np.asarray(values, dtype=float)
+    if len(values) < 2:
+        return float(values.mean()), float("nan")
+    sem = values.std(ddof=1) / np.sqrt(len(values))
+    return float(values.mean()), float(stats.t.ppf((1 + level) / 2, len(values) - 1) * sem)
+
+def select_features(candidates: Optional[List[str]] = None, n_folds: int = N_FOLDS, n_repeats: int = N_REPEATS,
+                    num_rounds: int = NUM_ROUNDS, workers: Optional[int] = None):
+    with instrumentation.span("select_features", folds=n_folds, repeats=n_repeats) as sp:
+        _select(sp, list(dict.fromkeys(candidates or FEATURES)), n_folds, n_repeats, num_rounds, workers)
+
+def _select(sp, features: List[str], n_folds: int, n_repeats: int, num_rounds: int, workers: Optional[int]):
+    print("Starting Feature Selection...")
+    ensure_selection_data(features)
+    _, columns, meta = feature_matrix.load_matrix(SELECTION_DIR)
+    sp.add_rows(meta["rows"])
+
+    try:
+        folds = time_folds(columns["date"], n_folds)
+    except ValueError as e:
+        print(f"Error: {e}. Use fewer --folds or collect more days.")
+        sys.exit(1)
+    print(f"  Rows: {meta['rows']}, candidates: {len(features)}, folds: {n_folds} (time-ordered)")
+    y = columns[f"y_{TARGET}"]
+    used = []
+    for i, fold in enumerate(folds):
+        print(f"    Fold {i}: train {len(fold['train'])} rows, valid {len(fold['valid'])} rows "
+              f"({fold['valid_dates'][0]}-{fold['valid_dates'][1]})")
+        # AUC is undefined on a validation block with a single class
+        if len(np.unique(y[fold["train"]])) < 2 or len(np.unique(y[fold["valid"]])) < 2:
+            print("      skipped: only one class")
+            continue
+        used.append(i)
+    if not used:
+        print("Error: No fold has both classes in training and validation.")
+        sys.exit(1)
+
+    # Baselines first: they also carry the permutation work
+    jobs = [(i, None) for i in used] + [(i, f) for f in features for i in used]
+    cores = os.cpu_count() or 1
+    workers = min(workers or cores, len(jobs))
+    num_threads = max(1, cores // workers)
+    print(f"  Training {len(jobs)} models on {workers} processes x {num_threads} threads...")
+
+    base, dropped, permuted = {}, {}, {f: [] for f in features}
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(features, n_folds)) as pool:
+        futures = [pool.submit(_run_job, i, drop, n_repeats, num_rounds, num_threads) for i, drop in jobs]
+        for fut in futures:
+            fold, drop, auc, permutation = fut.result()
+            if drop is None:
+                base[fold] = auc
+                for name, deltas in permutation.items():
+                    permuted[name].append(float(np.mean(deltas)))
+            else:
+                dropped[(fold, drop)] = auc
+
+    rows = []
+    for name in features:
+        perm_mean, perm_ci = confidence_interval(permuted[name])
+        drop_mean, drop_ci = confidence_interval([base[i] - dropped[(i, name)] for i in used])
+        rows.append({
+            "feature": name,
+            "perm_auc_delta": perm_mean,
+            "perm_ci95": perm_ci,
+            "drop_auc_delta": drop_mean,
+            "drop_ci95": drop_ci,
+            # Keep a feature only if removing it hurts on every plausible reading
+            "keep": bool(drop_mean - drop_ci > 0) if not np.isnan(drop_ci) else bool(drop_mean > 0),
+        })
+    report = pd.DataFrame(rows).sort_values("drop_auc_delta", ascending=False)
+
+    print(f"\n  Baseline AUC per fold: {', '.join(f'{i}: {base[i]:.4f}' for i in used)}")
+    print("\n  [AUC loss: permutation | drop-column, mean ± 95% CI over folds]")
+    for r in report.itertuples():
+        print(f"    {r.feature:>14}: {r.perm_auc_delta:+.4f} ± {r.perm_ci95:.4f} | "
+              f"{r.drop_auc_delta:+.4f} ± {r.drop_ci95:.4f}  {'keep' if r.keep else '-'}")
+
+    report.to_csv(FILE_REPORT, index=False)
+    sp.add_bytes_written(instrumentation.file_size(FILE_REPORT))
+    print(f"\n  Saved report to {FILE_REPORT}")
+    print("Feature Selection Completed Successfully.")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Permutation and drop-column importance on time-ordered folds")
+    parser.add_argument("--candidates", nargs="+", default=None,
+                        help="numeric columns of training_featured.csv (default: model FEATURES)")
+    parser.add_argument("--folds", type=int, default=N_FOLDS)
+    parser.add_argument("--repeats", type=int, default=N_REPEATS, help="permutations per feature and fold")
+    parser.add_argument("--rounds", type=int, default=NUM_ROUNDS)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+    select_features(args.candidates, args.folds, args.repeats, args.rounds, args.workers)
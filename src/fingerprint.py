@@ -0,0 +1,62 @@
+import os
+import json
+import hashlib
+from typing import Dict, Any, List
+
+# Kept free of heavy imports: the CLI consults it before any phase module is loaded.
+
+DATA_DIR = "data"
+FILE_FINGERPRINTS = os.path.join(DATA_DIR, ".fingerprints.json")
+
+def file_fingerprint(path: str) -> str:
+    """Cheap identity of a file: size + mtime (ns). Empty string if missing."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return ""
+    return f"{st.st_size}:{st.st_mtime_ns}"
+
+def config_fingerprint(config: Dict[str, Any]) -> str:
+    blob = json.dumps(config, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha256(blob).hexdigest()[:16]
+
+def phase_fingerprint(inputs: List[str], outputs: List[str], config: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "inputs": {p: file_fingerprint(p) for p in inputs},
+        "outputs": {p: file_fingerprint(p) for p in outputs},
+        "config": config_fingerprint(config),
+    }
+
+def load_fingerprints(path: str = FILE_FINGERPRINTS) -> Dict[str, Any]:
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_fingerprints(fps: Dict[str, Any], path: str = FILE_FINGERPRINTS):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(fps, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+def is_up_to_date(phase: str, inputs: List[str], outputs: List[str], config: Dict[str, Any]) -> bool:
+    """
+    True when the inputs and config match the last successful run of `phase`
+    and its outputs still exist untouched.
+    """
+    recorded = load_fingerprints().get(phase)
+    if not recorded:
+        return False
+    current = phase_fingerprint(inputs, outputs, config)
+    if any(not fp for fp in current["outputs"].values()):
+        return False
+    return current == recorded
+
+def record_phase(phase: str, inputs: List[str], outputs: List[str], config: Dict[str, Any]):
+    fps = load_fingerprints()
+    fps[phase] = phase_fingerprint(inputs, outputs, config)
+    save_fingerprints(fps)
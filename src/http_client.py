@@ -0,0 +1,159 @@
+import os
+import time
+import importlib
+import importlib.util
+from typing import Any, Callable, Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from selenium.common.exceptions import WebDriverException
+
+from pyjpboatrace import PyJPBoatrace
+from pyjpboatrace import drivers
+
+import instrumentation
+
+HAS_LXML = importlib.util.find_spec("lxml") is not None
+
+BACKEND_HTTP = "http"
+BACKEND_BROWSER = "browser"
+
+# Optional browser fallback: BOATRACE_BROWSER=chrome|firefox|edge
+ENV_BROWSER = "BOATRACE_BROWSER"
+BROWSER_FACTORIES = {
+    "chrome": drivers.create_chrome_driver,
+    "firefox": drivers.create_firefox_driver,
+    "edge": drivers.create_edge_driver,
+}
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Safari/537.36"
+REQUEST_TIMEOUT = 30
+
+# pyjpboatrace page parsers (all pages we scrape are server-rendered)
+PARSER_MODULES = [
+    "parse_html_index",
+    "parse_html_raceindex",
+    "parse_html_racelist",
+    "parse_html_beforeinfo",
+    "parse_html_raceresult",
+    "parse_html_oddstf",
+    "parse_html_oddsk",
+    "parse_html_odds2tf",
+    "parse_html_odds3t",
+    "parse_html_odds3f",
+]
+
+def create_session(pool_size: int = 8) -> requests.Session:
+    """Keep-alive session with a connection pool and compressed transfer."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update({
+        "User-Agent": USER_AGENT,
+        "Accept-Encoding": "gzip, deflate",
+        "Accept-Language": "ja-JP,ja;q=0.9",
+        "Connection": "keep-alive",
+    })
+    return session
+
+def http_get(session: requests.Session, url: str) -> requests.Response:
+    """GET a boatrace.jp page; pages without a declared charset are utf-8."""
+    resp = session.get(url, timeout=REQUEST_TIMEOUT)
+    resp.raise_for_status()
+    if "charset" not in resp.headers.get("Content-Type", "").lower():
+        resp.encoding = "utf-8"
+    return resp
+
+def use_lxml_parser(enabled: bool = True) -> bool:
+    """
+    Make pyjpboatrace's page parsers build their soup with lxml instead of
+    the pure-Python html.parser (enabled=False restores html.parser).
+    This patches the parser modules, so it applies to the whole process;
+    tests/test_http_client.py checks both parsers give the same results on
+    stored result and racelist pages. Returns whether lxml is now in use.
+    """
+    from bs4 import BeautifulSoup
+    if not HAS_LXML:
+        enabled = False
+
+    def lxml_soup(markup, features=None, *args, **kwargs):
+        return BeautifulSoup(markup, "lxml", *args, **kwargs)
+
+    for name in PARSER_MODULES:
+        module = importlib.import_module(f"pyjpboatrace.scraper._parser.{name}")
+        module.BeautifulSoup = lxml_soup if enabled else BeautifulSoup
+    return enabled
+
+class BoatraceClient:
+    """
+    Drop-in replacement for PyJPBoatrace used by the pipeline.
+
+    Every call is served by a plain HTTP GET over a pooled session. A headless
+    browser is only started if a browser is configured (BOATRACE_BROWSER) and
+    the HTTP backend fails. The backend that served the last call is in
+    `last_backend`; per-backend call counts are in `backend_counts`.
+    """
+
+    def __init__(self, session: Optional[requests.Session] = None, pool_size: int = 8,
+                 browser: Optional[str] = None, fast_parser: bool = True):
+        self.session = session or create_session(pool_size)
+        self.http = PyJPBoatrace(driver=drivers.create_httpget_driver(self._http_get))
+        browser = os.environ.get(ENV_BROWSER, "") if browser is None else browser
+        self._browser_factory: Optional[Callable] = BROWSER_FACTORIES.get(browser)
+        self._browser: Optional[PyJPBoatrace] = None
+        self.last_backend: Optional[str] = None
+        self.backend_counts: Dict[str, int] = {BACKEND_HTTP: 0, BACKEND_BROWSER: 0}
+        if fast_parser:
+            use_lxml_parser()
+
+    def _http_get(self, url: str) -> requests.Response:
+        return http_get(self.session, url)
+
+    def _browser_client(self) -> PyJPBoatrace:
+        if self._browser is None:
+            self._browser = PyJPBoatrace(driver=self._browser_factory())
+        return self._browser
+
+    def _call(self, method: str, *args) -> Dict[str, Any]:
+        t0 = time.perf_counter()
+        try:
+            result = getattr(self.http, method)(*args)
+            backend = BACKEND_HTTP
+        except (requests.exceptions.RequestException, WebDriverException):
+            instrumentation.observe_request(method, time.perf_counter() - t0, backend=BACKEND_HTTP, ok=False)
+            if self._browser_factory is None:
+                raise
+            t0 = time.perf_counter()
+            result = getattr(self._browser_client(), method)(*args)
+            backend = BACKEND_BROWSER
+        instrumentation.observe_request(method, time.perf_counter() - t0, backend=backend)
+        self.last_backend = backend
+        self.backend_counts[backend] += 1
+        return result
+
+    def get_stadiums(self, d):
+        return self._call("get_stadiums", d)
+
+    def get_12races(self, d, stadium):
+        return self._call("get_12races", d, stadium)
+
+    def get_race_info(self, d, stadium, race):
+        return self._call("get_race_info", d, stadium, race)
+
+    def get_just_before_info(self, d, stadium, race):
+        return self._call("get_just_before_info", d, stadium, race)
+
+    def get_race_result(self, d, stadium, race):
+        return self._call("get_race_result", d, stadium, race)
+
+    def close(self):
+        self.session.close()
+        if self._browser is not None:
+            self._browser.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
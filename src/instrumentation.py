@@ -0,0 +1,324 @@
+import os
+import sys
+import json
+import time
+import atexit
+import threading
+from typing import Dict, Any, List, Optional
+
+try:
+    import resource
+except ImportError:  # Windows has no resource module
+    resource = None
+
+# --- Configuration (environment variables) ---
+# BOATRACE_TRACE   : path of the JSON-lines trace. Enables instrumentation.
+# BOATRACE_PROM    : path of the Prometheus textfile (default: <trace>.prom)
+# BOATRACE_PROFILE : stage name to run under cProfile (e.g. "transform")
+ENV_TRACE = "BOATRACE_TRACE"
+ENV_PROM = "BOATRACE_PROM"
+ENV_PROFILE = "BOATRACE_PROFILE"
+
+# Request latency histogram buckets (seconds)
+LATENCY_BUCKETS = [0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0]
+
+
+class _NullSpan:
+    """Returned by span() when instrumentation is disabled. Every call is a no-op."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        return False
+
+    def add_rows(self, n):
+        pass
+
+    def add_bytes_read(self, n):
+        pass
+
+    def add_bytes_written(self, n):
+        pass
+
+    def set(self, **attrs):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _State:
+    def __init__(self):
+        self.enabled = False
+        self.trace_path = ""
+        self.prom_path = ""
+        self.profile_stage = ""
+        # Open spans per thread (worker threads start with an empty stack)
+        self.local = threading.local()
+        # Guards the totals below, span counters and trace writes
+        self.lock = threading.Lock()
+        # stage -> {"wall": s, "cpu": s, "rows": n, "bytes_read": n, "bytes_written": n, "runs": n}
+        self.stages: Dict[str, Dict[str, float]] = {}
+        # (endpoint, backend) -> {"count": n, "sum": s, "buckets": [n...]}
+        self.requests: Dict[tuple, Dict[str, Any]] = {}
+        self.peak_rss = 0
+
+
+_state = _State()
+
+
+def _stack() -> List[str]:
+    stack = getattr(_state.local, "stack", None)
+    if stack is None:
+        stack = _state.local.stack = []
+    return stack
+
+
+def configure(trace_path: Optional[str] = None, prom_path: Optional[str] = None,
+              profile_stage: Optional[str] = None):
+    """(Re)configure instrumentation. Arguments default to the environment variables."""
+    trace_path = os.environ.get(ENV_TRACE, "") if trace_path is None else trace_path
+    profile_stage = os.environ.get(ENV_PROFILE, "") if profile_stage is None else profile_stage
+    if prom_path is None:
+        prom_path = os.environ.get(ENV_PROM, "")
+        if not prom_path and trace_path:
+            prom_path = os.path.splitext(trace_path)[0] + ".prom"
+
+    _state.trace_path = trace_path
+    _state.prom_path = prom_path
+    _state.profile_stage = profile_stage
+    _state.enabled = bool(trace_path or prom_path or profile_stage)
+
+
+def enabled() -> bool:
+    return _state.enabled
+
+
+def file_size(path: str) -> int:
+    """Size of a file in bytes, 0 if it does not exist."""
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+def peak_rss_bytes() -> int:
+    """Process peak resident set size (high-water mark) in bytes."""
+    if resource is None:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS reports bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _emit(record: Dict[str, Any]):
+    if not _state.trace_path:
+        return
+    line = json.dumps(record, ensure_ascii=False, default=str) + "\n"
+    with _state.lock, open(_state.trace_path, "a", encoding="utf-8") as f:
+        f.write(line)
+
+
+class Span:
+    """One timed stage. Use through span(); counters are added while the stage runs."""
+
+    def __init__(self, stage: str, attrs: Dict[str, Any]):
+        self.stage = stage
+        self.attrs = attrs
+        self.rows = 0
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self._profiler = None
+
+    # Worker threads may report into a span opened by the main thread
+    def add_rows(self, n):
+        with _state.lock:
+            self.rows += int(n)
+
+    def add_bytes_read(self, n):
+        with _state.lock:
+            self.bytes_read += int(n)
+
+    def add_bytes_written(self, n):
+        with _state.lock:
+            self.bytes_written += int(n)
+
+    def set(self, **attrs):
+        with _state.lock:
+            self.attrs.update(attrs)
+
+    def __enter__(self):
+        stack = _stack()
+        self.parent = stack[-1] if stack else None
+        stack.append(self.stage)
+        if _state.profile_stage == self.stage:
+            import cProfile
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        self.started = time.time()
+        self._wall0 = time.perf_counter()
+        self._cpu0 = time.process_time()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        wall = time.perf_counter() - self._wall0
+        cpu = time.process_time() - self._cpu0
+        if self._profiler is not None:
+            self._profiler.disable()
+            self._profiler.dump_stats(profile_path(self.stage))
+        _stack().pop()
+
+        peak = peak_rss_bytes()
+        with _state.lock:
+            _state.peak_rss = max(_state.peak_rss, peak)
+            totals = _state.stages.setdefault(self.stage, {
+                "wall": 0.0, "cpu": 0.0, "rows": 0, "bytes_read": 0, "bytes_written": 0, "runs": 0
+            })
+            totals["wall"] += wall
+            totals["cpu"] += cpu
+            totals["rows"] += self.rows
+            totals["bytes_read"] += self.bytes_read
+            totals["bytes_written"] += self.bytes_written
+            totals["runs"] += 1
+
+        record = {
+            "type": "span",
+            "ts": self.started,
+            "stage": self.stage,
+            "parent": self.parent,
+            "status": "ok" if exc_type is None else f"error:{exc_type.__name__}",
+            "wall_s": round(wall, 6),
+            "cpu_s": round(cpu, 6),
+            "rows": self.rows,
+            "bytes_read": self.bytes_read,
+            "bytes_written": self.bytes_written,
+            "peak_rss_bytes": peak,
+        }
+        with _state.lock:
+            record.update(self.attrs)
+        _emit(record)
+        return False
+
+
+def span(stage: str, **attrs):
+    """
+    Time a pipeline stage (wall, CPU, rows, bytes, peak RSS).
+
+        with instrumentation.span("transform") as sp:
+            sp.add_rows(len(df))
+    """
+    if not _state.enabled:
+        return _NULL_SPAN
+    return Span(stage, attrs)
+
+
+class _RequestTimer:
+    def __init__(self, endpoint: str, backend: str):
+        self.endpoint = endpoint
+        self.backend = backend
+
+    def __enter__(self):
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        observe_request(self.endpoint, time.perf_counter() - self._t0,
+                        backend=self.backend, ok=exc_type is None)
+        return False
+
+
+def request(endpoint: str, backend: str = "default"):
+    """Time one scraper request: `with instrumentation.request("get_race_info"): ...`"""
+    if not _state.enabled:
+        return _NULL_SPAN
+    return _RequestTimer(endpoint, backend)
+
+
+def observe_request(endpoint: str, seconds: float, backend: str = "default", ok: bool = True):
+    """Record the latency of one scraper request."""
+    if not _state.enabled:
+        return
+    with _state.lock:
+        stats = _state.requests.setdefault((endpoint, backend), {
+            "count": 0, "errors": 0, "sum": 0.0, "buckets": [0] * len(LATENCY_BUCKETS)
+        })
+        stats["count"] += 1
+        stats["sum"] += seconds
+        if not ok:
+            stats["errors"] += 1
+        for i, le in enumerate(LATENCY_BUCKETS):
+            if seconds <= le:
+                stats["buckets"][i] += 1
+    stack = _stack()
+    _emit({
+        "type": "request",
+        "ts": time.time(),
+        "endpoint": endpoint,
+        "backend": backend,
+        "stage": stack[-1] if stack else None,
+        "latency_s": round(seconds, 6),
+        "ok": ok,
+    })
+
+
+def profile_path(stage: str) -> str:
+    base = os.path.dirname(_state.trace_path) if _state.trace_path else "data"
+    return os.path.join(base or ".", f"profile_{stage}.prof")
+
+
+def render_prometheus() -> str:
+    lines = []
+
+    def metric(name, mtype, help_text, samples):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {mtype}")
+        for labels, value in samples:
+            label_str = ",".join(f'{k}="{v}"' for k, v in labels.items())
+            lines.append(f"{name}{{{label_str}}} {value}" if label_str else f"{name} {value}")
+
+    stages = sorted(_state.stages.items())
+    metric("boatrace_stage_wall_seconds", "counter", "Wall-clock time spent in a pipeline stage.",
+           [({"stage": s}, round(t["wall"], 6)) for s, t in stages])
+    metric("boatrace_stage_cpu_seconds", "counter", "CPU time spent in a pipeline stage.",
+           [({"stage": s}, round(t["cpu"], 6)) for s, t in stages])
+    metric("boatrace_stage_rows_total", "counter", "Rows processed by a pipeline stage.",
+           [({"stage": s}, t["rows"]) for s, t in stages])
+    metric("boatrace_stage_bytes_read_total", "counter", "Bytes read by a pipeline stage.",
+           [({"stage": s}, t["bytes_read"]) for s, t in stages])
+    metric("boatrace_stage_bytes_written_total", "counter", "Bytes written by a pipeline stage.",
+           [({"stage": s}, t["bytes_written"]) for s, t in stages])
+    metric("boatrace_stage_runs_total", "counter", "Completed runs of a pipeline stage.",
+           [({"stage": s}, t["runs"]) for s, t in stages])
+    metric("boatrace_peak_rss_bytes", "gauge", "Process peak resident set size.",
+           [({}, _state.peak_rss)])
+
+    name = "boatrace_request_latency_seconds"
+    lines.append(f"# HELP {name} Scraper request latency per endpoint.")
+    lines.append(f"# TYPE {name} histogram")
+    for (endpoint, backend), st in sorted(_state.requests.items()):
+        labels = f'endpoint="{endpoint}",backend="{backend}"'
+        for le, n in zip(LATENCY_BUCKETS, st["buckets"]):
+            lines.append(f'{name}_bucket{{{labels},le="{le}"}} {n}')
+        lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {st["count"]}')
+        lines.append(f"{name}_sum{{{labels}}} {round(st['sum'], 6)}")
+        lines.append(f"{name}_count{{{labels}}} {st['count']}")
+    metric("boatrace_request_errors_total", "counter", "Failed scraper requests per endpoint.",
+           [({"endpoint": e, "backend": b}, st["errors"]) for (e, b), st in sorted(_state.requests.items())])
+    return "\n".join(lines) + "\n"
+
+
+def flush():
+    """Write the Prometheus textfile (atomically, as node_exporter expects)."""
+    if not _state.enabled or not _state.prom_path:
+        return
+    tmp_path = _state.prom_path + ".tmp"
+    with _state.lock:
+        text = render_prometheus()
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, _state.prom_path)
+
+
+configure()
+atexit.register(flush)
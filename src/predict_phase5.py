@@ -0,0 +1,305 @@
+import os
+import sys
+import time
+import pickle
+import numpy as np
+import pandas as pd
+import requests
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+from selenium.common.exceptions import WebDriverException
+
+import instrumentation
+from http_client import BoatraceClient
+from collect_data_phase1 import DATA_DIR, get_race_id, get_active_stadiums, build_entry_rows, append_to_csv
+from feature_engineering_phase3 import add_features
+from train_model_phase4 import FEATURES, FILE_MODEL
+
+# --- Paths ---
+FILE_PREDICTIONS = os.path.join(DATA_DIR, "predictions.csv")
+FILE_STADIUM_MODELS = os.path.join(DATA_DIR, "stadium_models.pkl")
+FILE_BUNDLE = os.path.join(DATA_DIR, "model_bundle.pkl")
+FILE_PREDICTIONS_MULTI = os.path.join(DATA_DIR, "predictions_multi.csv")
+
+# Feature values are kept so the drift monitor can compare them with training data
+COLS_PREDICTIONS = list(dict.fromkeys(
+    ["race_id", "boat_no", "racer_id", "name", "prob_2rentai", "pred_rank"] + FEATURES
+))
+
+# All targets of a multi-target bundle, tagged with the bundle version
+COLS_PREDICTIONS_MULTI = ["race_id", "boat_no", "racer_id", "name",
+                          "prob_win", "prob_2rentai", "prob_3rentai", "prob_rough", "model_version"]
+
+# Exhibition times and weather (before-info) are posted about this long before the vote deadline
+BEFORE_INFO_LEAD = timedelta(minutes=20)
+NETWORK_ERRORS = (requests.exceptions.RequestException, WebDriverException)
+
+class SystemClock:
+    """Wall clock for the live path. replay_day.VirtualClock has the same interface."""
+
+    def now(self) -> datetime:
+        return datetime.now()
+
+    def sleep(self, seconds: float):
+        if seconds > 0:
+            time.sleep(seconds)
+
+class StadiumRouter:
+    """
+    Routes each race to its stadium's booster (train_stadium_models.py).
+    Venues without their own model fall back to the global one.
+    All boosters stay resident, so routing costs nothing per race.
+    """
+
+    def __init__(self, bundle):
+        self.global_model = bundle['global']
+        self.stadiums = bundle['stadiums']
+
+    def model_for(self, stadium_id):
+        return self.stadiums.get(int(stadium_id), self.global_model)
+
+    def predict(self, X, stadium_ids):
+        stadium_ids = np.asarray(stadium_ids)
+        out = np.empty(len(X))
+        for sid in np.unique(stadium_ids):
+            mask = stadium_ids == sid
+            out[mask] = self.model_for(sid).predict(X[mask])
+        return out
+
+class ModelBundle:
+    """
+    Multi-target bundle (train_multi_target.py): one booster per target,
+    all trained on the same features. Race-level targets are predicted on
+    the boat-1 row of each race, as they were trained.
+    """
+
+    def __init__(self, bundle):
+        self.version = bundle['version']
+        self.targets = bundle['targets']
+
+    def predict(self, X):
+        """target name -> probabilities for the rows of X."""
+        out = {}
+        for name, target in self.targets.items():
+            if target['rows'] == 'race':
+                race_rows = (X['boat_no'] == 1).to_numpy()
+                probs = np.full(len(X), np.nan)
+                if race_rows.any():
+                    probs[race_rows] = target['model'].predict(X[race_rows])
+                out[name] = probs
+            else:
+                out[name] = target['model'].predict(X)
+        return out
+
+def load_model(filepath=FILE_MODEL, per_stadium=False, bundle=False):
+    if per_stadium:
+        filepath = FILE_STADIUM_MODELS
+    elif bundle:
+        filepath = FILE_BUNDLE
+    if not os.path.exists(filepath):
+        trainer = 'train_stadium_models.py' if per_stadium else 'train_multi_target.py' if bundle else 'Phase 4'
+        print(f"Error: {filepath} not found. Run {trainer} first.")
+        sys.exit(1)
+    with open(filepath, 'rb') as f:
+        model = pickle.load(f)
+    if per_stadium:
+        return StadiumRouter(model)
+    if bundle:
+        # Picks and the drift monitor are built on the 2rentai probability
+        if '2rentai' not in model['targets']:
+            print(f"Error: {filepath} has no 2rentai model (targets: {list(model['targets'])}).")
+            sys.exit(1)
+        return ModelBundle(model)
+    return model
+
+def predict_entries(model, df):
+    """
+    Score entry rows (entries.csv schema). Adds prob_2rentai and
+    pred_rank (1 = most likely to finish in the top 2 of its race);
+    a ModelBundle also adds prob_win, prob_3rentai and prob_rough
+    (race-level, repeated on every boat of the race).
+    """
+    df = add_features(df)
+    X = df[FEATURES].fillna(0)
+    if isinstance(model, ModelBundle):
+        for name, probs in model.predict(X).items():
+            df[f'prob_{name}'] = probs
+        if 'prob_rough' in df:
+            df['prob_rough'] = df.groupby('race_id')['prob_rough'].transform('max')
+        df['model_version'] = model.version
+    elif isinstance(model, StadiumRouter):
+        # race_id = YYYYMMDD_SS_RR
+        df['prob_2rentai'] = model.predict(X, df['race_id'].str.slice(9, 11).astype(int))
+    else:
+        df['prob_2rentai'] = model.predict(X)
+    df['pred_rank'] = df.groupby('race_id')['prob_2rentai'].rank(ascending=False, method='first').astype(int)
+    return df
+
+def fetch_race_entries(boatrace, target_date: date, sid: int, race_no: int,
+                       sleep: Callable[[float], None] = time.sleep) -> List[Dict]:
+    """Entry rows for one race, straight from the race info page."""
+    info = boatrace.get_race_info(target_date, sid, race_no)
+    sleep(1)
+    return build_entry_rows(get_race_id(target_date, sid, race_no), info)
+
+def with_retries(call, clock, attempts: int = 3, wait: float = 3):
+    """call() with retries on network errors; the last error is raised."""
+    for attempt in range(attempts):
+        try:
+            return call()
+        except NETWORK_ERRORS as e:
+            if attempt == attempts - 1:
+                raise
+            print(f"      Network Error (Attempt {attempt+1}/{attempts}): {e}")
+            clock.sleep(wait)
+
+def race_schedule(boatrace, target_date: date, clock, limit_races: int = 12) -> List[Tuple[datetime, int, int]]:
+    """(vote deadline, stadium_id, race_no) of every race of the day, earliest first."""
+    stadiums = with_retries(lambda: boatrace.get_stadiums(target_date), clock)
+    clock.sleep(1)
+    schedule = []
+    for sid, sname in get_active_stadiums(stadiums or {}):
+        try:
+            races = with_retries(lambda: boatrace.get_12races(target_date, sid), clock)
+        except Exception as e:
+            print(f"    [{sname}] Failed to get deadlines ({e}). Skipping stadium.")
+            continue
+        clock.sleep(1)
+        for race_no in range(1, limit_races + 1):
+            vote_limit = races.get(f"{race_no}R", {}).get('vote_limit')
+            if vote_limit:
+                schedule.append((datetime.strptime(str(vote_limit), '%Y-%m-%d %H:%M:%S'), sid, race_no))
+    return sorted(schedule)
+
+def run_live_day(boatrace, model, target_date: date, clock=None, limit_races: int = 12,
+                 on_prediction: Optional[Callable[[pd.DataFrame, Dict], None]] = None) -> List[Dict]:
+    """
+    Live path for one race day: read every race's vote deadline, then per race
+    wait until its before-info is posted, fetch entries and before-info,
+    predict and hand the scored rows to on_prediction(df, before_info).
+
+    Raises if the schedule itself cannot be fetched (after retries).
+    Returns one timing record per race. latency_s runs from "data available"
+    (deadline - BEFORE_INFO_LEAD) to "prediction emitted"; emitted is None
+    for races that could not be predicted.
+    """
+    clock = clock or SystemClock()
+    schedule = race_schedule(boatrace, target_date, clock, limit_races)
+    print(f"  Scheduled {len(schedule)} races")
+
+    timings = []
+    for deadline, sid, race_no in schedule:
+        available = deadline - BEFORE_INFO_LEAD
+        clock.sleep((available - clock.now()).total_seconds())
+        race_id = get_race_id(target_date, sid, race_no)
+        emitted = None
+        try:
+            rows = with_retries(lambda: fetch_race_entries(boatrace, target_date, sid, race_no, sleep=clock.sleep), clock)
+            before = with_retries(lambda: boatrace.get_just_before_info(target_date, sid, race_no), clock)
+            df = predict_entries(model, pd.DataFrame(rows))
+            emitted = clock.now()
+            if on_prediction:
+                on_prediction(df, before or {})
+        except Exception as e:
+            print(f"    {race_id}: Failed ({e}). Skipping race.")
+        timings.append({
+            "race_id": race_id,
+            "available": available,
+            "deadline": deadline,
+            "emitted": emitted,
+            "latency_s": (emitted - available).total_seconds() if emitted else None,
+        })
+        clock.sleep(1)
+    return timings
+
+def format_picks(race: pd.DataFrame, n: int = 2) -> str:
+    top = race.sort_values('pred_rank').head(n)
+    picks = "  ".join(f"{int(r['boat_no'])}号艇 {r['name']} ({r['prob_2rentai']:.2f})" for _, r in top.iterrows())
+    if 'prob_rough' in race:
+        picks += f"  荒れ {race['prob_rough'].iloc[0]:.2f}"
+    return picks
+
+def save_predictions(df: pd.DataFrame):
+    append_to_csv(FILE_PREDICTIONS, df.to_dict('records'), COLS_PREDICTIONS)
+    if 'model_version' in df:
+        append_to_csv(FILE_PREDICTIONS_MULTI, df.to_dict('records'), COLS_PREDICTIONS_MULTI)
+
+def predict_phase5(target_date: date, limit_races: int = 12, per_stadium: bool = False, live: bool = False,
+                   bundle: bool = False):
+    with instrumentation.span("predict", date=target_date, per_stadium=per_stadium, live=live, bundle=bundle) as sp:
+        if live:
+            _predict_live(sp, target_date, limit_races, per_stadium, bundle)
+        else:
+            _predict(sp, target_date, limit_races, per_stadium, bundle)
+
+def _predict_live(sp, target_date: date, limit_races: int, per_stadium: bool, bundle: bool):
+    print(f"Starting Phase 5: Live prediction for {target_date}...")
+    model = load_model(per_stadium=per_stadium, bundle=bundle)
+
+    def emit(df, before):
+        sp.add_rows(len(df))
+        save_predictions(df)
+        weather = before.get('weather_information', {})
+        print(f"    {df['race_id'].iloc[0]}: {format_picks(df)}  [{weather.get('weather', '')} 風{weather.get('wind_speed', '')}]")
+
+    with BoatraceClient() as boatrace:
+        try:
+            timings = run_live_day(boatrace, model, target_date, limit_races=limit_races, on_prediction=emit)
+        except Exception as e:
+            print(f"  Error: Failed to get the race schedule for {target_date} ({e}).")
+            sys.exit(1)
+    late = [t for t in timings if t["emitted"] is None or t["emitted"] > t["deadline"]]
+    print(f"\n  Predicted {len(timings) - len(late)}/{len(timings)} races before their deadline")
+    print("Phase 5 Completed Successfully.")
+
+def _predict(sp, target_date: date, limit_races: int, per_stadium: bool, bundle: bool):
+    print(f"Starting Phase 5: Prediction for {target_date}...")
+    model = load_model(per_stadium=per_stadium, bundle=bundle)
+    boatrace = BoatraceClient()
+
+    try:
+        stadiums = boatrace.get_stadiums(target_date)
+        time.sleep(1)
+    except Exception as e:
+        print(f"  Error fetching stadiums for {target_date}: {e}")
+        return
+    active_stadiums = get_active_stadiums(stadiums or {})
+    print(f"  Active Stadiums: {len(active_stadiums)} venues")
+
+    rows = []
+    for sid, sname in active_stadiums:
+        print(f"    [{sname} (ID:{sid})]")
+        for race_no in range(1, limit_races + 1):
+            try:
+                rows.extend(fetch_race_entries(boatrace, target_date, sid, race_no))
+            except Exception as e:
+                print(f"      R{race_no:02d}: Failed to get info ({e}). Skipping race.")
+
+    if not rows:
+        print("  No entries to predict.")
+        return
+
+    df = predict_entries(model, pd.DataFrame(rows))
+    sp.add_rows(len(df))
+    save_predictions(df)
+
+    print("\n  [Top 2 per race]")
+    for race_id, race in df.groupby('race_id'):
+        print(f"    {race_id}: {format_picks(race)}")
+
+    print(f"\n  Saved predictions to {FILE_PREDICTIONS}")
+    print("Phase 5 Completed Successfully.")
+
+if __name__ == "__main__":
+    target_date = date.today()
+    per_stadium = "--per-stadium" in sys.argv[1:]
+    live = "--live" in sys.argv[1:]
+    bundle = "--bundle" in sys.argv[1:]
+    argv = [a for a in sys.argv[1:] if a not in ("--per-stadium", "--live", "--bundle")]
+    if argv:
+        try:
+            target_date = date.fromisoformat(argv[0])
+        except ValueError:
+            print("Invalid date format. Use YYYY-MM-DD")
+            sys.exit(1)
+    predict_phase5(target_date, per_stadium=per_stadium, live=live, bundle=bundle)
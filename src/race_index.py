@@ -0,0 +1,237 @@
+import os
+import io
+import csv
+import time
+import pickle
+import argparse
+import pandas as pd
+from typing import Dict, List, Optional, Tuple
+
+# --- Paths ---
+DATA_DIR = "data"
+FILE_RACES = os.path.join(DATA_DIR, "races.csv")
+FILE_ENTRIES = os.path.join(DATA_DIR, "entries.csv")
+FILE_INDEX = os.path.join(DATA_DIR, "race_index.pkl")
+
+INDEX_VERSION = 2
+
+def split_race_id(race_id: str) -> Tuple[str, int, int]:
+    """YYYYMMDD_SS_RR -> (YYYYMMDD, stadium_id, race_no)"""
+    d, sid, rno = race_id.split("_")
+    return d, int(sid), int(rno)
+
+class RaceIndex:
+    """
+    Secondary indexes over races.csv / entries.csv, stored as byte offsets:
+
+        racer_id            -> [(race_id, boat_no), ...]
+        (stadium_id, date)  -> {race_id, ...}
+        race_id             -> {boat_no: entries.csv offset}
+        race_id             -> races.csv offset
+
+    As in compaction, the last row written for a (race_id, boat_no) wins,
+    including which racer it belongs to.
+    Appended rows are indexed incrementally (from the last indexed byte);
+    a table that was replaced (e.g. by compaction) is re-indexed from scratch.
+    """
+
+    def __init__(self, races_path: str = FILE_RACES, entries_path: str = FILE_ENTRIES):
+        self.version = INDEX_VERSION
+        self.races_path = races_path
+        self.entries_path = entries_path
+        self.files: Dict[str, Dict] = {}
+        self.racer: Dict[str, List[Tuple[str, int]]] = {}
+        self.stadium_date: Dict[Tuple[int, str], Dict[str, None]] = {}
+        self.race_entries: Dict[str, Dict[int, int]] = {}
+        self.entry_racer: Dict[Tuple[str, int], str] = {}
+        self.race_offset: Dict[str, int] = {}
+
+    # --- Building ---
+    def _scan(self, path: str):
+        """Yield (offset, header, row) for every complete line not yet indexed."""
+        st = os.stat(path)
+        state = self.files.get(path)
+        if state is None or state["inode"] != st.st_ino or st.st_size < state["size"]:
+            if state is not None:
+                self._reset(path)
+                print(f"  {path} was replaced; re-indexing from scratch.")
+            state = {"inode": st.st_ino, "size": 0, "header": None}
+            self.files[path] = state
+
+        with open(path, "rb") as f:
+            if state["header"] is None:
+                first = f.readline()
+                state["header"] = next(csv.reader([first.decode("utf-8-sig")]))
+                state["size"] = f.tell()
+            f.seek(state["size"])
+            data = f.read()
+
+        # Only complete lines; a half-written row is picked up next time
+        end = data.rfind(b"\n") + 1
+        offset = state["size"]
+        for line in data[:end].splitlines(keepends=True):
+            if line.strip():
+                yield offset, state["header"], next(csv.reader([line.decode("utf-8")]))
+            offset += len(line)
+        state["size"] = offset
+
+    def _reset(self, path: str):
+        if path == self.races_path:
+            self.stadium_date.clear()
+            self.race_offset.clear()
+        else:
+            self.racer.clear()
+            self.race_entries.clear()
+            self.entry_racer.clear()
+
+    def update(self) -> int:
+        """Index rows appended since the last update. Returns the number of new rows."""
+        n = 0
+        if os.path.exists(self.races_path):
+            for offset, header, row in self._scan(self.races_path):
+                race_id = row[header.index("race_id")]
+                d, sid, _ = split_race_id(race_id)
+                self.stadium_date.setdefault((sid, d), {})[race_id] = None
+                self.race_offset[race_id] = offset
+                n += 1
+        if os.path.exists(self.entries_path):
+            for offset, header, row in self._scan(self.entries_path):
+                race_id = row[header.index("race_id")]
+                boat_no = int(row[header.index("boat_no")])
+                racer_id = row[header.index("racer_id")]
+                key = (race_id, boat_no)
+                previous = self.entry_racer.get(key)
+                if previous != racer_id:
+                    # A re-appended entry may name another racer: move the lane to them
+                    if previous:
+                        self.racer[previous].remove(key)
+                        if not self.racer[previous]:
+                            del self.racer[previous]
+                    if racer_id:
+                        self.racer.setdefault(racer_id, []).append(key)
+                    self.entry_racer[key] = racer_id
+                self.race_entries.setdefault(race_id, {})[boat_no] = offset
+                n += 1
+        return n
+
+    # --- Lookups ---
+    def _read_rows(self, path: str, offsets: List[int]) -> pd.DataFrame:
+        state = self.files.get(path)
+        if state is None or not offsets:
+            return pd.DataFrame(columns=state["header"] if state else None)
+        header = state["header"]
+        lines = []
+        with open(path, "rb") as f:
+            for offset in sorted(offsets):
+                f.seek(offset)
+                lines.append(f.readline())
+        buf = ",".join(header).encode("utf-8") + b"\n" + b"".join(lines)
+        return pd.read_csv(io.BytesIO(buf))
+
+    def entries_for_racer(self, racer_id, boat_no: Optional[int] = None,
+                          start: Optional[str] = None, end: Optional[str] = None) -> pd.DataFrame:
+        """Entry rows of a racer, optionally only for one lane and a YYYYMMDD range."""
+        offsets = []
+        for race_id, b in dict.fromkeys(self.racer.get(str(racer_id), [])):
+            if boat_no is not None and b != boat_no:
+                continue
+            d = race_id[:8]
+            if (start and d < start) or (end and d > end):
+                continue
+            offsets.append(self.race_entries[race_id][b])
+        return self._read_rows(self.entries_path, offsets)
+
+    def race_ids_at(self, stadium_id: int, start: str, end: Optional[str] = None) -> List[str]:
+        """race_ids held at a stadium between two dates (YYYYMMDD, inclusive)."""
+        end = end or start
+        keys = [(sid, d) for sid, d in self.stadium_date if sid == stadium_id and start <= d <= end]
+        return sorted(rid for key in keys for rid in self.stadium_date[key])
+
+    def races_at(self, stadium_id: int, start: str, end: Optional[str] = None) -> pd.DataFrame:
+        race_ids = self.race_ids_at(stadium_id, start, end)
+        return self._read_rows(self.races_path, [self.race_offset[r] for r in race_ids])
+
+    def entries_for_race(self, race_id: str) -> pd.DataFrame:
+        return self._read_rows(self.entries_path, list(self.race_entries.get(race_id, {}).values()))
+
+def load_index(path: str = FILE_INDEX) -> RaceIndex:
+    if os.path.exists(path):
+        try:
+            with open(path, "rb") as f:
+                index = pickle.load(f)
+            if getattr(index, "version", None) == INDEX_VERSION:
+                return index
+        except Exception:
+            pass
+    return RaceIndex()
+
+def save_index(index: RaceIndex, path: str = FILE_INDEX):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        pickle.dump(index, f)
+    os.replace(tmp_path, path)
+
+def update_index(path: str = FILE_INDEX) -> RaceIndex:
+    """Load the stored index, add newly appended rows, save it back."""
+    index = load_index(path)
+    n = index.update()
+    if n:
+        save_index(index, path)
+    return index
+
+# --- Benchmark ---
+def bench(racer_id: str, boat_no: int, stadium_id: int, start: str, end: str, repeat: int = 5):
+    """Compare indexed lookups with the full-scan pd.read_csv approach."""
+    def timed(fn):
+        best = float("inf")
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            out = fn()
+            best = min(best, time.perf_counter() - t0)
+        return best * 1000, len(out)
+
+    def scan_racer():
+        df = pd.read_csv(FILE_ENTRIES)
+        d = df["race_id"].str.slice(0, 8)
+        return df[(df["racer_id"].astype(str) == str(racer_id)) & (df["boat_no"] == boat_no)
+                  & (d >= start) & (d <= end)]
+
+    def scan_stadium():
+        df = pd.read_csv(FILE_RACES)
+        d = df["race_id"].str.slice(0, 8)
+        return df[(df["stadium_id"] == stadium_id) & (d >= start) & (d <= end)]
+
+    t0 = time.perf_counter()
+    index = update_index()
+    print(f"  Index load/update: {(time.perf_counter() - t0) * 1000:.1f} ms")
+
+    cases = [
+        (f"racer {racer_id} lane {boat_no}", scan_racer,
+         lambda: index.entries_for_racer(racer_id, boat_no=boat_no, start=start, end=end)),
+        (f"stadium {stadium_id} races", scan_stadium,
+         lambda: index.races_at(stadium_id, start, end)),
+    ]
+    for name, scan, lookup in cases:
+        scan_ms, scan_n = timed(scan)
+        idx_ms, idx_n = timed(lookup)
+        print(f"  {name} [{start}-{end}]: scan {scan_ms:.1f} ms ({scan_n} rows) | "
+              f"index {idx_ms:.1f} ms ({idx_n} rows) | x{scan_ms / max(idx_ms, 1e-6):.1f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Secondary indexes over races/entries")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("update", help="index rows appended since the last update")
+    p = sub.add_parser("bench", help="indexed lookups vs full scans")
+    p.add_argument("--racer", default="4933")
+    p.add_argument("--boat", type=int, default=1)
+    p.add_argument("--stadium", type=int, default=3)
+    p.add_argument("--start", default="20240101")
+    p.add_argument("--end", default="20991231")
+    args = parser.parse_args()
+
+    if args.command == "update":
+        index = update_index()
+        print(f"Indexed {len(index.race_offset)} races, {len(index.race_entries)} races with entries, "
+              f"{len(index.racer)} racers.")
+    else:
+        bench(args.racer, args.boat, args.stadium, args.start, args.end)
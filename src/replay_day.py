@@ -0,0 +1,225 @@
+import os
+import sys
+import time
+import random
+import argparse
+import numpy as np
+import pandas as pd
+import requests
+from collections import Counter
+from datetime import date, datetime, timedelta
+from typing import Dict, List
+
+from pyjpboatrace.const import STADIUMS_MAP
+from pyjpboatrace.exceptions import NoDataException
+
+import instrumentation
+from compact_tables import FILE_RACES, FILE_ENTRIES, read_date_range
+from predict_phase5 import BEFORE_INFO_LEAD, load_model, run_live_day
+
+ID_TO_NAME = dict(STADIUMS_MAP)
+
+# Default budget from "before-info posted" to "prediction emitted"
+BUDGET_S = 60.0
+
+class VirtualClock:
+    """
+    Clock for replays. sleep() jumps ahead instantly, while time spent
+    computing still passes at wall-clock speed, so measured latencies
+    include the real cost of features and prediction.
+    """
+
+    def __init__(self, start: datetime):
+        self.start = start
+        self.skipped = 0.0
+        self._t0 = time.perf_counter()
+
+    def now(self) -> datetime:
+        return self.start + timedelta(seconds=time.perf_counter() - self._t0 + self.skipped)
+
+    def sleep(self, seconds: float):
+        if seconds > 0:
+            self.skipped += seconds
+
+class FakeBoatrace:
+    """
+    Stands in for BoatraceClient on a stored day (races.csv / entries.csv),
+    answering in pyjpboatrace's response shapes. Every call costs `latency`
+    seconds plus exponential jitter of virtual time and fails with
+    probability `failure_rate`; both are drawn from a seeded RNG so a
+    replay is repeatable. Before-info is only served once it is posted.
+    """
+
+    def __init__(self, races: pd.DataFrame, entries: pd.DataFrame, clock: VirtualClock,
+                 latency: float = 0.3, jitter: float = 0.2, failure_rate: float = 0.0, seed: int = 0):
+        self.races = races.set_index("race_id")
+        self.entries = {race_id: group for race_id, group in entries.groupby("race_id")}
+        self.clock = clock
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.rng = random.Random(seed)
+        self.last_backend = "replay"
+        self.backend_counts = Counter()
+        self.failures = 0
+
+    def _request(self, endpoint: str):
+        self.backend_counts[endpoint] += 1
+        delay = self.latency + (self.rng.expovariate(1 / self.jitter) if self.jitter > 0 else 0)
+        self.clock.sleep(delay)
+        instrumentation.observe_request(endpoint, delay, backend="replay")
+        if self.rng.random() < self.failure_rate:
+            self.failures += 1
+            raise requests.exceptions.ConnectionError(f"injected failure ({endpoint})")
+
+    def _race(self, d: date, stadium: int, race: int) -> pd.Series:
+        race_id = f"{d.strftime('%Y%m%d')}_{stadium:02d}_{race:02d}"
+        if race_id not in self.races.index:
+            raise NoDataException(race_id)
+        return self.races.loc[race_id]
+
+    def get_stadiums(self, d: date) -> Dict:
+        self._request("stadiums")
+        out = {"date": d.isoformat()}
+        for sid in sorted(self.races["stadium_id"].astype(int).unique()):
+            out[ID_TO_NAME[sid]] = {"status": "発売中"}
+        return out
+
+    def get_12races(self, d: date, stadium: int) -> Dict:
+        self._request("12races")
+        rows = self.races[self.races["stadium_id"].astype(int) == stadium]
+        return {f"{int(r['race_no'])}R": {"vote_limit": r["deadline"], "status": "発売中"}
+                for _, r in rows.iterrows()}
+
+    def get_race_info(self, d: date, stadium: int, race: int) -> Dict:
+        self._request("race_info")
+        row = self._race(d, stadium, race)
+        info = {"race_title": [row["title"]]}
+        for _, e in self.entries.get(row.name, pd.DataFrame()).iterrows():
+            info[f"boat{int(e['boat_no'])}"] = {
+                "racerid": e["racer_id"],
+                "name": e["name"],
+                "class": e["class"],
+                "motor_in2nd": e["motor_p"],
+                "aveST": e["st_ave"],
+                "F": e["fl"],
+            }
+        return info
+
+    def get_just_before_info(self, d: date, stadium: int, race: int) -> Dict:
+        self._request("just_before_info")
+        row = self._race(d, stadium, race)
+        posted = datetime.strptime(row["deadline"], "%Y-%m-%d %H:%M:%S") - BEFORE_INFO_LEAD
+        if self.clock.now() < posted:
+            raise NoDataException(f"{row.name}: before-info not posted until {posted:%H:%M}")
+        info = {f"boat{b}": {} for b in range(1, 7)}
+        info["weather_information"] = {}
+        return info
+
+    def get_race_result(self, d: date, stadium: int, race: int) -> Dict:
+        self._request("race_result")
+        raise NoDataException("results are not replayed")
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+def load_day(target_date: date):
+    """races / entries rows of one stored day (seeks via the compaction index when present)."""
+    for path in (FILE_RACES, FILE_ENTRIES):
+        if not os.path.exists(path):
+            print(f"Error: File not found {path}")
+            sys.exit(1)
+    d = target_date.strftime("%Y%m%d")
+    races = read_date_range(FILE_RACES, d, d)
+    entries = read_date_range(FILE_ENTRIES, d, d)
+    # The raw tables are append-only; the last write of a race wins, as in compaction
+    races = races[races["deadline"] != ""].drop_duplicates("race_id", keep="last")
+    entries = entries.drop_duplicates(["race_id", "boat_no"], keep="last")
+    return races, entries
+
+def missed_day(races: pd.DataFrame, limit_races: int) -> List[Dict]:
+    """Timing records (nothing emitted) for every stored race of the day."""
+    timings = []
+    for _, r in races.sort_values("deadline").iterrows():
+        if int(r["race_no"]) > limit_races:
+            continue
+        deadline = datetime.strptime(r["deadline"], "%Y-%m-%d %H:%M:%S")
+        timings.append({"race_id": r["race_id"], "available": deadline - BEFORE_INFO_LEAD,
+                        "deadline": deadline, "emitted": None, "latency_s": None})
+    return timings
+
+def replay_day(target_date: date, budget_s: float = BUDGET_S, latency: float = 0.3, jitter: float = 0.2,
+               failure_rate: float = 0.0, seed: int = 0, limit_races: int = 12, per_stadium: bool = False,
+               bundle: bool = False):
+    with instrumentation.span("replay", date=target_date, failure_rate=failure_rate) as sp:
+        misses = _replay(sp, target_date, budget_s, latency, jitter, failure_rate, seed, limit_races,
+                         per_stadium, bundle)
+    if misses:
+        sys.exit(1)
+
+def _replay(sp, target_date: date, budget_s: float, latency: float, jitter: float,
+            failure_rate: float, seed: int, limit_races: int, per_stadium: bool, bundle: bool) -> List[Dict]:
+    print(f"Replaying {target_date} (latency {latency}s + jitter {jitter}s, failure rate {failure_rate:.0%})...")
+    races, entries = load_day(target_date)
+    if races.empty:
+        print(f"Error: No stored races for {target_date}.")
+        sys.exit(1)
+    model = load_model(per_stadium=per_stadium, bundle=bundle)
+
+    # Start early enough that the first before-info is still ahead of us
+    first_deadline = pd.to_datetime(races["deadline"]).min().to_pydatetime()
+    clock = VirtualClock(first_deadline - BEFORE_INFO_LEAD - timedelta(hours=1))
+    boatrace = FakeBoatrace(races, entries, clock, latency, jitter, failure_rate, seed)
+
+    started = time.perf_counter()
+    try:
+        timings = run_live_day(boatrace, model, target_date, clock, limit_races,
+                               on_prediction=lambda df, before: sp.add_rows(len(df)))
+    except Exception as e:
+        # No schedule (stadium list unreachable after retries): every race of the day is missed
+        print(f"  Failed to get the race schedule ({e}).")
+        timings = missed_day(races, limit_races)
+    wall = time.perf_counter() - started
+
+    misses = [t for t in timings
+              if t["emitted"] is None or t["latency_s"] > budget_s or t["emitted"] > t["deadline"]]
+    latencies = np.array([t["latency_s"] for t in timings if t["latency_s"] is not None])
+
+    print("\n  [Replay]")
+    print(f"    Races: {len(timings)}, predicted: {len(latencies)}, missed budget ({budget_s:.0f}s): {len(misses)}")
+    if len(latencies):
+        p50, p95 = np.percentile(latencies, [50, 95])
+        print(f"    Latency available -> emitted: p50 {p50:.1f}s  p95 {p95:.1f}s  max {latencies.max():.1f}s")
+    print(f"    Site calls: {dict(boatrace.backend_counts)}, injected failures: {boatrace.failures}")
+    print(f"    Virtual day {clock.skipped / 3600:.1f}h replayed in {wall:.2f}s")
+    sp.set(misses=len(misses), wall_s=round(wall, 3))
+
+    for t in misses:
+        if t["emitted"] is None:
+            print(f"    MISS {t['race_id']}: no prediction")
+        else:
+            print(f"    MISS {t['race_id']}: {t['latency_s']:.1f}s after before-info, "
+                  f"emitted {t['emitted']:%H:%M:%S} (deadline {t['deadline']:%H:%M})")
+    print("Replay Passed." if not misses else "Replay FAILED.")
+    return misses
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay a stored race day through the live prediction path")
+    parser.add_argument("date", type=date.fromisoformat, help="YYYY-MM-DD")
+    parser.add_argument("--budget", type=float, default=BUDGET_S, help="seconds from before-info to prediction")
+    parser.add_argument("--latency", type=float, default=0.3, help="base site latency per call (s)")
+    parser.add_argument("--jitter", type=float, default=0.2, help="mean extra latency per call (s)")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="probability a call fails")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--limit-races", type=int, default=12)
+    parser.add_argument("--per-stadium", action="store_true")
+    parser.add_argument("--bundle", action="store_true", help="serve the multi-target bundle")
+    args = parser.parse_args()
+    replay_day(args.date, args.budget, args.latency, args.jitter, args.failure_rate,
+               args.seed, args.limit_races, args.per_stadium, args.bundle)
@@ -0,0 +1,119 @@
+import os
+import sys
+import pickle
+import hashlib
+import argparse
+import pandas as pd
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import instrumentation
+from train_model_phase4 import FEATURES, FILE_MODEL
+
+# --- Paths ---
+DATA_DIR = "data"
+FILE_INPUT = os.path.join(DATA_DIR, "training_featured.csv")
+FILE_OUTPUT = os.path.join(DATA_DIR, "scores.csv")
+
+KEY_COLS = ["race_id", "boat_no"]
+COLS_SCORES = KEY_COLS + ["prob_2rentai", "model_version"]
+
+DEFAULT_CHUNKSIZE = 200_000
+
+def model_version(filepath=FILE_MODEL) -> str:
+    """Short content hash of a model artifact; identifies which model produced a score."""
+    h = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()[:12]
+
+# --- Worker side (one model per process, loaded once) ---
+_model = None
+_num_threads = 1
+
+def _init_worker(model_path, num_threads):
+    global _model, _num_threads
+    with open(model_path, 'rb') as f:
+        _model = pickle.load(f)
+    _num_threads = num_threads
+
+def _score_chunk(chunk):
+    X = chunk[FEATURES].fillna(0)
+    out = chunk[KEY_COLS].copy()
+    out['prob_2rentai'] = _model.predict(X, num_threads=_num_threads)
+    return out
+
+def _iter_chunks(filepath, chunksize):
+    usecols = list(dict.fromkeys(KEY_COLS + FEATURES))
+    # A header-only file still yields one empty chunk, which LightGBM rejects
+    return (chunk for chunk in pd.read_csv(filepath, usecols=usecols, chunksize=chunksize) if len(chunk))
+
+def score_batch(input_path=FILE_INPUT, output_path=FILE_OUTPUT, model_path=FILE_MODEL,
+                workers=None, chunksize=DEFAULT_CHUNKSIZE):
+    """
+    Score every row of the feature table in bounded memory.
+    Chunks are streamed from disk, scored across a process pool and
+    written back in input order; at most 2 chunks per worker are in flight.
+    """
+    with instrumentation.span("score", workers=workers, chunksize=chunksize) as sp:
+        _score(sp, input_path, output_path, model_path, workers, chunksize)
+
+def _score(sp, input_path, output_path, model_path, workers, chunksize):
+    print("Starting Batch Scoring...")
+    for path in (input_path, model_path):
+        if not os.path.exists(path):
+            print(f"Error: {path} not found.")
+            sys.exit(1)
+
+    workers = workers or os.cpu_count() or 1
+    version = model_version(model_path)
+    print(f"  Model version: {version}")
+    print(f"  Workers: {workers}, chunk size: {chunksize}")
+    sp.add_bytes_read(instrumentation.file_size(input_path))
+
+    tmp_path = output_path + ".tmp"
+    total = 0
+    first = True
+
+    def write(scored):
+        nonlocal total, first
+        scored['model_version'] = version
+        scored.to_csv(tmp_path, mode='w' if first else 'a', index=False, header=first,
+                      columns=COLS_SCORES, encoding='utf-8-sig' if first else 'utf-8')
+        first = False
+        total += len(scored)
+        print(f"    Scored {total} rows", flush=True)
+
+    if workers == 1:
+        # In-process: let LightGBM use every core instead
+        _init_worker(model_path, os.cpu_count() or 1)
+        for chunk in _iter_chunks(input_path, chunksize):
+            write(_score_chunk(chunk))
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(model_path, 1)) as pool:
+            pending = deque()
+            for chunk in _iter_chunks(input_path, chunksize):
+                pending.append(pool.submit(_score_chunk, chunk))
+                if len(pending) >= workers * 2:
+                    write(pending.popleft().result())
+            while pending:
+                write(pending.popleft().result())
+
+    if first:
+        pd.DataFrame(columns=COLS_SCORES).to_csv(tmp_path, index=False, encoding='utf-8-sig')
+    os.replace(tmp_path, output_path)
+
+    sp.add_rows(total)
+    sp.add_bytes_written(instrumentation.file_size(output_path))
+    print(f"  Saved {total} scores to {output_path}")
+    print("Batch Scoring Completed Successfully.")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Score every row of the feature table")
+    parser.add_argument("--workers", type=int, default=None, help="processes (default: all cores)")
+    parser.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE)
+    parser.add_argument("--output", default=FILE_OUTPUT)
+    args = parser.parse_args()
+    score_batch(output_path=args.output, workers=args.workers, chunksize=args.chunksize)
@@ -0,0 +1,249 @@
+import os
+import io
+import sys
+import json
+import hashlib
+import argparse
+from datetime import datetime
+from typing import Dict, List, Optional
+
+# Kept free of heavy imports, like fingerprint.py: training calls it on every run.
+
+# --- Paths ---
+DATA_DIR = "data"
+SNAPSHOT_DIR = os.path.join(DATA_DIR, "snapshots")
+OBJECTS_DIR = os.path.join(SNAPSHOT_DIR, "objects")
+MANIFESTS_DIR = os.path.join(SNAPSHOT_DIR, "manifests")
+FILE_CACHE = os.path.join(SNAPSHOT_DIR, "cache.json")
+
+DEFAULT_TABLES = [
+    os.path.join(DATA_DIR, "races.csv"),
+    os.path.join(DATA_DIR, "entries.csv"),
+    os.path.join(DATA_DIR, "results.csv"),
+    os.path.join(DATA_DIR, "result_order.csv"),
+    os.path.join(DATA_DIR, "result_starts.csv"),
+    os.path.join(DATA_DIR, "payoffs.csv"),
+    os.path.join(DATA_DIR, "race_conditions.csv"),
+    os.path.join(DATA_DIR, "returns.csv"),
+    os.path.join(DATA_DIR, "training_base.csv"),
+    os.path.join(DATA_DIR, "training_featured.csv"),
+]
+
+# Chunks close at a date boundary once they hold at least MIN_CHUNK bytes;
+# tables without a leading race_id column are cut every MIN_CHUNK bytes.
+MIN_CHUNK = 1 << 20
+READ_SIZE = 16 << 20
+
+def object_path(digest: str) -> str:
+    return os.path.join(OBJECTS_DIR, digest[:2], digest)
+
+def put_object(data: bytes) -> str:
+    """Store bytes under their sha256 unless already present. Objects are read-only."""
+    digest = hashlib.sha256(data).hexdigest()
+    path = object_path(digest)
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.chmod(tmp_path, 0o444)
+        os.replace(tmp_path, path)
+    return digest
+
+def _iter_lines(f):
+    """Complete lines of a binary file, read in large blocks."""
+    rest = b""
+    for block in iter(lambda: f.read(READ_SIZE), b""):
+        lines = (rest + block).split(b"\n")
+        rest = lines.pop()
+        for line in lines:
+            yield line + b"\n"
+    if rest:
+        yield rest
+
+def chunk_file(path: str) -> Dict:
+    """
+    Split a table into content-addressed chunks and store the new ones.
+
+    A chunk is only cut where the race date (YYYYMMDD prefix of race_id)
+    changes, and only once it holds MIN_CHUNK bytes. Cut points depend only
+    on the bytes before them, so appending data leaves every chunk but the
+    last one unchanged. Concatenating header + chunks gives back the file
+    byte for byte.
+    """
+    whole = hashlib.sha256()
+    chunks = []
+    buf, dates, size = io.BytesIO(), [], 0
+
+    def flush():
+        if buf.tell():
+            chunks.append({"hash": put_object(buf.getvalue()), "size": buf.tell(),
+                           "dates": [min(dates), max(dates)] if dates else None})
+            buf.seek(0)
+            buf.truncate()
+            dates.clear()
+
+    with open(path, "rb") as f:
+        header = f.readline()
+        whole.update(header)
+        by_date = header.lstrip(b"\xef\xbb\xbf").startswith(b"race_id,")
+        last = None
+        for line in _iter_lines(f):
+            whole.update(line)
+            size += len(line)
+            d = line[:8].decode("ascii", "replace") if by_date else None
+            if buf.tell() >= MIN_CHUNK and (not by_date or d != last):
+                flush()
+            if by_date and d != last:
+                dates.append(d)
+                last = d
+            buf.write(line)
+        flush()
+
+    return {
+        "size": len(header) + size,
+        "sha256": whole.hexdigest(),
+        "header": put_object(header),
+        "chunks": chunks,
+    }
+
+def _load_json(path: str) -> Dict:
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _save_json(obj: Dict, path: str):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(obj, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+def _stat_key(path: str) -> str:
+    st = os.stat(path)
+    return f"{st.st_ino}:{st.st_size}:{st.st_mtime_ns}"
+
+def manifest_key(path: str) -> str:
+    """Path relative to the working directory (the repo root), as stored in manifests."""
+    key = os.path.relpath(os.path.abspath(path))
+    if key == ".." or key.startswith(".." + os.sep):
+        raise ValueError(f"{path} is outside {os.getcwd()}")
+    return key
+
+def take_snapshot(paths: Optional[List[str]] = None, note: str = "") -> str:
+    """
+    Snapshot tables and return the snapshot id (hash of the file entries).
+    Unchanged files (same inode, size, mtime) are not even read again;
+    changed files are re-chunked but only chunks not yet stored are written.
+    """
+    cache = _load_json(FILE_CACHE)
+    files = {}
+    for path in paths or DEFAULT_TABLES:
+        if not os.path.exists(path):
+            continue
+        path = manifest_key(path)
+        stat_key = _stat_key(path)
+        entry = cache.get(os.path.abspath(path))
+        if not entry or entry["stat"] != stat_key:
+            entry = {"stat": stat_key, "file": chunk_file(path)}
+            cache[os.path.abspath(path)] = entry
+        files[path] = entry["file"]
+
+    blob = json.dumps(files, sort_keys=True).encode("utf-8")
+    snapshot_id = hashlib.sha256(blob).hexdigest()[:12]
+    manifest_path = os.path.join(MANIFESTS_DIR, f"{snapshot_id}.json")
+    if not os.path.exists(manifest_path):
+        _save_json({"id": snapshot_id, "created": datetime.now().isoformat(timespec="seconds"),
+                    "note": note, "files": files}, manifest_path)
+    _save_json(cache, FILE_CACHE)
+    return snapshot_id
+
+def load_manifest(snapshot_id: str) -> Dict:
+    manifest = _load_json(os.path.join(MANIFESTS_DIR, f"{snapshot_id}.json"))
+    if not manifest:
+        raise KeyError(f"Unknown snapshot {snapshot_id}")
+    return manifest
+
+def list_snapshots() -> List[Dict]:
+    if not os.path.isdir(MANIFESTS_DIR):
+        return []
+    manifests = [_load_json(os.path.join(MANIFESTS_DIR, name))
+                 for name in os.listdir(MANIFESTS_DIR) if name.endswith(".json")]
+    return sorted(manifests, key=lambda m: m["created"])
+
+def checkout(snapshot_id: str, dest: str) -> Dict[str, str]:
+    """
+    Materialize a snapshot under `dest`, keeping relative paths (dest/data/...),
+    so phases can be rerun from inside `dest`. Files already at the
+    snapshot's content are left alone. Returns path -> "written" | "unchanged".
+    Raises ValueError, before writing anything, if a path would land outside `dest`.
+    """
+    manifest = load_manifest(snapshot_id)
+    root = os.path.realpath(dest)
+    for path in manifest["files"]:
+        target = os.path.realpath(os.path.join(dest, path))
+        if os.path.isabs(path) or os.path.commonpath([root, target]) != root:
+            raise ValueError(f"Snapshot {snapshot_id}: {path} resolves outside {dest}")
+
+    cache = _load_json(FILE_CACHE)
+    status = {}
+    for path, entry in manifest["files"].items():
+        out_path = os.path.join(dest, path)
+        cached = cache.get(os.path.abspath(out_path))
+        if (cached and os.path.exists(out_path) and cached["stat"] == _stat_key(out_path)
+                and cached["file"]["sha256"] == entry["sha256"]):
+            status[path] = "unchanged"
+            continue
+
+        os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+        tmp_path = out_path + ".checkout.tmp"
+        with open(tmp_path, "wb") as out:
+            for digest in [entry["header"]] + [c["hash"] for c in entry["chunks"]]:
+                with open(object_path(digest), "rb") as f:
+                    out.write(f.read())
+        os.replace(tmp_path, out_path)
+        # A later snapshot of the checked-out file need not read it again
+        cache[os.path.abspath(out_path)] = {"stat": _stat_key(out_path), "file": entry}
+        status[path] = "written"
+    _save_json(cache, FILE_CACHE)
+    return status
+
+def write_model_meta(model_path: str, snapshot_id: str, **extra):
+    """Sidecar <model>.meta.json naming the snapshot a model was trained on."""
+    meta = {"model": os.path.basename(model_path), "snapshot": snapshot_id,
+            "trained": datetime.now().isoformat(timespec="seconds")}
+    meta.update(extra)
+    _save_json(meta, model_path + ".meta.json")
+
+def read_model_meta(model_path: str) -> Dict:
+    return _load_json(model_path + ".meta.json")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Content-addressed snapshots of the data tables")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("take", help="snapshot the tables (default: raw + training tables)")
+    p.add_argument("paths", nargs="*")
+    p.add_argument("--note", default="")
+    sub.add_parser("list", help="list snapshots")
+    p = sub.add_parser("checkout", help="materialize a snapshot under DEST")
+    p.add_argument("snapshot_id")
+    p.add_argument("--to", default="checkout", help="destination directory (default: ./checkout)")
+    args = parser.parse_args()
+
+    try:
+        if args.command == "take":
+            print(take_snapshot(args.paths or None, note=args.note))
+        elif args.command == "list":
+            for m in list_snapshots():
+                size = sum(f["size"] for f in m["files"].values())
+                print(f"{m['id']}  {m['created']}  {len(m['files'])} files  {size / 1e6:.1f} MB  {m['note']}")
+        else:
+            for path, state in checkout(args.snapshot_id, args.to).items():
+                print(f"  {path}: {state}")
+    except (KeyError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
@@ -1,5 +1,5 @@
 
-import pandas as pd
+import numpy as np
 import lightgbm as lgb
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score, roc_auc_score
@@ -7,64 +7,97 @@ import os
 import sys
 import pickle
 
+import instrumentation
+import snapshot
+import feature_matrix
+from feature_engineering_phase3 import FEATURES, TARGET, LABELS
+
 # --- Paths ---
 DATA_DIR = "data"
 FILE_INPUT = os.path.join(DATA_DIR, "training_featured.csv")
 FILE_MODEL = os.path.join(DATA_DIR, "model.pkl")
 
-# --- Model Features ---
-FEATURES = [
-    'boat_no',
-    'class_val',    # Encoded A1..B2
-    'motor_p',      # Motor 2-ren
-    'st_ave',       # Start Timing Avg
-    'st_diff',      # Diff from race mean
-    'motor_rank',   # Rank in race
-    'fl',           # Flying count
-]
-TARGET = 'flag_2rentai' # 1 if <= 2nd place, else 0
-
-def load_data(filepath):
-    if not os.path.exists(filepath):
-        print(f"Error: {filepath} not found.")
+# Rows handed to LightGBM (and to predict) per batch
+BATCH_ROWS = 200_000
+
+class MatrixSequence(lgb.Sequence):
+    """
+    Rows of the memory-mapped feature matrix, served to LightGBM in batches.
+    LightGBM samples rows for binning and then pulls batches, so only one
+    batch is resident at a time (as float64, which the Sequence API requires).
+    """
+
+    def __init__(self, X, batch_size: int = BATCH_ROWS):
+        self.X = X
+        self.batch_size = batch_size
+
+    def __getitem__(self, idx):
+        return np.asarray(self.X[idx], dtype=np.float64)
+
+    def __len__(self):
+        return len(self.X)
+
+def ensure_matrix():
+    """(Re)build the on-disk feature matrix if Phase 3 output changed (streamed from the CSV)."""
+    if feature_matrix.is_current(FILE_INPUT, FEATURES, list(LABELS)):
+        return
+    if not os.path.exists(FILE_INPUT):
+        print(f"Error: {FILE_INPUT} not found.")
         sys.exit(1)
-    return pd.read_csv(filepath)
+    print(f"  Building feature matrix from {FILE_INPUT}...")
+    feature_matrix.build_matrix_from_csv(FILE_INPUT, FEATURES, LABELS)
+
+def predict_rows(model, X, rows):
+    """Predict selected matrix rows batch by batch."""
+    out = np.empty(len(rows))
+    for start in range(0, len(rows), BATCH_ROWS):
+        batch = rows[start:start + BATCH_ROWS]
+        out[start:start + len(batch)] = model.predict(X[batch], num_iteration=model.best_iteration)
+    return out
 
 def train_phase4():
+    with instrumentation.span("train") as sp:
+        _train(sp)
+
+def _train(sp):
     print("Starting Phase 4: Training & Evaluation...")
     
-    # 1. Load Data
+    # 1. Load Data (memory-mapped: nothing is read into RAM up front)
     print("  Loading Dataset...")
-    df = load_data(FILE_INPUT)
-    print(f"    Total Rows: {len(df)}")
-    
-    # Check if target exists
-    if TARGET not in df.columns:
-        print(f"Error: Target column '{TARGET}' not found.")
-        return
+    ensure_matrix()
+    X, columns, meta = feature_matrix.load_matrix()
+    y = np.asarray(columns[f"y_{TARGET}"])
+    print(f"    Total Rows: {meta['rows']}")
+    sp.add_rows(meta["rows"])
+    sp.add_bytes_read(instrumentation.file_size(feature_matrix.matrix_path("X")))
 
-    # Check for NaN in features
-    # Fill NaN with 0 or drop? LightGBM handles NaN, but simple fill is safer for now.
-    X = df[FEATURES].fillna(0)
-    y = df[TARGET]
+    # Record exactly which data this model is trained on (only new chunks are stored)
+    snapshot_id = snapshot.take_snapshot([FILE_INPUT], note="train")
+    print(f"    Snapshot: {snapshot_id}")
+    sp.set(snapshot=snapshot_id)
 
     # 2. Split Data (Train / Test)
     # Ideally split by DATE or RACE_ID to avoid leakage (e.g. same race in both train/test)
     # But for simplicity with small data, random split.
     # TODO: Implement TimeSeriesSplit in PROJECT5 v2
+    # Only row indices are split; the matrix itself is never copied.
     
     print("  Splitting Data (80% Train, 20% Test)...")
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42, stratify=y)
+    train_rows, test_rows = train_test_split(np.arange(len(y)), test_size=0.2, random_state=42, stratify=y)
+    train_rows.sort()
+    test_rows.sort()
     
-    print(f"    Train size: {len(X_train)}")
-    print(f"    Test size: {len(X_test)}")
+    print(f"    Train size: {len(train_rows)}")
+    print(f"    Test size: {len(test_rows)}")
 
     # 3. Train Model (LightGBM)
     print("  Training LightGBM Model...")
     
-    # Create Dataset for LightGBM
-    lgb_train = lgb.Dataset(X_train, y_train)
-    lgb_eval = lgb.Dataset(X_test, y_test, reference=lgb_train)
+    # Bin once over the whole matrix (streamed in batches), then train/test are row subsets
+    full = lgb.Dataset(MatrixSequence(X), label=y, feature_name=FEATURES,
+                       params={'verbosity': -1}, free_raw_data=True).construct()
+    lgb_train = full.subset(train_rows)
+    lgb_eval = full.subset(test_rows)
     
     params = {
         'objective': 'binary',
@@ -75,17 +108,19 @@ def train_phase4():
     }
     
     # Train
-    model = lgb.train(
-        params,
-        lgb_train,
-        valid_sets=[lgb_train, lgb_eval],
-        callbacks=[lgb.log_evaluation(10)] # Log every 10 iter
-    )
+    with instrumentation.span("train.fit"):
+        model = lgb.train(
+            params,
+            lgb_train,
+            valid_sets=[lgb_train, lgb_eval],
+            callbacks=[lgb.log_evaluation(10)] # Log every 10 iter
+        )
     
     # 4. Evaluation
     print("  Evaluating Model...")
-    y_pred_prob = model.predict(X_test, num_iteration=model.best_iteration)
-    y_pred = [1 if p >= 0.5 else 0 for p in y_pred_prob]
+    y_test = y[test_rows]
+    y_pred_prob = predict_rows(model, X, test_rows)
+    y_pred = (y_pred_prob >= 0.5).astype(int)
     
     acc = accuracy_score(y_test, y_pred)
     auc = roc_auc_score(y_test, y_pred_prob)
@@ -109,6 +144,12 @@ def train_phase4():
     print(f"\n  Saving Model to {FILE_MODEL}...")
     with open(FILE_MODEL, 'wb') as f:
         pickle.dump(model, f)
+    snapshot.write_model_meta(FILE_MODEL, snapshot_id, features=FEATURES, target=TARGET, auc=round(auc, 4))
+    sp.add_bytes_written(instrumentation.file_size(FILE_MODEL))
+
+    peak = instrumentation.peak_rss_bytes()
+    print(f"  Peak memory (RSS): {peak / 2**20:.0f} MB for a {instrumentation.file_size(feature_matrix.matrix_path('X')) / 2**20:.0f} MB matrix")
+    sp.set(peak_rss_bytes=peak)
         
     print("Phase 4 Completed Successfully.")
 
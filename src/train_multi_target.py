@@ -0,0 +1,162 @@
+import os
+import sys
+import hashlib
+import pickle
+import argparse
+import numpy as np
+import lightgbm as lgb
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from sklearn.metrics import roc_auc_score
+from sklearn.model_selection import train_test_split
+
+import instrumentation
+import feature_matrix
+import snapshot
+from train_model_phase4 import FEATURES, FILE_INPUT, MatrixSequence, ensure_matrix, predict_rows
+
+# --- Paths ---
+DATA_DIR = "data"
+FILE_BUNDLE = os.path.join(DATA_DIR, "model_bundle.pkl")
+
+BUNDLE_FORMAT = 1
+
+# name -> label in the feature matrix, and which rows the model is trained on:
+#   "boat": every entry row; "race": one row per race (boat 1), for race-level labels
+TARGETS = {
+    "win": {"label": "flag_win", "rows": "boat"},
+    "2rentai": {"label": "flag_2rentai", "rows": "boat"},
+    "3rentai": {"label": "flag_3rentai", "rows": "boat"},
+    "rough": {"label": "flag_rough", "rows": "race"},
+}
+
+PARAMS = {
+    'objective': 'binary',
+    'metric': 'auc',
+    'verbosity': -1,
+    'boosting_type': 'gbdt',
+    'seed': 42,
+}
+
+def target_rows(X, kind: str) -> np.ndarray:
+    if kind == "race":
+        return np.flatnonzero(np.asarray(X[:, FEATURES.index('boat_no')]) == 1)
+    return np.arange(len(X))
+
+def split_rows(y: np.ndarray, rows: np.ndarray):
+    """
+    Stratified 80/20 split of `rows` as (train_rows, test_rows), sorted.
+    Returns the reason instead when the target cannot be trained and scored:
+    the split needs two rows of each class, and AUC both classes in the test rows.
+    """
+    classes, counts = np.unique(y[rows], return_counts=True)
+    if len(classes) < 2 or counts.min() < 2:
+        return f"needs 2+ rows of each class, got {dict(zip(classes.astype(int).tolist(), counts.tolist()))}"
+    try:
+        train_rows, test_rows = train_test_split(rows, test_size=0.2, random_state=42, stratify=y[rows])
+    except ValueError as e:
+        return str(e)
+    if len(np.unique(y[test_rows])) < 2:
+        return "the test rows hold a single class"
+    return np.sort(train_rows), np.sort(test_rows)
+
+def _fit(name, train_set, params):
+    with instrumentation.span("train_multi.fit", target=name):
+        return lgb.train(params, train_set)
+
+def train_multi_target(targets=None, workers=None):
+    with instrumentation.span("train_multi", targets=",".join(targets or TARGETS)) as sp:
+        _train(sp, targets or list(TARGETS), workers)
+
+def _train(sp, names, workers):
+    print("Starting Multi-Target Training...")
+    ensure_matrix()
+    X, columns, meta = feature_matrix.load_matrix()
+    missing = [n for n in names if f"y_{TARGETS[n]['label']}" not in columns]
+    if missing:
+        print(f"Error: Labels for {missing} not in the feature matrix. Rerun Phase 3.")
+        sys.exit(1)
+    print(f"  Rows: {meta['rows']}, targets: {names}")
+    sp.add_rows(meta["rows"])
+
+    snapshot_id = snapshot.take_snapshot([FILE_INPUT], note="train-multi")
+    print(f"  Snapshot: {snapshot_id}")
+    sp.set(snapshot=snapshot_id)
+
+    # Bin once; every target is a row subset of this Dataset with its own label
+    print("  Binning features once...")
+    full = lgb.Dataset(MatrixSequence(X), feature_name=FEATURES,
+                       params={'verbosity': -1}, free_raw_data=True).construct()
+
+    splits, train_sets = {}, {}
+    for name in names:
+        y = np.asarray(columns[f"y_{TARGETS[name]['label']}"])
+        rows = target_rows(X, TARGETS[name]["rows"])
+        split = split_rows(y, rows)
+        if isinstance(split, str):
+            print(f"    {name:>8}: skipped, {split}")
+            continue
+        train_rows, test_rows = split
+        train_sets[name] = full.subset(train_rows).construct()
+        train_sets[name].set_label(y[train_rows])
+        splits[name] = (y, rows, test_rows)
+        print(f"    {name:>8}: {len(train_rows)} train / {len(test_rows)} test rows, "
+              f"positive rate {y[rows].mean():.3f}")
+    names = [name for name in names if name in splits]
+    if not names:
+        print("Error: No target has enough rows of both classes to train and evaluate.")
+        sys.exit(1)
+
+    # Boosters release the GIL, so threads share the bins without copying them
+    cores = os.cpu_count() or 1
+    workers = min(workers or len(names), len(names))
+    num_threads = max(1, cores // workers)
+    print(f"  Training {len(names)} models on {workers} threads x {num_threads} LightGBM threads...")
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {name: pool.submit(_fit, name, train_sets[name], dict(PARAMS, num_threads=num_threads))
+                   for name in names}
+        models = {name: fut.result() for name, fut in futures.items()}
+
+    print("\n  [Result]")
+    targets = {}
+    for name in names:
+        y, rows, test_rows = splits[name]
+        auc = roc_auc_score(y[test_rows], predict_rows(models[name], X, test_rows))
+        print(f"    {name:>8}: AUC={auc:.4f}")
+        targets[name] = {
+            "model": models[name],
+            "label": TARGETS[name]["label"],
+            "rows": TARGETS[name]["rows"],
+            "auc": round(float(auc), 4),
+        }
+
+    # The version names the data and model contents, so a changed bundle never reuses an id
+    digest = hashlib.sha256(snapshot_id.encode("utf-8"))
+    for name in names:
+        digest.update(models[name].model_to_string().encode("utf-8"))
+    bundle = {
+        "format": BUNDLE_FORMAT,
+        "version": digest.hexdigest()[:12],
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "snapshot": snapshot_id,
+        "features": FEATURES,
+        "targets": targets,
+    }
+    print(f"\n  Saving bundle {bundle['version']} ({', '.join(names)}) to {FILE_BUNDLE}...")
+    with open(FILE_BUNDLE, 'wb') as f:
+        pickle.dump(bundle, f)
+    snapshot.write_model_meta(FILE_BUNDLE, snapshot_id, version=bundle["version"],
+                              auc={name: t["auc"] for name, t in targets.items()})
+    sp.add_bytes_written(instrumentation.file_size(FILE_BUNDLE))
+
+    peak = instrumentation.peak_rss_bytes()
+    print(f"  Peak memory (RSS): {peak / 2**20:.0f} MB")
+    sp.set(peak_rss_bytes=peak, version=bundle["version"])
+    print("Multi-Target Training Completed Successfully.")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train win / 2rentai / 3rentai / rough models on one binned dataset")
+    parser.add_argument("--targets", nargs="+", choices=list(TARGETS), default=None)
+    parser.add_argument("--workers", type=int, default=None, help="models trained at once (default: all)")
+    args = parser.parse_args()
+    train_multi_target(args.targets, args.workers)
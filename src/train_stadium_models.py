@@ -0,0 +1,132 @@
+import os
+import sys
+import pickle
+import argparse
+import numpy as np
+import lightgbm as lgb
+from concurrent.futures import ProcessPoolExecutor
+from sklearn.metrics import roc_auc_score
+from sklearn.model_selection import train_test_split
+
+import instrumentation
+import feature_matrix
+import snapshot
+from train_model_phase4 import FEATURES, TARGET, FILE_INPUT, ensure_matrix
+
+# --- Paths ---
+DATA_DIR = "data"
+FILE_STADIUM_MODELS = os.path.join(DATA_DIR, "stadium_models.pkl")
+
+# Venues with fewer training rows than this are served by the global model
+MIN_ROWS = 3000
+# Floor for --min-rows: an 80/20 split of fewer rows leaves no useful test set
+MIN_SPLIT_ROWS = 10
+GLOBAL = "global"
+
+PARAMS = {
+    'objective': 'binary',
+    'metric': 'auc',
+    'verbosity': -1,
+    'boosting_type': 'gbdt',
+    'seed': 42,
+}
+
+# --- Worker side: every process maps the same files, nothing is copied up front ---
+_X = None
+_y = None
+_stadium = None
+
+def _init_worker():
+    global _X, _y, _stadium
+    _X, columns, _ = feature_matrix.load_matrix()
+    _y = columns[f"y_{TARGET}"]
+    _stadium = columns["stadium_id"]
+
+def _fit(key, num_threads):
+    """Train one model on its rows of the shared matrix. Returns (key, model string, rows, auc)."""
+    if key == GLOBAL:
+        rows = np.arange(len(_y))
+    else:
+        rows = np.flatnonzero(_stadium == key)
+    train_rows, test_rows = train_test_split(rows, test_size=0.2, random_state=42)
+    train_rows.sort()
+    test_rows.sort()
+
+    # Only this model's rows are gathered; the full matrix stays shared in the page cache
+    lgb_train = lgb.Dataset(_X[train_rows], _y[train_rows], feature_name=FEATURES)
+    params = dict(PARAMS, num_threads=num_threads)
+    model = lgb.train(params, lgb_train)
+
+    y_test = _y[test_rows]
+    auc = float("nan")
+    if len(np.unique(y_test)) > 1:
+        auc = roc_auc_score(y_test, model.predict(_X[test_rows], num_threads=num_threads))
+    return key, model.model_to_string(), len(rows), auc
+
+def train_stadium_models(min_rows=MIN_ROWS, workers=None):
+    with instrumentation.span("train_stadiums", min_rows=min_rows) as sp:
+        _train(sp, min_rows, workers)
+
+def _train(sp, min_rows, workers):
+    print("Starting Per-Stadium Training...")
+    if min_rows < MIN_SPLIT_ROWS:
+        print(f"  --min-rows {min_rows} is too small to split; using {MIN_SPLIT_ROWS}.")
+        min_rows = MIN_SPLIT_ROWS
+    snapshot_id = snapshot.take_snapshot([FILE_INPUT], note="train-stadiums")
+    print(f"  Snapshot: {snapshot_id}")
+    ensure_matrix()
+    X, columns, meta = feature_matrix.load_matrix()
+    sp.add_rows(meta["rows"])
+    if meta["rows"] < MIN_SPLIT_ROWS:
+        print(f"Error: {meta['rows']} rows are too few to train and evaluate a model.")
+        sys.exit(1)
+
+    ids, counts = np.unique(columns["stadium_id"], return_counts=True)
+    # Rows without a valid venue only train the global model
+    unknown = int(counts[ids == feature_matrix.UNKNOWN_STADIUM].sum())
+    counts = counts[ids != feature_matrix.UNKNOWN_STADIUM]
+    ids = ids[ids != feature_matrix.UNKNOWN_STADIUM]
+    own = [int(sid) for sid, n in zip(ids, counts) if n >= min_rows]
+    fallback = [int(sid) for sid, n in zip(ids, counts) if n < min_rows]
+    print(f"  Rows: {meta['rows']}, stadiums: {len(ids)}, rows without a valid stadium: {unknown}")
+    print(f"  Own model: {own}")
+    print(f"  Global fallback: {fallback}")
+
+    # Largest job first so it is not the straggler
+    keys = [GLOBAL] + sorted(own, key=lambda sid: -counts[ids == sid][0])
+    cores = os.cpu_count() or 1
+    workers = min(workers or cores, len(keys))
+    num_threads = max(1, cores // workers)
+    print(f"  Training {len(keys)} models on {workers} processes x {num_threads} threads...")
+
+    models, report = {}, []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        futures = [pool.submit(_fit, key, num_threads) for key in keys]
+        for fut in futures:
+            key, model_str, n, auc = fut.result()
+            models[key] = lgb.Booster(model_str=model_str)
+            report.append((key, n, auc))
+
+    print("\n  [Result]")
+    for key, n, auc in report:
+        print(f"    {str(key):>6}: rows={n:>8}  AUC={auc:.4f}")
+
+    bundle = {
+        GLOBAL: models.pop(GLOBAL),
+        "stadiums": models,
+        "features": FEATURES,
+        "min_rows": min_rows,
+        "snapshot": snapshot_id,
+    }
+    print(f"\n  Saving {len(models)} stadium models + global to {FILE_STADIUM_MODELS}...")
+    with open(FILE_STADIUM_MODELS, 'wb') as f:
+        pickle.dump(bundle, f)
+    sp.add_bytes_written(instrumentation.file_size(FILE_STADIUM_MODELS))
+    print("Per-Stadium Training Completed Successfully.")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train one LightGBM model per stadium plus a global fallback")
+    parser.add_argument("--min-rows", type=int, default=MIN_ROWS)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+    train_stadium_models(min_rows=args.min_rows, workers=args.workers)
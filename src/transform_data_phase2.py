@@ -3,11 +3,15 @@ import pandas as pd
 import os
 import sys
 
+import instrumentation
+
 # Define Paths
 DATA_DIR = "data"
 FILE_RACES = os.path.join(DATA_DIR, "races.csv")
 FILE_ENTRIES = os.path.join(DATA_DIR, "entries.csv")
 FILE_RESULTS = os.path.join(DATA_DIR, "results.csv")
+# Optional: boats refunded per race (written by the collector from the result page)
+FILE_RETURNS = os.path.join(DATA_DIR, "returns.csv")
 FILE_OUTPUT = os.path.join(DATA_DIR, "training_base.csv")
 
 def load_csv(filepath):
@@ -17,6 +21,10 @@ def load_csv(filepath):
     return pd.read_csv(filepath)
 
 def transform_phase2():
+    with instrumentation.span("transform") as sp:
+        _transform(sp)
+
+def _transform(sp):
     print("Starting Phase 2: Data Transformation...")
 
     # 1. Load Data
@@ -24,6 +32,7 @@ def transform_phase2():
     df_races = load_csv(FILE_RACES)
     df_entries = load_csv(FILE_ENTRIES)
     df_results = load_csv(FILE_RESULTS)
+    sp.add_bytes_read(sum(instrumentation.file_size(p) for p in (FILE_RACES, FILE_ENTRIES, FILE_RESULTS)))
 
     print(f"    Races: {len(df_races)} rows")
     print(f"    Entries: {len(df_entries)} rows")
@@ -39,6 +48,16 @@ def transform_phase2():
     print("  Merging Results info...")
     df_merged = pd.merge(df_merged, df_results, on="race_id", how="left")
 
+    # Race-level accident flag source: how many boats were refunded (0 when none)
+    if os.path.exists(FILE_RETURNS):
+        returned = pd.read_csv(FILE_RETURNS).drop_duplicates().groupby("race_id").size()
+        sp.add_bytes_read(instrumentation.file_size(FILE_RETURNS))
+        print(f"    Returns: {int(returned.sum())} boats in {len(returned)} races")
+    else:
+        returned = pd.Series(dtype="int64")
+        print(f"    Returns: {FILE_RETURNS} not found, no race counts as an accident")
+    df_merged['returned_boats'] = df_merged['race_id'].map(returned).fillna(0).astype(int)
+
     # 3. Target Generation (is_2rentai)
     print("  Generating Target Variables...")
     
@@ -90,6 +109,8 @@ def transform_phase2():
     # 5. Save
     print(f"  Saving to {FILE_OUTPUT}...")
     df_merged.to_csv(FILE_OUTPUT, index=False, encoding='utf-8-sig')
+    sp.add_rows(final_count)
+    sp.add_bytes_written(instrumentation.file_size(FILE_OUTPUT))
     print("Phase 2 Completed Successfully.")
 
 if __name__ == "__main__":
@@ -0,0 +1,60 @@
+import os
+import sys
+import tempfile
+import unittest
+
+# Phase modules import each other by bare name from src/ (as main.py arranges)
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC_DIR = os.path.join(ROOT, "src")
+for path in (SRC_DIR, ROOT):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+class WorkdirTestCase(unittest.TestCase):
+    """Runs each test inside an empty directory: the modules use relative data/ paths."""
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self._cwd = os.getcwd()
+        os.chdir(self._tmp.name)
+        os.makedirs("data")
+
+    def tearDown(self):
+        os.chdir(self._cwd)
+        self._tmp.cleanup()
+
+def write_text(path: str, text: str):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+
+def read_bytes(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+def training_frame(n_races: int = 40, stadiums=(4,), rough_races: int = 8, seed: int = 0):
+    """
+    Small Phase 3 style table (training_featured.csv columns): six boats per
+    race, inner boats finishing first more often. The first `rough_races`
+    races paid 10,000 yen or more.
+    """
+    import numpy as np
+    import pandas as pd
+    rng = np.random.default_rng(seed)
+    rows = []
+    for i in range(n_races):
+        sid = stadiums[i % len(stadiums)]
+        race_id = f"202601{i // 12 + 1:02d}_{sid:02d}_{i % 12 + 1:02d}"
+        order = [int(b) for b in np.argsort(np.arange(6) + rng.normal(0, 2.5, 6)) + 1]
+        motor = rng.uniform(20, 50, 6)
+        st = rng.uniform(0.10, 0.25, 6)
+        for boat in range(1, 7):
+            rows.append({
+                "race_id": race_id, "stadium_id": sid, "boat_no": boat,
+                "class_val": int(rng.integers(1, 5)), "motor_p": motor[boat - 1], "st_ave": st[boat - 1],
+                "st_diff": st[boat - 1] - st.mean(), "motor_rank": int((motor > motor[boat - 1]).sum() + 1),
+                "fl": 0, "rank1_boat": order[0], "rank2_boat": order[1], "rank3_boat": order[2],
+                "payoff_3t": 12000 if i < rough_races else 1500, "returned_boats": 0,
+                "flag_2rentai": int(boat in order[:2]),
+            })
+    return pd.DataFrame(rows)
@@ -0,0 +1,86 @@
+import csv
+import unittest
+
+from support import WorkdirTestCase
+
+import instrumentation
+import collect_data_phase1 as phase1
+
+RACE_ID = "20260101_04_01"
+
+# Shape of pyjpboatrace's get_race_result(): a dead heat for 2nd pays two trifectas
+RESULT = {
+    "result": [
+        {"rank": 1, "boat": 1, "racerid": 4001, "name": "A", "time": "1'49\"8"},
+        {"rank": 2, "boat": 3, "racerid": 4003, "name": "C", "time": "1'51\"2"},
+        {"rank": 2, "boat": 2, "racerid": 4002, "name": "B", "time": "1'51\"2"},
+        {"rank": "転", "boat": 4, "racerid": 4004, "name": "D", "time": ""},
+    ],
+    "start_information": {
+        "course1": {"boat": 1, "ST": 0.12},
+        "course2": {"boat": 2, "ST": -0.01},
+    },
+    "payoff": {
+        "trifecta_all": [
+            {"result": "1-3-2", "payoff": 5400, "popularity": 12},
+            {"result": "1-2-3", "payoff": 4300, "popularity": ""},
+        ],
+        "win_all": [{"result": "1", "payoff": 150, "popularity": 1}],
+    },
+    "weather_information": {"weather": "晴", "temperature": 8.0, "water_temperature": 10.5,
+                            "wind_speed": 3, "wind_direction": 5, "wave_height": ""},
+    "note": ["4号艇 転覆"],
+    "return": [4],
+}
+
+def read_rows(path):
+    with open(path, encoding="utf-8-sig", newline="") as f:
+        return list(csv.DictReader(f))
+
+class RaceTimeTest(unittest.TestCase):
+    def test_parses_page_format(self):
+        self.assertAlmostEqual(phase1.race_time_seconds("1'49\"8"), 109.8)
+        self.assertIsNone(phase1.race_time_seconds(""))
+        self.assertIsNone(phase1.race_time_seconds(None))
+
+class ResultDetailsTest(WorkdirTestCase):
+    def test_every_side_table_is_built(self):
+        details = phase1.build_result_details(RACE_ID, RESULT)
+        self.assertEqual(set(details), set(phase1.RESULT_DETAIL_TABLES))
+        self.assertEqual(len(details[phase1.FILE_RESULT_ORDER]), 4)
+        self.assertEqual(len(details[phase1.FILE_RESULT_STARTS]), 2)
+        self.assertEqual([(p["bet_type"], p["seq"]) for p in details[phase1.FILE_PAYOFFS]],
+                         [("trifecta", 1), ("trifecta", 2), ("win", 1)])
+        self.assertEqual(details[phase1.FILE_RETURNS], [{"race_id": RACE_ID, "boat_no": 4}])
+
+    def test_no_result_gives_empty_tables(self):
+        details = phase1.build_result_details(RACE_ID, {})
+        self.assertEqual(details, {path: [] for path in phase1.RESULT_DETAIL_TABLES})
+
+    def test_written_tables_keep_integer_columns_without_decimals(self):
+        details = phase1.build_result_details(RACE_ID, RESULT)
+        with instrumentation.span("collect.batch") as sp:
+            phase1.write_batch(sp, [{"race_id": RACE_ID}], [], [], details)
+
+        order = read_rows(phase1.FILE_RESULT_ORDER)
+        self.assertEqual([r["rank"] for r in order], ["1", "2", "2", ""])
+        self.assertEqual(order[3]["status"], "転")
+        self.assertEqual(order[3]["racer_id"], "4004")
+        self.assertEqual(order[0]["time_s"], "109.8")
+        self.assertEqual(order[3]["time_s"], "")
+
+        starts = read_rows(phase1.FILE_RESULT_STARTS)
+        self.assertEqual([(r["course"], r["boat_no"], r["st"]) for r in starts],
+                         [("1", "1", "0.12"), ("2", "2", "-0.01")])
+
+        payoffs = read_rows(phase1.FILE_PAYOFFS)
+        self.assertEqual(list(payoffs[0]), phase1.COLS_PAYOFFS)
+        self.assertEqual([(r["seq"], r["payoff"], r["popularity"]) for r in payoffs],
+                         [("1", "5400", "12"), ("2", "4300", ""), ("1", "150", "1")])
+
+        conditions = read_rows(phase1.FILE_RACE_CONDITIONS)
+        self.assertEqual((conditions[0]["wind_speed"], conditions[0]["wave_height"]), ("3", ""))
+        self.assertEqual(read_rows(phase1.FILE_RETURNS), [{"race_id": RACE_ID, "boat_no": "4"}])
+
+if __name__ == "__main__":
+    unittest.main()
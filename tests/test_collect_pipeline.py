@@ -0,0 +1,141 @@
+import io
+import time
+import threading
+import contextlib
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from unittest import mock
+
+import requests
+
+from support import WorkdirTestCase
+
+import instrumentation
+import collect_pipeline
+from collect_pipeline import Pipeline, RateLimiter, StadiumBatch
+
+D = date(2026, 1, 1)
+
+class FakeResponse:
+    def __init__(self, url):
+        self.text = url
+        self.headers = {"Content-Type": "text/html; charset=utf-8"}
+
+    def raise_for_status(self):
+        if "fail" in self.text:
+            raise requests.exceptions.HTTPError(f"500 for {self.text}")
+
+class FakeSession:
+    """Answers every URL with the URL itself; `delay(url)` seconds per page."""
+
+    def __init__(self, delay=lambda url: 0.0, fail=()):
+        self.delay = delay
+        self.fail = fail
+        self.done = []
+        self._lock = threading.Lock()
+
+    def get(self, url, timeout=None):
+        time.sleep(self.delay(url))
+        with self._lock:
+            self.done.append(url)
+        return FakeResponse(url + "&fail" if any(f in url for f in self.fail) else url)
+
+    def close(self):
+        pass
+
+def fake_parse(kind):
+    def parse(html):
+        if "rno=3&jcd=12" in html and kind == "result":
+            raise ValueError("unexpected layout")
+        if kind == "12races":
+            return {"1R": {"vote_limit": "10:00"}}
+        if kind == "race_info":
+            return {"race_title": ["title"], "boat1": {"racerid": 4001, "name": "A", "class": "A1"}}
+        return {"result": [{"rank": 1, "boat": 1}, {"rank": 2, "boat": 2}, {"rank": 3, "boat": 3}],
+                "payoff": {"trifecta": {"payoff": 1200}}}
+    return parse
+
+class RateLimiterTest(unittest.TestCase):
+    def test_starts_are_spaced_across_threads(self):
+        # Frozen clock: each start is now + the sleep it was given, free of scheduler jitter
+        starts, lock = [], threading.Lock()
+
+        def sleep(seconds):
+            with lock:
+                starts.append(100.0 + seconds)
+
+        clock = mock.Mock(monotonic=lambda: 100.0, sleep=sleep)
+        limiter = RateLimiter(0.5)
+        with mock.patch.object(collect_pipeline, "time", clock):
+            threads = [threading.Thread(target=lambda: [limiter.wait() for _ in range(3)]) for _ in range(3)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+        self.assertEqual(sorted(starts), [100.0 + 0.5 * i for i in range(9)])
+
+class PipelineTest(WorkdirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.written = []
+        patches = [
+            mock.patch.dict(collect_pipeline.PAGES, {k: (v[0], fake_parse(k)) for k, v in collect_pipeline.PAGES.items()}),
+            mock.patch.object(collect_pipeline, "write_batch", side_effect=self.record),
+            mock.patch.object(collect_pipeline, "FETCH_ATTEMPTS", 1),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+    def record(self, sp, races, entries, results, details):
+        self.written.append(([r["race_id"] for r in races], [r["race_id"] for r in results]))
+
+    def run_pipeline(self, session, batches, fetchers=4, cancel=False):
+        with ThreadPoolExecutor(max_workers=2) as pool, contextlib.redirect_stdout(io.StringIO()) as out:
+            pipeline = Pipeline(instrumentation.span("test"), pool, fetchers, interval=0.0)
+            pipeline.session = session
+            pipeline.start()
+            for batch in batches:
+                pipeline.submit(batch)
+            pipeline.close(cancel=cancel)
+        self.output = out.getvalue()
+        return pipeline
+
+    def test_batches_are_written_in_submission_order(self):
+        # Venue 4's first race list is slow, so every page of venue 12 lands before it
+        slow = "racelist?rno=1&jcd=04"
+        session = FakeSession(delay=lambda url: 0.2 if slow in url else 0.0)
+        pipeline = self.run_pipeline(session, [StadiumBatch(D, 4, "a", [1, 2]), StadiumBatch(D, 12, "b", [1, 2])])
+        self.assertIn(slow, session.done[-1])
+        self.assertEqual([races for races, _ in self.written],
+                         [["20260101_04_01", "20260101_04_02"], ["20260101_12_01", "20260101_12_02"]])
+        self.assertEqual(pipeline.pages_fetched, 10)
+        self.assertEqual(pipeline.races_written, 4)
+
+    def test_fetch_and_parse_errors(self):
+        # Race 2 info fails to download; race 3's result page fails to parse
+        session = FakeSession(fail=["racelist?rno=2&jcd=12"])
+        self.run_pipeline(session, [StadiumBatch(D, 12, "b", [1, 2, 3])])
+        (races, results), = self.written
+        self.assertEqual(races, ["20260101_12_01", "20260101_12_03"])
+        self.assertEqual(results, ["20260101_12_01"])
+        self.assertIn("20260101_12_02: Failed to get info", self.output)
+        self.assertIn("20260101_12_03: No result (unexpected layout)", self.output)
+
+    def test_cancel_drops_queued_batches_whole(self):
+        session = FakeSession(delay=lambda url: 0.05)
+        batches = [StadiumBatch(D, sid, str(sid), [1, 2, 3]) for sid in range(1, 9)]
+        t0 = time.perf_counter()
+        pipeline = self.run_pipeline(session, batches, fetchers=1, cancel=True)
+        # 56 queued pages at 0.05s each would take ~2.8s
+        self.assertLess(time.perf_counter() - t0, 1.0)
+        self.assertLess(len(session.done), 7 * len(batches))
+        self.assertGreater(pipeline.batches_dropped, 0)
+        self.assertEqual(len(self.written) + pipeline.batches_dropped, len(batches))
+        for races, _ in self.written:
+            self.assertEqual(len(races), 3)
+        self.assertIn("not written", self.output)
+
+if __name__ == "__main__":
+    unittest.main()
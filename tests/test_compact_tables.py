@@ -0,0 +1,137 @@
+import os
+import json
+import unittest
+from unittest import mock
+
+from support import WorkdirTestCase, write_text, read_bytes
+
+import compact_tables
+from compact_tables import compact_tables as run_compaction, read_date_range, index_path
+
+RACES = """race_id,date,stadium_id,race_no,title,deadline
+20260102_04_01,2026-01-02,4,1,old title,2026-01-02 10:00:00
+20260101_04_02,2026-01-01,4,2,b,2026-01-01 10:30:00
+20260101_04_01,2026-01-01,4,1,a,2026-01-01 10:00:00
+20260102_04_01,2026-01-02,4,1,new title,2026-01-02 10:00:00
+"""
+
+def entries_csv(rows):
+    return "race_id,boat_no,racer_id,name,class,motor_p,st_ave,fl\n" + "".join(
+        f"{race_id},{boat},{racer},n{racer},A1,40.0,0.15,0\n" for race_id, boat, racer in rows)
+
+ENTRIES = entries_csv([
+    ("20260102_04_01", 2, 4002), ("20260102_04_01", 1, 4001),
+    ("20260101_04_02", 1, 4001), ("20260101_04_01", 1, 4003),
+    ("20260102_04_01", 1, 4001),
+])
+
+RESULTS = """race_id,rank1_boat,rank2_boat,rank3_boat,payoff_3t,win_method
+20260101_04_01,1,2,3,1200,逃げ
+20260102_04_01,2,1,3,5400,差し
+"""
+
+class CompactionTest(WorkdirTestCase):
+    def setUp(self):
+        super().setUp()
+        write_text(compact_tables.FILE_RACES, RACES)
+        write_text(compact_tables.FILE_ENTRIES, ENTRIES)
+        write_text(compact_tables.FILE_RESULTS, RESULTS)
+
+    def test_dedupes_last_write_and_sorts(self):
+        run_compaction()
+        races = read_date_range(compact_tables.FILE_RACES, "20260101", "20260102")
+        self.assertEqual(list(races["race_id"]), ["20260101_04_01", "20260101_04_02", "20260102_04_01"])
+        self.assertEqual(races["title"].iloc[-1], "new title")
+        entries = read_date_range(compact_tables.FILE_ENTRIES, "20260101", "20260102")
+        self.assertEqual(len(entries), 4)
+        self.assertEqual(list(entries["boat_no"].iloc[-2:]), ["1", "2"])
+
+    def test_index_offsets_point_at_first_row_of_each_date(self):
+        run_compaction()
+        with open(index_path(compact_tables.FILE_RACES), encoding="utf-8") as f:
+            idx = json.load(f)
+        self.assertEqual(idx["rows"], 3)
+        data = read_bytes(compact_tables.FILE_RACES)
+        for d, offset in idx["offsets"].items():
+            self.assertTrue(data[offset:].startswith(f"{d}_".encode()))
+
+    def test_read_date_range_includes_rows_appended_after_compaction(self):
+        run_compaction()
+        with open(compact_tables.FILE_RACES, "a", encoding="utf-8") as f:
+            f.write("20260103_04_01,2026-01-03,4,1,c,2026-01-03 10:00:00\n")
+        self.assertEqual(list(read_date_range(compact_tables.FILE_RACES, "20260102", "20260103")["race_id"]),
+                         ["20260102_04_01", "20260103_04_01"])
+        self.assertEqual(list(read_date_range(compact_tables.FILE_RACES, "20260101", "20260101")["race_id"]),
+                         ["20260101_04_01", "20260101_04_02"])
+
+    def test_optional_side_tables_are_compacted_when_present(self):
+        path = compact_tables.TABLES["returns"]["path"]
+        write_text(path, "race_id,boat_no\n20260102_04_01,5\n20260101_04_01,3\n20260102_04_01,5\n")
+        run_compaction()
+        self.assertEqual(read_bytes(path), b"race_id,boat_no\n20260101_04_01,3\n20260102_04_01,5\n")
+
+class SwapTest(WorkdirTestCase):
+    def setUp(self):
+        super().setUp()
+        write_text(compact_tables.FILE_RACES, RACES)
+        write_text(compact_tables.FILE_ENTRIES, ENTRIES)
+        write_text(compact_tables.FILE_RESULTS, RESULTS)
+        self.write_with_index = compact_tables.write_with_index
+
+    def test_change_to_any_table_swaps_none(self):
+        def append_result(df, path):
+            # The collector appends a result after races and entries were compacted
+            if path.startswith(compact_tables.FILE_RESULTS):
+                with open(compact_tables.FILE_RESULTS, "a", encoding="utf-8") as f:
+                    f.write("20260103_04_01,1,2,3,900,逃げ\n")
+            return self.write_with_index(df, path)
+
+        with mock.patch.object(compact_tables, "write_with_index", side_effect=append_result):
+            with self.assertRaisesRegex(RuntimeError, "results.csv changed"):
+                run_compaction()
+        self.assertEqual(read_bytes(compact_tables.FILE_RACES), RACES.encode())
+        self.assertEqual(read_bytes(compact_tables.FILE_ENTRIES), ENTRIES.encode())
+        self.assertEqual(sorted(os.listdir(compact_tables.DATA_DIR)), ["entries.csv", "races.csv", "results.csv"])
+
+    def test_rows_appended_during_the_swap_are_kept(self):
+        changed = compact_tables._changed
+        late = "20260103_04_01,2026-01-03,4,1,c,2026-01-03 10:00:00\n"
+
+        def append_after_check(path, source_stat):
+            result = changed(path, source_stat)
+            if path == compact_tables.FILE_RACES:
+                with open(path, "a", encoding="utf-8") as f:
+                    f.write(late)
+            return result
+
+        with mock.patch.object(compact_tables, "_changed", side_effect=append_after_check):
+            run_compaction()
+        self.assertTrue(read_bytes(compact_tables.FILE_RACES).endswith(late.encode()))
+        self.assertEqual(list(read_date_range(compact_tables.FILE_RACES, "20260102", "20260103")["race_id"]),
+                         ["20260102_04_01", "20260103_04_01"])
+
+class RaceIndexAfterCompactionTest(WorkdirTestCase):
+    def test_same_rows_after_rescan(self):
+        import race_index
+        write_text(compact_tables.FILE_RACES, RACES)
+        write_text(compact_tables.FILE_ENTRIES, ENTRIES)
+        write_text(compact_tables.FILE_RESULTS, RESULTS)
+
+        before = race_index.update_index()
+        racer_before = before.entries_for_racer(4001)
+        races_before = before.races_at(4, "20260101", "20260102")
+
+        run_compaction()
+        after = race_index.update_index()
+        racer_after = after.entries_for_racer(4001)
+        races_after = after.races_at(4, "20260101", "20260102")
+
+        self.assertEqual(sorted(zip(racer_before["race_id"], racer_before["boat_no"])),
+                         sorted(zip(racer_after["race_id"], racer_after["boat_no"])))
+        # Rows come back in file order, which compaction changes
+        self.assertEqual(sorted(races_before["race_id"]), sorted(races_after["race_id"]))
+        # The last write of a race wins both before and after compaction
+        self.assertEqual(races_after.set_index("race_id").loc["20260102_04_01", "title"], "new title")
+
+if __name__ == "__main__":
+    unittest.main()
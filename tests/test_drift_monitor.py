@@ -0,0 +1,67 @@
+import math
+import unittest
+
+import support  # noqa: F401 - puts src/ on sys.path
+
+import drift_monitor
+from drift_monitor import (FEATURES, DriftMonitor, auc_from_histograms, expected_calibration_error,
+                           feature_bin, psi)
+
+def histogram(scores, bins=10):
+    counts = [0.0] * bins
+    for s in scores:
+        counts[drift_monitor._bin(s, bins)] += 1
+    return counts
+
+class MetricTest(unittest.TestCase):
+    def test_auc_matches_pairwise_count(self):
+        pos, neg = [0.9, 0.7, 0.4], [0.8, 0.3, 0.2, 0.4]
+        # Pairs within one bin count half: 0.4 vs 0.4
+        self.assertAlmostEqual(auc_from_histograms(histogram(pos), histogram(neg)), 9.5 / 12)
+        self.assertTrue(math.isnan(auc_from_histograms(histogram(pos), [0.0] * 10)))
+
+    def test_ece(self):
+        self.assertAlmostEqual(expected_calibration_error([2, 1, 0], [0.3, 0.8, 0.0], [0, 1, 0]), 0.5 / 3)
+        self.assertTrue(math.isnan(expected_calibration_error([0, 0], [0, 0], [0, 0])))
+
+    def test_psi(self):
+        self.assertAlmostEqual(psi([0.5, 0.5], [30, 10]), 0.25 * math.log(3))
+        self.assertAlmostEqual(psi([0.25, 0.75], [1, 3]), 0.0)
+        self.assertTrue(math.isnan(psi([0.5, 0.5], [0, 0])))
+
+    def test_feature_bin_puts_edge_values_in_lower_bin(self):
+        edges = [1.0, 2.0, 3.0]
+        self.assertEqual([feature_bin(v, edges) for v in (0.5, 1.0, 1.5, 3.0, 4.0)], [0, 0, 1, 2, 3])
+
+class DriftMonitorTest(unittest.TestCase):
+    REFERENCE = {"features": {col: {"edges": [0.5], "expected": [0.5, 0.5]} for col in FEATURES}}
+
+    def predictions(self, race_id, probs):
+        return [{"race_id": race_id, "boat_no": str(boat), "prob_2rentai": str(p)}
+                for boat, p in enumerate(probs, start=1)]
+
+    def test_settled_race_updates_metrics(self):
+        monitor = DriftMonitor(self.REFERENCE)
+        monitor.add_predictions(self.predictions("20260101_04_01", [0.8, 0.6, 0.3, 0.2, 0.1, 0.05]))
+        self.assertFalse(monitor.settle({"race_id": "20260101_04_02", "rank1_boat": "1", "rank2_boat": "2"}))
+        self.assertTrue(monitor.settle({"race_id": "20260101_04_01", "rank1_boat": "3", "rank2_boat": "1.0"}))
+
+        m = monitor.metrics()
+        self.assertEqual(m["settled_total"], 1)
+        self.assertEqual(m["pending_races"], 0)
+        self.assertAlmostEqual(m["top2_hit_rate"], 0.5)
+        self.assertAlmostEqual(m["auc"], 7 / 8)
+        self.assertAlmostEqual(m["ece"], (abs(0.8 - 1) + abs(0.6 - 0) + abs(0.3 - 1)
+                                          + abs(0.2 + 0.1 + 0.05 - 0)) / 6)
+        # Every boat had missing features (0.0), all in the lower bin
+        self.assertAlmostEqual(m[f"psi_{FEATURES[0]}"], psi([0.5, 0.5], [6, 0]))
+
+    def test_reprediction_replaces_boat(self):
+        monitor = DriftMonitor(self.REFERENCE)
+        monitor.add_predictions(self.predictions("20260101_04_01", [0.1, 0.2]))
+        monitor.add_predictions([{"race_id": "20260101_04_01", "boat_no": "1.0", "prob_2rentai": "0.9"}])
+        self.assertEqual(monitor.state["pending"]["20260101_04_01"]["1"][0], 0.9)
+        self.assertEqual(len(monitor.state["pending"]["20260101_04_01"]), 2)
+
+if __name__ == "__main__":
+    unittest.main()
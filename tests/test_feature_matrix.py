@@ -0,0 +1,26 @@
+import contextlib
+import io
+import unittest
+
+import pandas as pd
+
+import support  # noqa: F401 - puts src/ on sys.path
+
+from feature_matrix import UNKNOWN_STADIUM, stadium_column
+
+class StadiumColumnTest(unittest.TestCase):
+    def test_invalid_ids_become_sentinel_not_zero(self):
+        values = pd.Series(["4", "24", None, "0", "25", "x", "1.0"])
+        with contextlib.redirect_stdout(io.StringIO()) as out:
+            ids = stadium_column(values)
+        self.assertEqual(list(ids), [4, 24] + [UNKNOWN_STADIUM] * 4 + [1])
+        self.assertNotIn(0, list(ids))
+        self.assertIn("4 rows without a valid stadium_id", out.getvalue())
+
+    def test_valid_ids_do_not_warn(self):
+        with contextlib.redirect_stdout(io.StringIO()) as out:
+            stadium_column(pd.Series([1, 12, 24]))
+        self.assertEqual(out.getvalue(), "")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,50 @@
+import unittest
+
+import numpy as np
+
+import support  # noqa: F401 - puts src/ on sys.path
+
+from feature_selection import confidence_interval, time_folds
+
+class TimeFoldsTest(unittest.TestCase):
+    def test_too_few_dates_raise(self):
+        dates = np.array([20260101, 20260101, 20260102, 20260103])
+        with self.assertRaises(ValueError):
+            time_folds(dates, 3)
+        with self.assertRaises(ValueError):
+            time_folds(np.array([], dtype=np.int64), 1)
+
+    def test_minimum_dates_give_one_day_per_block(self):
+        dates = np.array([20260103, 20260101, 20260102, 20260101])
+        folds = time_folds(dates, 2)
+        self.assertEqual([f["valid_dates"] for f in folds], [(20260102, 20260102), (20260103, 20260103)])
+        self.assertEqual(list(folds[0]["train"]), [1, 3])
+        self.assertEqual(list(folds[0]["valid"]), [2])
+        self.assertEqual(list(folds[1]["train"]), [1, 2, 3])
+        self.assertEqual(list(folds[1]["valid"]), [0])
+
+    def test_expanding_folds_never_validate_before_training(self):
+        dates = np.repeat(np.arange(20260101, 20260111), 3)
+        folds = time_folds(dates, 4)
+        self.assertEqual(len(folds), 4)
+        covered = np.concatenate([f["valid"] for f in folds])
+        self.assertEqual(len(covered), len(np.unique(covered)))
+        for prev, fold in zip(folds, folds[1:]):
+            self.assertGreater(len(fold["train"]), len(prev["train"]))
+        for fold in folds:
+            self.assertLess(dates[fold["train"]].max(), dates[fold["valid"]].min())
+
+class ConfidenceIntervalTest(unittest.TestCase):
+    def test_single_fold_has_no_interval(self):
+        mean, half = confidence_interval([0.02])
+        self.assertEqual(mean, 0.02)
+        self.assertTrue(np.isnan(half))
+
+    def test_t_interval(self):
+        mean, half = confidence_interval([1.0, 2.0, 3.0])
+        self.assertAlmostEqual(mean, 2.0)
+        # t(0.975, 2) = 4.3027, sem = 1 / sqrt(3)
+        self.assertAlmostEqual(half, 4.302653 / np.sqrt(3), places=5)
+
+if __name__ == "__main__":
+    unittest.main()
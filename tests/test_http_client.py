@@ -0,0 +1,120 @@
+import os
+import unittest
+from unittest import mock
+
+import requests
+from selenium.common.exceptions import WebDriverException
+
+from support import ROOT
+
+import instrumentation
+import http_client
+from http_client import BACKEND_BROWSER, BACKEND_HTTP, BoatraceClient
+from pyjpboatrace.scraper._parser.parse_html_racelist import parse_html_racelist
+from pyjpboatrace.scraper._parser.parse_html_raceresult import parse_html_raceresult
+
+# Saved pages in boatrace.jp's markup: a racelist, and a result with a dead
+# heat, a flying start, a capsized boat and multi-row payoffs
+PAGES_DIR = os.path.join(ROOT, "tests", "pages")
+
+def read_page(name):
+    with open(os.path.join(PAGES_DIR, name), encoding="utf-8") as f:
+        return f.read()
+
+@unittest.skipUnless(http_client.HAS_LXML, "lxml not installed")
+class LxmlParityTest(unittest.TestCase):
+    def tearDown(self):
+        http_client.use_lxml_parser(False)
+
+    def parse_both(self, parse, page):
+        html = read_page(page)
+        self.assertFalse(http_client.use_lxml_parser(False))
+        expected = parse(html)
+        self.assertTrue(http_client.use_lxml_parser())
+        return expected, parse(html)
+
+    def test_racelist(self):
+        expected, actual = self.parse_both(parse_html_racelist, "racelist.html")
+        self.assertEqual(len([k for k in expected if k.startswith("boat")]), 6)
+        self.assertEqual(actual, expected)
+
+    def test_raceresult(self):
+        expected, actual = self.parse_both(parse_html_raceresult, "raceresult.html")
+        self.assertEqual(expected["return"], [4])
+        self.assertEqual(expected["start_information"]["course2"]["ST"], -0.01)
+        self.assertEqual(actual, expected)
+
+class FakeScraper:
+    """Stands in for a PyJPBoatrace instance: get_stadiums returns or raises."""
+
+    def __init__(self, name, error=None):
+        self.name = name
+        self.error = error
+        self.calls = 0
+
+    def get_stadiums(self, d):
+        self.calls += 1
+        if self.error:
+            raise self.error
+        return {"served_by": self.name}
+
+    def close(self):
+        pass
+
+class CallBackendTest(unittest.TestCase):
+    def setUp(self):
+        instrumentation._state.requests.clear()
+        instrumentation.configure(trace_path="", prom_path=os.devnull, profile_stage="")
+
+    def tearDown(self):
+        instrumentation.configure(trace_path="", prom_path="", profile_stage="")
+        instrumentation._state.requests.clear()
+
+    def client(self, http, browser=None):
+        client = BoatraceClient(session=requests.Session(), browser="", fast_parser=False)
+        client.http = http
+        if browser:
+            # Configured browser without starting one: PyJPBoatrace itself is patched below
+            client._browser_factory = lambda: "driver"
+        return client, mock.patch.object(http_client, "PyJPBoatrace", return_value=browser)
+
+    def test_http_serves_when_it_works(self):
+        client, patch = self.client(FakeScraper("http"), FakeScraper("browser"))
+        with patch as browser_cls:
+            self.assertEqual(client.get_stadiums(None), {"served_by": "http"})
+        browser_cls.assert_not_called()
+        self.assertEqual(client.last_backend, BACKEND_HTTP)
+        self.assertEqual(client.backend_counts, {BACKEND_HTTP: 1, BACKEND_BROWSER: 0})
+
+    def test_browser_fallback_on_network_error(self):
+        browser = FakeScraper("browser")
+        client, patch = self.client(FakeScraper("http", requests.exceptions.ConnectionError("down")), browser)
+        with patch as browser_cls:
+            self.assertEqual(client.get_stadiums(None), {"served_by": "browser"})
+            self.assertEqual(client.get_stadiums(None), {"served_by": "browser"})
+        # The browser is started once and reused
+        browser_cls.assert_called_once()
+        self.assertEqual(browser.calls, 2)
+        self.assertEqual(client.last_backend, BACKEND_BROWSER)
+        self.assertEqual(client.backend_counts, {BACKEND_HTTP: 0, BACKEND_BROWSER: 2})
+
+        stats = instrumentation._state.requests
+        self.assertEqual(stats[("get_stadiums", BACKEND_HTTP)]["errors"], 2)
+        self.assertEqual(stats[("get_stadiums", BACKEND_BROWSER)]["count"], 2)
+        self.assertEqual(stats[("get_stadiums", BACKEND_BROWSER)]["errors"], 0)
+
+    def test_without_browser_the_error_propagates(self):
+        client, _ = self.client(FakeScraper("http", WebDriverException("bad page")))
+        with self.assertRaises(WebDriverException):
+            client.get_stadiums(None)
+        self.assertIsNone(client.last_backend)
+        self.assertEqual(client.backend_counts, {BACKEND_HTTP: 0, BACKEND_BROWSER: 0})
+
+    def test_parse_errors_do_not_fall_back(self):
+        client, patch = self.client(FakeScraper("http", IndexError("layout changed")), FakeScraper("browser"))
+        with patch as browser_cls, self.assertRaises(IndexError):
+            client.get_stadiums(None)
+        browser_cls.assert_not_called()
+
+if __name__ == "__main__":
+    unittest.main()
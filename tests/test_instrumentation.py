@@ -0,0 +1,64 @@
+import json
+import threading
+import unittest
+
+from support import WorkdirTestCase
+
+import instrumentation
+
+class ThreadedSpanTest(WorkdirTestCase):
+    def setUp(self):
+        super().setUp()
+        instrumentation._state.stages.clear()
+        instrumentation._state.requests.clear()
+        instrumentation.configure(trace_path="data/trace.jsonl", prom_path="data/metrics.prom", profile_stage="")
+
+    def tearDown(self):
+        instrumentation.configure(trace_path="", prom_path="", profile_stage="")
+        instrumentation._state.stages.clear()
+        instrumentation._state.requests.clear()
+        super().tearDown()
+
+    def test_worker_spans_keep_their_own_parents(self):
+        n_threads, n_spans = 8, 50
+
+        def work(i):
+            for _ in range(n_spans):
+                with instrumentation.span(f"worker.{i}"):
+                    with instrumentation.span(f"worker.{i}.step") as sp:
+                        sp.add_rows(1)
+                        shared.add_rows(1)
+                    instrumentation.observe_request("get_race_info", 0.2)
+
+        with instrumentation.span("collect") as shared:
+            threads = [threading.Thread(target=work, args=(i,)) for i in range(n_threads)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+        instrumentation.flush()
+
+        with open("data/trace.jsonl", encoding="utf-8") as f:
+            records = [json.loads(line) for line in f]
+        spans = [r for r in records if r["type"] == "span"]
+        self.assertEqual(len(spans), 2 * n_threads * n_spans + 1)
+        for r in spans:
+            if r["stage"].endswith(".step"):
+                self.assertEqual(r["parent"], r["stage"][:-len(".step")])
+            elif r["stage"] != "collect":
+                # Worker threads start with an empty stack
+                self.assertIsNone(r["parent"])
+        requests = [r for r in records if r["type"] == "request"]
+        self.assertEqual(len(requests), n_threads * n_spans)
+        self.assertTrue(all(r["stage"].startswith("worker.") for r in requests))
+
+        stages = instrumentation._state.stages
+        self.assertEqual(stages["collect"]["rows"], n_threads * n_spans)
+        self.assertEqual(sum(stages[f"worker.{i}.step"]["rows"] for i in range(n_threads)), n_threads * n_spans)
+        self.assertEqual(instrumentation._state.requests[("get_race_info", "default")]["count"],
+                         n_threads * n_spans)
+        with open("data/metrics.prom", encoding="utf-8") as f:
+            self.assertIn(f'boatrace_stage_rows_total{{stage="collect"}} {n_threads * n_spans}', f.read())
+
+if __name__ == "__main__":
+    unittest.main()
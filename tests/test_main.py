@@ -0,0 +1,60 @@
+import os
+import argparse
+import unittest
+
+from support import WorkdirTestCase, write_text
+
+import main
+
+class RunPhaseTest(WorkdirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.calls = 0
+        self._phases = main.PHASES
+        # Any module under src/ works: run_phase only fingerprints its source
+        main.PHASES = {"demo": {"module": "fingerprint", "inputs": ["data/in.csv"], "outputs": ["data/out.csv"]}}
+        write_text("data/in.csv", "a\n1\n")
+
+    def tearDown(self):
+        main.PHASES = self._phases
+        super().tearDown()
+
+    def run_demo(self, force=False, config=None):
+        def call(module):
+            self.calls += 1
+            write_text("data/out.csv", f"run {self.calls}\n")
+        main.run_phase("demo", argparse.Namespace(force=force), config or {}, call)
+
+    def test_unchanged_inputs_skip(self):
+        self.run_demo()
+        self.run_demo()
+        self.assertEqual(self.calls, 1)
+
+    def test_force_reruns(self):
+        self.run_demo()
+        self.run_demo(force=True)
+        self.assertEqual(self.calls, 2)
+
+    def test_changed_input_config_or_missing_output_reruns(self):
+        self.run_demo()
+        write_text("data/in.csv", "a\n1\n2\n")
+        self.run_demo()
+        self.run_demo(config={"limit": 3})
+        os.remove("data/out.csv")
+        self.run_demo(config={"limit": 3})
+        self.assertEqual(self.calls, 4)
+
+class ParserTest(unittest.TestCase):
+    def test_all_accepts_collect_options(self):
+        args = main.build_parser().parse_args(["all"])
+        self.assertFalse(args.pipelined)
+        self.assertEqual(args.fetchers, 2)
+
+    def test_train_multi_targets_match_trainer(self):
+        import train_multi_target
+        sub = next(a for a in main.build_parser()._actions if isinstance(a, argparse._SubParsersAction))
+        targets = next(a for a in sub.choices["train-multi"]._actions if a.dest == "targets")
+        self.assertEqual(targets.choices, list(train_multi_target.TARGETS))
+
+if __name__ == "__main__":
+    unittest.main()
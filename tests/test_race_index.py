@@ -0,0 +1,54 @@
+import unittest
+
+from support import WorkdirTestCase, write_text
+
+import race_index
+from compact_tables import compact_tables as run_compaction
+from test_compact_tables import RACES, RESULTS, entries_csv
+
+class ReappendedEntryTest(WorkdirTestCase):
+    def setUp(self):
+        super().setUp()
+        write_text(race_index.FILE_RACES, RACES)
+        write_text("data/results.csv", RESULTS)
+        write_text(race_index.FILE_ENTRIES, entries_csv([
+            ("20260102_04_01", 1, 4001), ("20260102_04_01", 2, 4002), ("20260101_04_01", 1, 4001),
+        ]))
+
+    def append_entry(self, race_id, boat, racer):
+        with open(race_index.FILE_ENTRIES, "a", encoding="utf-8") as f:
+            f.write(entries_csv([(race_id, boat, racer)]).split("\n", 1)[1])
+
+    def lanes(self, frame):
+        return sorted(zip(frame["race_id"], frame["boat_no"], frame["racer_id"]))
+
+    def test_last_write_moves_the_entry_to_the_new_racer(self):
+        index = race_index.update_index()
+        self.assertEqual(len(index.entries_for_racer(4001)), 2)
+
+        # Boat 1 of 20260102_04_01 is re-collected with another racer
+        self.append_entry("20260102_04_01", 1, 4009)
+        index = race_index.update_index()
+        self.assertEqual(self.lanes(index.entries_for_racer(4001)), [("20260101_04_01", 1, 4001)])
+        self.assertEqual(self.lanes(index.entries_for_racer(4009)), [("20260102_04_01", 1, 4009)])
+        self.assertEqual(len(index.entries_for_race("20260102_04_01")), 2)
+
+        # A racer whose only entry moved disappears from the racer map
+        self.append_entry("20260101_04_01", 1, 4009)
+        index = race_index.update_index()
+        self.assertNotIn("4001", index.racer)
+        self.assertEqual(len(index.entries_for_racer(4001)), 0)
+
+        # Compaction keeps the same last writes, so a rescan agrees
+        before = self.lanes(index.entries_for_racer(4009))
+        run_compaction()
+        self.assertEqual(self.lanes(race_index.update_index().entries_for_racer(4009)), before)
+
+    def test_same_racer_reappended_is_listed_once(self):
+        race_index.update_index()
+        self.append_entry("20260102_04_01", 1, 4001)
+        index = race_index.update_index()
+        self.assertEqual(index.racer["4001"].count(("20260102_04_01", 1)), 1)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,97 @@
+import io
+import pickle
+import contextlib
+import unittest
+from datetime import date
+
+import lightgbm as lgb
+
+from support import WorkdirTestCase, write_text, training_frame
+
+import instrumentation
+import replay_day
+from compact_tables import FILE_RACES, FILE_ENTRIES
+from train_model_phase4 import FEATURES, FILE_MODEL
+from test_compact_tables import entries_csv
+
+DAY = date(2026, 1, 10)
+
+# Two venues, deadlines 30 minutes apart so no race waits on another
+RACES = """race_id,date,stadium_id,race_no,title,deadline
+20260110_04_01,2026-01-10,4,1,a,2026-01-10 10:00:00
+20260110_12_01,2026-01-10,12,1,b,2026-01-10 10:30:00
+20260110_04_02,2026-01-10,4,2,c,2026-01-10 11:00:00
+20260110_12_02,2026-01-10,12,2,d,2026-01-10 11:30:00
+20260111_04_01,2026-01-11,4,1,next day,2026-01-11 10:00:00
+"""
+
+class ReplayDayTest(WorkdirTestCase):
+    def setUp(self):
+        super().setUp()
+        write_text(FILE_RACES, RACES)
+        write_text(FILE_ENTRIES, entries_csv([
+            (race_id, boat, 4000 + boat)
+            for race_id in ("20260110_04_01", "20260110_12_01", "20260110_04_02", "20260110_12_02")
+            for boat in range(1, 7)
+        ]))
+        df = training_frame(n_races=20)
+        model = lgb.train({"objective": "binary", "verbosity": -1, "num_leaves": 4, "min_data_in_leaf": 5},
+                          lgb.Dataset(df[FEATURES], df["flag_2rentai"]), num_boost_round=3)
+        with open(FILE_MODEL, "wb") as f:
+            pickle.dump(model, f)
+
+    def replay(self, **kwargs):
+        kwargs = {"budget_s": 60.0, "latency": 0.3, "jitter": 0.0, "failure_rate": 0.0, **kwargs}
+        with contextlib.redirect_stdout(io.StringIO()) as out:
+            misses = replay_day._replay(instrumentation.span("test"), DAY, seed=0, limit_races=12,
+                                        per_stadium=False, bundle=False, **kwargs)
+        self.output = out.getvalue()
+        return misses
+
+    def test_latency_on_the_virtual_clock(self):
+        misses = self.replay()
+        self.assertEqual(misses, [])
+        self.assertIn("Races: 4, predicted: 4, missed budget (60s): 0", self.output)
+        # race_info (0.3s) + the 1s pause + before-info (0.3s) of virtual time, plus real compute
+        p50 = float(self.output.split("p50 ")[1].split("s")[0])
+        self.assertGreaterEqual(p50, 1.6)
+        self.assertLess(p50, 1.6 + 2.0)
+        self.assertIn("'race_info': 4, 'just_before_info': 4", self.output)
+        self.assertIn("Replay Passed.", self.output)
+
+    def test_over_budget_races_are_missed(self):
+        misses = self.replay(budget_s=1.0)
+        self.assertEqual([t["race_id"] for t in misses],
+                         ["20260110_04_01", "20260110_12_01", "20260110_04_02", "20260110_12_02"])
+        self.assertTrue(all(t["latency_s"] > 1.0 and t["emitted"] < t["deadline"] for t in misses))
+        self.assertIn("MISS 20260110_04_01: 1.", self.output)
+        self.assertIn("Replay FAILED.", self.output)
+
+    def test_injected_failures_miss_races(self):
+        # Every call fails: the stadium list is unreachable after retries, so the whole day is missed
+        misses = self.replay(failure_rate=1.0)
+        self.assertEqual(len(misses), 4)
+        self.assertTrue(all(t["emitted"] is None for t in misses))
+        self.assertIn("injected failures: 3", self.output)
+        self.assertIn("MISS 20260110_12_02: no prediction", self.output)
+
+    def test_retried_failures_push_races_over_budget(self):
+        # Seed 0 fails one call of three races; each retry waits 3s of virtual time
+        misses = self.replay(failure_rate=0.4, budget_s=4.0)
+        self.assertEqual([t["race_id"] for t in misses], ["20260110_04_01", "20260110_12_01", "20260110_12_02"])
+        self.assertTrue(all(t["latency_s"] >= 4.6 for t in misses))
+        self.assertIn("Races: 4, predicted: 4, missed budget (4s): 3", self.output)
+        self.assertIn("injected failures: 3", self.output)
+        # Same seed, same failures
+        self.assertEqual([t["race_id"] for t in self.replay(failure_rate=0.4, budget_s=4.0)],
+                         [t["race_id"] for t in misses])
+
+    def test_exit_code(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            replay_day.replay_day(DAY, jitter=0.0)
+            with self.assertRaises(SystemExit) as cm:
+                replay_day.replay_day(DAY, jitter=0.0, failure_rate=1.0)
+        self.assertEqual(cm.exception.code, 1)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,51 @@
+import io
+import pickle
+import contextlib
+import unittest
+
+import numpy as np
+import pandas as pd
+import lightgbm as lgb
+
+from support import WorkdirTestCase, training_frame
+
+import score_batch
+from score_batch import COLS_SCORES, FILE_INPUT, FILE_MODEL, model_version
+from train_model_phase4 import FEATURES
+
+class ScoreBatchTest(WorkdirTestCase):
+    def setUp(self):
+        super().setUp()
+        # Shuffled so input order is not the sorted key order
+        self.df = training_frame(n_races=30).sample(frac=1, random_state=0).reset_index(drop=True)
+        self.df.to_csv(FILE_INPUT, index=False)
+        self.model = lgb.train({"objective": "binary", "verbosity": -1, "num_leaves": 4, "min_data_in_leaf": 5},
+                               lgb.Dataset(self.df[FEATURES], self.df["flag_2rentai"]), num_boost_round=5)
+        with open(FILE_MODEL, "wb") as f:
+            pickle.dump(self.model, f)
+
+    def run_scoring(self, workers, output):
+        with contextlib.redirect_stdout(io.StringIO()):
+            score_batch.score_batch(output_path=output, workers=workers, chunksize=17)
+        return pd.read_csv(output, encoding="utf-8-sig")
+
+    def test_workers_keep_input_order(self):
+        single = self.run_scoring(1, "data/scores_1.csv")
+        pooled = self.run_scoring(3, "data/scores_3.csv")
+        for scores in (single, pooled):
+            self.assertEqual(list(scores.columns), COLS_SCORES)
+            self.assertEqual(list(zip(scores["race_id"], scores["boat_no"])),
+                             list(zip(self.df["race_id"], self.df["boat_no"])))
+            self.assertEqual(set(scores["model_version"]), {model_version(FILE_MODEL)})
+        self.assertEqual(len(model_version(FILE_MODEL)), 12)
+        np.testing.assert_allclose(single["prob_2rentai"], self.model.predict(self.df[FEATURES]))
+        np.testing.assert_allclose(pooled["prob_2rentai"], single["prob_2rentai"])
+
+    def test_empty_input_writes_header(self):
+        self.df.iloc[:0].to_csv(FILE_INPUT, index=False)
+        scores = self.run_scoring(2, "data/scores.csv")
+        self.assertEqual(list(scores.columns), COLS_SCORES)
+        self.assertEqual(len(scores), 0)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,64 @@
+import os
+import json
+import unittest
+
+from support import WorkdirTestCase, write_text, read_bytes
+
+import snapshot
+
+class SnapshotTest(WorkdirTestCase):
+    def setUp(self):
+        super().setUp()
+        # Small chunks so the tables span several objects
+        self._min_chunk = snapshot.MIN_CHUNK
+        snapshot.MIN_CHUNK = 64
+        rows = "".join(f"2026010{d}_04_{r:02d},x,{d * r}\n" for d in range(1, 6) for r in range(1, 13))
+        write_text("data/races.csv", "race_id,title,value\n" + rows)
+        write_text("data/other.csv", "a,b\n" + "1,2\n" * 100)
+
+    def tearDown(self):
+        snapshot.MIN_CHUNK = self._min_chunk
+        super().tearDown()
+
+    def test_checkout_is_byte_identical(self):
+        snapshot_id = snapshot.take_snapshot(["data/races.csv", "data/other.csv"])
+        manifest = snapshot.load_manifest(snapshot_id)
+        self.assertGreater(len(manifest["files"]["data/races.csv"]["chunks"]), 1)
+
+        status = snapshot.checkout(snapshot_id, "out")
+        self.assertEqual(status, {"data/races.csv": "written", "data/other.csv": "written"})
+        for path in ("data/races.csv", "data/other.csv"):
+            self.assertEqual(read_bytes(os.path.join("out", path)), read_bytes(path))
+        self.assertEqual(set(snapshot.checkout(snapshot_id, "out").values()), {"unchanged"})
+
+    def test_appending_keeps_earlier_chunks(self):
+        first = snapshot.load_manifest(snapshot.take_snapshot(["data/races.csv"]))
+        with open("data/races.csv", "a", encoding="utf-8") as f:
+            f.write("20260106_04_01,y,1\n")
+        second = snapshot.load_manifest(snapshot.take_snapshot(["data/races.csv"]))
+        old = [c["hash"] for c in first["files"]["data/races.csv"]["chunks"]]
+        new = [c["hash"] for c in second["files"]["data/races.csv"]["chunks"]]
+        self.assertEqual(new[:len(old) - 1], old[:-1])
+
+    def test_checkout_rejects_paths_outside_dest(self):
+        snapshot_id = snapshot.take_snapshot(["data/other.csv"])
+        manifest_path = os.path.join(snapshot.MANIFESTS_DIR, f"{snapshot_id}.json")
+        manifest = snapshot.load_manifest(snapshot_id)
+        entry = manifest["files"]["data/other.csv"]
+        for key in ("../evil.csv", os.path.abspath("evil.csv")):
+            manifest["files"] = {"data/ok.csv": entry, key: entry}
+            with open(manifest_path, "w", encoding="utf-8") as f:
+                json.dump(manifest, f)
+            with self.assertRaises(ValueError):
+                snapshot.checkout(snapshot_id, "out")
+            self.assertFalse(os.path.exists("evil.csv"))
+            # Nothing is written when any path is rejected
+            self.assertFalse(os.path.exists("out/data/ok.csv"))
+
+    def test_manifest_key_rejects_paths_outside_working_directory(self):
+        self.assertEqual(snapshot.manifest_key(os.path.abspath("data/races.csv")), "data/races.csv")
+        with self.assertRaises(ValueError):
+            snapshot.manifest_key("../races.csv")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+import io
+import pickle
+import contextlib
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from support import WorkdirTestCase, training_frame
+
+import train_stadium_models
+from predict_phase5 import StadiumRouter
+from train_stadium_models import FILE_STADIUM_MODELS, GLOBAL
+
+class ConstantModel:
+    def __init__(self, value):
+        self.value = value
+        self.rows = []
+
+    def predict(self, X):
+        self.rows.append(len(X))
+        return np.full(len(X), self.value)
+
+class StadiumRouterTest(unittest.TestCase):
+    def setUp(self):
+        self.router = StadiumRouter({GLOBAL: ConstantModel(0.5), "stadiums": {4: ConstantModel(0.4), 12: ConstantModel(0.12)}})
+
+    def test_routes_each_row_to_its_venue_in_input_order(self):
+        X = pd.DataFrame({"boat_no": range(1, 8)})
+        stadium_ids = [12, 4, 7, -1, 4, 12, 24]
+        np.testing.assert_array_equal(self.router.predict(X, stadium_ids),
+                                      [0.12, 0.4, 0.5, 0.5, 0.4, 0.12, 0.5])
+        # Batched per stadium id, not per row
+        self.assertEqual(self.router.stadiums[4].rows, [2])
+        self.assertEqual(sum(self.router.global_model.rows), 3)
+
+    def test_unknown_and_sentinel_stadiums_use_the_global_model(self):
+        for sid in (-1, 7, 25, "4"):
+            expected = self.router.stadiums[4] if sid == "4" else self.router.global_model
+            self.assertIs(self.router.model_for(sid), expected)
+
+class TrainStadiumModelsTest(WorkdirTestCase):
+    def test_small_min_rows_skips_venues_too_small_to_split(self):
+        # 60 races over three venues, plus one race (6 rows) at venue 24
+        df = pd.concat([training_frame(n_races=60, stadiums=(4, 12, 18)),
+                        training_frame(n_races=1, stadiums=(24,), seed=1)], ignore_index=True)
+        df.to_csv(train_stadium_models.FILE_INPUT, index=False)
+        with contextlib.redirect_stdout(io.StringIO()) as out:
+            train_stadium_models.train_stadium_models(min_rows=1, workers=2)
+        self.assertIn("using 10", out.getvalue())
+
+        with open(FILE_STADIUM_MODELS, "rb") as f:
+            bundle = pickle.load(f)
+        self.assertEqual(sorted(bundle["stadiums"]), [4, 12, 18])
+        self.assertEqual(bundle["min_rows"], train_stadium_models.MIN_SPLIT_ROWS)
+
+        router = StadiumRouter(bundle)
+        X = df[train_stadium_models.FEATURES].head(12)
+        ids = df["stadium_id"].head(12).to_numpy()
+        np.testing.assert_allclose(router.predict(X, ids)[ids == 4], bundle["stadiums"][4].predict(X[ids == 4]))
+
+if __name__ == "__main__":
+    unittest.main()
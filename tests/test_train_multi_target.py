@@ -0,0 +1,98 @@
+import os
+import json
+import pickle
+import contextlib
+import io
+import unittest
+from unittest import mock
+
+import numpy as np
+import lightgbm as lgb
+
+from support import WorkdirTestCase, training_frame
+
+import feature_matrix
+import train_multi_target
+from feature_engineering_phase3 import FEATURES, LABELS
+from train_multi_target import FILE_BUNDLE, TARGETS, train_multi_target as train
+
+class TrainMultiTargetTest(WorkdirTestCase):
+    def write_input(self, **kwargs):
+        self.df = training_frame(n_races=60, **kwargs)
+        self.df.to_csv(train_multi_target.FILE_INPUT, index=False)
+
+    def run_training(self, targets=None):
+        subsets = []
+        original = lgb.Dataset.subset
+
+        def spy(dataset, used_indices, *args, **kw):
+            subsets.append((dataset, np.asarray(used_indices)))
+            return original(dataset, used_indices, *args, **kw)
+
+        with mock.patch.object(lgb.Dataset, "subset", autospec=True, side_effect=spy), \
+                contextlib.redirect_stdout(io.StringIO()) as out:
+            train(targets, workers=2)
+        self.output = out.getvalue()
+        return subsets
+
+    def load_bundle(self):
+        with open(FILE_BUNDLE, "rb") as f:
+            return pickle.load(f)
+
+    def test_targets_share_one_binned_dataset(self):
+        self.write_input()
+        subsets = self.run_training()
+        self.assertEqual(len(subsets), len(TARGETS))
+        # Every target is a subset of the same constructed parent
+        self.assertEqual(len({id(parent) for parent, _ in subsets}), 1)
+
+        bundle = self.load_bundle()
+        self.assertEqual(set(bundle["targets"]), set(TARGETS))
+        self.assertEqual(bundle["features"], FEATURES)
+        self.assertEqual(bundle["format"], train_multi_target.BUNDLE_FORMAT)
+        self.assertEqual(len(bundle["version"]), 12)
+        self.assertTrue(bundle["snapshot"])
+
+        labels = {name: np.asarray(f(self.df), dtype=float) for name, f in LABELS.items()}
+        for (_, rows), name in zip(subsets, TARGETS):
+            target = bundle["targets"][name]
+            self.assertEqual(target["label"], TARGETS[name]["label"])
+            self.assertTrue(0.0 <= target["auc"] <= 1.0)
+            self.assertIsInstance(target["model"], lgb.Booster)
+            self.assertEqual(target["model"].feature_name(), FEATURES)
+            if TARGETS[name]["rows"] == "race":
+                self.assertTrue((self.df["boat_no"].to_numpy()[rows] == 1).all())
+            # The subset trained on its own label column
+            y = np.asarray(feature_matrix.load_matrix()[1][f"y_{target['label']}"])
+            np.testing.assert_array_equal(y[rows], labels[target["label"]][rows])
+
+        with open(FILE_BUNDLE + ".meta.json", encoding="utf-8") as f:
+            meta = json.load(f)
+        self.assertEqual(meta["version"], bundle["version"])
+        self.assertEqual(set(meta["auc"]), set(TARGETS))
+
+    def test_target_with_too_few_positives_is_skipped(self):
+        self.write_input(rough_races=1)
+        self.run_training()
+        bundle = self.load_bundle()
+        self.assertEqual(set(bundle["targets"]), {"win", "2rentai", "3rentai"})
+        self.assertIn("rough: skipped", self.output)
+        with open(FILE_BUNDLE + ".meta.json", encoding="utf-8") as f:
+            self.assertNotIn("NaN", f.read())
+
+    def test_no_trainable_target_exits(self):
+        self.write_input(rough_races=0)
+        with self.assertRaises(SystemExit) as cm:
+            self.run_training(["rough"])
+        self.assertEqual(cm.exception.code, 1)
+        self.assertFalse(os.path.exists(FILE_BUNDLE))
+
+    def test_returned_boats_make_a_race_rough(self):
+        df = training_frame(n_races=2, rough_races=0)
+        df.loc[df["race_id"] == df["race_id"].iloc[-1], "returned_boats"] = 1
+        self.assertEqual(list(LABELS["flag_rough"](df).groupby(df["race_id"]).max()), [0, 1])
+        # Tables from before returns.csv was merged still label by payoff alone
+        self.assertEqual(LABELS["flag_rough"](df.drop(columns="returned_boats")).sum(), 0)
+
+if __name__ == "__main__":
+    unittest.main()